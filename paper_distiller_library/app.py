@@ -1,25 +1,74 @@
 from __future__ import annotations
 
+import os
 import uuid
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
 import streamlit as st
 
-from distiller import db, extractors, pdf_reader, renderers, sectioner, storage, utils
+from distiller import admission, blobstore, db, library_export, pipeline, storage, utils
 from distiller.schemas import OutputBundle
 
+if TYPE_CHECKING:
+    from distiller.glossary import GlossaryDictionary
+    from distiller.page_render import PageRenderer
+    from distiller.retrieval import BM25Index
+    from distiller.similarity import SimilarityIndex
+
 APP_DIR = Path(__file__).resolve().parent
-DATA_DIR = APP_DIR / "data"
+DATA_DIR = Path(os.getenv("PAPER_DISTILLER_DATA_DIR", APP_DIR / "data"))
 PAPERS_DIR = DATA_DIR / "papers"
 DB_PATH = DATA_DIR / db.DB_FILENAME
+SECTION_LABELS = {
+    "story_line": "Story Line",
+    "intro_evidence_table": "Intro Evidence Table",
+    "contributions_and_implications": "Contributions",
+    "method_process_limits": "Methods & Limits",
+    "glossary_terms": "Glossary",
+    "advanced_vocabulary": "Vocabulary",
+}
 
 
 st.set_page_config(page_title="Paper Distiller Library", layout="wide")
 
-storage_manager = storage.StorageManager(PAPERS_DIR)
 
-db.init_db(DB_PATH)
+@st.cache_resource
+def _init_db() -> None:
+    db.init_db(DB_PATH)
+
+
+@st.cache_resource
+def _blob_store() -> blobstore.BlobStore:
+    store = blobstore.get_blob_store(DB_PATH, DATA_DIR)
+    store.start_gc()
+    return store
+
+
+@st.cache_resource
+def _storage_manager() -> storage.StorageManager:
+    return storage.StorageManager(PAPERS_DIR, blobs=_blob_store())
+
+
+@st.cache_resource
+def _similarity_index() -> SimilarityIndex:
+    return pipeline.open_similarity_index(_storage_manager())
+
+
+@st.cache_resource
+def _admission_controller() -> admission.AdmissionController:
+    return admission.get_admission_controller()
+
+
+@st.cache_resource
+def _page_renderer() -> PageRenderer:
+    from distiller.page_render import PageRenderer
+
+    return PageRenderer(DATA_DIR / "cache" / "pages")
+
+
+_init_db()
+storage_manager = _storage_manager()
 
 
 def _load_papers() -> list[db.PaperRecord]:
@@ -27,37 +76,80 @@ def _load_papers() -> list[db.PaperRecord]:
         return list(db.fetch_papers(conn))
 
 
-def _save_outputs(paper_id: str, pages: list[tuple[int, str]]) -> OutputBundle:
-    bundle = extractors.build_output_bundle(pages)
-    storage_manager.save_json(paper_id, "outputs.json", bundle.model_dump())
+def _library_passage_index(papers: list[db.PaperRecord]) -> BM25Index:
+    from distiller import retrieval
+
+    path = storage_manager.library_path(pipeline.PASSAGE_INDEX)
+    index = retrieval.BM25Index.load(path)
+    if index is None:
+        paper_indexes = (retrieval.BM25Index.load(storage_manager.paper_dir(paper.id) / pipeline.PASSAGE_INDEX) for paper in papers)
+        index = retrieval.build_library_index(item for item in paper_indexes if item is not None)
+        index.save(path)
+    return index
+
+
+@st.cache_resource
+def _glossary_dictionary() -> GlossaryDictionary:
+    return pipeline.load_dictionary(DB_PATH)
+
+
+def _learn_abbreviations(paper_id: str, bundle: OutputBundle) -> None:
+    from distiller import extractors
+
+    pairs = extractors.learned_abbreviations(bundle.glossary_terms)
+    pipeline.learn_abbreviations(DB_PATH, paper_id, pairs, _glossary_dictionary())
+
+
+def _save_outputs(paper_id: str, pages: list[tuple[int, str]], skip_pages: set[int] | None = None) -> OutputBundle:
+    bundle = pipeline.generate_outputs(storage_manager, paper_id, pages, skip_pages, dictionary=_glossary_dictionary())
+    _learn_abbreviations(paper_id, bundle)
     return bundle
 
 
-def _prepare_page_text(pdf_path: Path) -> list[tuple[int, str]]:
-    parsed = pdf_reader.read_pdf(pdf_path)
-    pages = [(page.page, page.text) for page in parsed.pages]
-    storage_manager.save_json(
-        pdf_path.parent.name,
-        "parsed_text.json",
-        {
-            "source": parsed.source,
-            "pages": [page.__dict__ for page in parsed.pages],
-        },
+def _stream_outputs(paper_id: str, pages: list[tuple[int, str]], skip_pages: set[int] | None = None) -> OutputBundle:
+    import pandas as pd
+    from pydantic_core import to_jsonable_python
+
+    from distiller import extractors, llm_provider
+
+    index = pipeline.build_passage_index(storage_manager, paper_id, pages, skip_pages)
+    metadata: dict = {}
+    sections = {}
+    status = st.empty()
+    sections_iter = extractors.iter_output_sections(
+        pages, skip_pages, index, llm_provider.get_provider(), metadata, _glossary_dictionary()
     )
-    return pages
+    for name, value in sections_iter:
+        sections[name] = value
+        status.caption(f"Received {SECTION_LABELS[name]} ({len(sections)}/{len(SECTION_LABELS)})")
+        with st.expander(SECTION_LABELS[name]):
+            data = to_jsonable_python(value)
+            if isinstance(data, list):
+                st.dataframe(pd.DataFrame(data), use_container_width=True)
+            else:
+                st.json(data)
+    status.empty()
+    bundle = OutputBundle(**sections, metadata=metadata)
+    storage_manager.save_bundle(paper_id, bundle)
+    _learn_abbreviations(paper_id, bundle)
+    return bundle
+
+
+def _prepare_page_text(paper_id: str, pdf_path: Path) -> tuple[list[tuple[int, str]], set[int]]:
+    return pipeline.prepare_page_text(storage_manager, paper_id, pdf_path)
 
 
 def _process_upload(uploaded_file) -> None:
     paper_id = str(uuid.uuid4())
-    pdf_path = storage_manager.save_pdf(paper_id, uploaded_file.name, uploaded_file.getvalue())
-    pages = _prepare_page_text(pdf_path)
-    sections = sectioner.section_pages(pages)
-    storage_manager.save_json(
+    pages, bundle = pipeline.ingest_pdf(
+        storage_manager,
         paper_id,
-        "sections.json",
-        {"sections": [section.__dict__ for section in sections]},
+        uploaded_file.name,
+        uploaded_file.getvalue(),
+        controller=_admission_controller(),
+        dictionary=_glossary_dictionary(),
     )
-    _save_outputs(paper_id, pages)
+    _learn_abbreviations(paper_id, bundle)
 
     now = utils.now_iso()
     title = utils.simplify_title(uploaded_file.name)
@@ -75,31 +167,71 @@ def _process_upload(uploaded_file) -> None:
         added_at=now,
         updated_at=now,
         notes=None,
+        pipeline_version=storage.PIPELINE_VERSION,
+        pdf_digest=storage_manager.pdf_digest(paper_id),
     )
     with db.get_connection(DB_PATH) as conn:
         db.insert_paper(conn, record)
+    pipeline.index_paper(storage_manager, paper_id, pages, index=_similarity_index())
+
+
+def _evidence_table(paper: db.PaperRecord, rows: list[dict], quote_field: str) -> None:
+    import pandas as pd
+
+    event = st.dataframe(pd.DataFrame(rows), use_container_width=True, on_select="rerun", selection_mode="single-row")
+    selected = event.selection.rows if event else []
+    if not selected:
+        st.caption("Select a row to see the highlighted source page.")
+        return
+    index = selected[0]
+    row = rows[index]
+    pdf_path = storage_manager.pdf_path(paper.id, paper.original_filename, paper.pdf_digest)
+    if not row.get("page") or not pdf_path.exists():
+        st.caption("No source page recorded for this row.")
+        return
+    renderer = _page_renderer()
+    if not 1 <= row["page"] <= renderer.page_count(pdf_path):
+        st.caption(f"Page {row['page']} is not in this PDF.")
+        return
+    # Prefetch the rows around the selection with their own quotes, since that is how they will be rendered.
+    nearby = rows[max(index - renderer.prefetch, 0):index + renderer.prefetch + 1]
+    neighbours = [(item["page"], item.get(quote_field)) for item in nearby if item is not row and item.get("page")]
+    image = renderer.render(pdf_path, row["page"], quote=row.get(quote_field), neighbours=neighbours)
+    st.image(image, caption=f"Page {row['page']}")
 
 
 def library_page() -> None:
     st.header("Library")
     uploaded = st.file_uploader("Upload PDF", type=["pdf"], accept_multiple_files=False)
+    usage = _admission_controller().usage()
+    st.sidebar.caption(
+        f"Ingestion: {usage['active_jobs']} running, {usage['queued_jobs']} queued, "
+        f"{usage['reserved_bytes'] // 2**20}/{usage['memory_budget_bytes'] // 2**20} MB reserved"
+    )
     if uploaded:
-        _process_upload(uploaded)
+        with st.spinner("Waiting for ingestion capacity and processing..."):
+            _process_upload(uploaded)
         st.success("Uploaded and processed.")
 
     papers = _load_papers()
     if not papers:
         st.info("No papers yet. Upload a PDF to get started.")
         return
+    stale = sum(paper.pipeline_version != storage.PIPELINE_VERSION for paper in papers)
+    if stale:
+        st.caption(f"{stale} papers were processed by an older pipeline; run `python -m distiller.reprocess` to refresh them.")
 
     search = st.text_input("Search")
-    categories = sorted({paper.category for paper in papers if paper.category})
-    statuses = sorted({paper.status for paper in papers if paper.status})
-    tags_set = sorted({tag.strip() for paper in papers if paper.tags for tag in paper.tags.split(",") if tag.strip()})
+    with db.get_connection(DB_PATH) as conn:
+        facets = db.fetch_facet_counts(conn)
+
+    def _facet_filter(label: str, facet: str) -> list[str]:
+        counts = facets.get(facet, {})
+        return st.multiselect(label, sorted(counts), format_func=lambda value: f"{value} ({counts[value]})")
 
-    selected_categories = st.multiselect("Category", categories)
-    selected_statuses = st.multiselect("Status", statuses)
-    selected_tags = st.multiselect("Tags", tags_set)
+    selected_categories = _facet_filter("Category", "category")
+    selected_statuses = _facet_filter("Status", "status")
+    selected_tags = _facet_filter("Tags", "tag")
 
     def _match(paper: db.PaperRecord) -> bool:
         if search and search.lower() not in (paper.display_title or "").lower():
@@ -109,13 +241,14 @@ def library_page() -> None:
         if selected_statuses and paper.status not in selected_statuses:
             return False
         if selected_tags:
-            paper_tags = {tag.strip() for tag in (paper.tags or "").split(",") if tag.strip()}
-            if not paper_tags.intersection(selected_tags):
+            if not set(utils.split_tags(paper.tags)).intersection(selected_tags):
                 return False
         return True
 
     filtered = [paper for paper in papers if _match(paper)]
 
+    import pandas as pd
+
     df = pd.DataFrame([
         {
             "id": paper.id,
@@ -138,25 +271,70 @@ def library_page() -> None:
                 db.update_paper_fields(conn, paper_id, row)
         st.success("Updates saved.")
 
+    with st.expander("Export library"):
+        export_format = st.selectbox("Format", library_export.EXPORT_FORMATS)
+        incremental = st.checkbox("Only papers changed since the last export", value=True)
+        if st.button("Export"):
+            result = library_export.export_library(
+                DB_PATH, storage_manager, DATA_DIR / "exports", fmt=export_format, incremental=incremental
+            )
+            st.success(f"Exported {result.papers} papers.")
+            st.write({table: f"{count} rows -> {result.files[table]}" for table, count in result.rows.items()})
+
     st.subheader("Delete")
     delete_id = st.selectbox("Select paper", options=[paper.id for paper in papers])
     delete_files = st.checkbox("Delete files from disk", value=False)
     if st.button("Delete paper"):
         with db.get_connection(DB_PATH) as conn:
             db.delete_paper(conn, delete_id)
+        pipeline.unindex_paper(storage_manager, delete_id, index=_similarity_index())
         if delete_files:
-            paper_dir = storage_manager.paper_dir(delete_id)
-            if paper_dir.exists():
-                for item in paper_dir.rglob("*"):
-                    if item.is_file():
-                        item.unlink()
-                for item in sorted(paper_dir.rglob("*"), reverse=True):
-                    if item.is_dir():
-                        item.rmdir()
-                paper_dir.rmdir()
+            storage_manager.delete_paper(delete_id)
         st.success("Deleted.")
 
 
+def dashboard_page() -> None:
+    import pandas as pd
+
+    st.header("Dashboard")
+    with db.get_connection(DB_PATH) as conn:
+        stats = db.fetch_library_stats(conn)
+    if not stats["papers"]:
+        st.info("No papers yet. Upload a PDF to get started.")
+        return
+    columns = st.columns(4)
+    columns[0].metric("Papers", stats["papers"])
+    columns[1].metric("Unread", stats["by_status"].get("unread", 0))
+    columns[2].metric("Categories", len(stats["by_category"]))
+    columns[3].metric("Tags", len(stats["by_tag"]))
+    for title, key in [("Reading status", "by_status"), ("Papers per year", "by_year"), ("Categories", "by_category")]:
+        if stats[key]:
+            st.subheader(title)
+            st.bar_chart(pd.Series(stats[key], name="papers"))
+    if stats["by_tag"]:
+        st.subheader("Top tags")
+        top_tags = dict(list(stats["by_tag"].items())[:20])
+        st.dataframe(pd.DataFrame({"tag": list(top_tags), "papers": list(top_tags.values())}), use_container_width=True)
+
+    with st.expander("Digest"):
+        from distiller import digest
+
+        weekly = st.checkbox("Only papers updated in the last 7 days", value=True)
+        if st.button("Build digest"):
+            since = utils.days_ago_iso(7) if weekly else None
+            # Rendered in-process: forking worker processes out of the Streamlit server is not safe.
+            result = digest.build_digest(
+                DB_PATH,
+                storage_manager,
+                DATA_DIR / "exports" / "digest",
+                since=since,
+                title=f"Weekly Digest ({utils.now_iso()[:10]})" if weekly else "Library Digest",
+                workers=0,
+            )
+            st.caption(f"{result.papers} papers: {result.rendered} rendered, {result.reused} unchanged.")
+            st.download_button("Download digest", data=result.path.read_bytes(), file_name="digest.md")
+
+
 def detail_page() -> None:
     st.header("Paper Detail")
     papers = _load_papers()
@@ -167,10 +345,19 @@ def detail_page() -> None:
     paper_lookup = {paper.display_title: paper for paper in papers}
     selected_title = st.selectbox("Select paper", options=list(paper_lookup.keys()))
     paper = paper_lookup[selected_title]
+    # Reruns of the same paper (widget edits, reloads) are not new views.
+    if st.session_state.get("viewed_paper_id") != paper.id:
+        with db.get_connection(DB_PATH) as conn:
+            db.mark_viewed(conn, paper.id)
+        st.session_state["viewed_paper_id"] = paper.id
 
-    outputs = storage_manager.load_json(paper.id, "outputs.json")
+    bundle = storage_manager.load_bundle(paper.id)
+    outputs = bundle.raw if bundle else {}
     if not outputs:
-        outputs = _save_outputs(paper.id, _prepare_page_text(storage_manager.paper_dir(paper.id) / paper.original_filename)).model_dump()
+        pdf_path = storage_manager.pdf_path(paper.id, paper.original_filename, paper.pdf_digest)
+        with _admission_controller().admit(admission.estimate_file(pdf_path)):
+            pages, skip_pages = _prepare_page_text(paper.id, pdf_path)
+            outputs = _save_outputs(paper.id, pages, skip_pages).model_dump()
 
     nav = st.sidebar.radio(
         "Sections",
@@ -182,21 +369,40 @@ def detail_page() -> None:
             "Methods & Limits",
             "Glossary",
             "Vocabulary",
+            "Evidence Search",
             "Exports",
         ],
     )
 
+    with st.expander("Related"):
+        similarity_index = _similarity_index()
+        if paper.id not in similarity_index:
+            pipeline.index_paper(storage_manager, paper.id, index=similarity_index)
+        titles = {item.id: item.display_title for item in papers}
+        related = [(titles[paper_id], score) for paper_id, score in similarity_index.related(paper.id, k=5) if paper_id in titles]
+        if related:
+            for title, score in related:
+                st.write(f"{title} ({score:.2f})")
+        else:
+            st.caption("No related papers yet.")
+
     if st.button("Regenerate outputs"):
-        pdf_path = storage_manager.paper_dir(paper.id) / paper.original_filename
-        pages = _prepare_page_text(pdf_path)
-        outputs = _save_outputs(paper.id, pages).model_dump()
+        pdf_path = storage_manager.pdf_path(paper.id, paper.original_filename, paper.pdf_digest)
+        with _admission_controller().admit(admission.estimate_file(pdf_path)):
+            pages, skip_pages = _prepare_page_text(paper.id, pdf_path)
+            pipeline.save_sections(storage_manager, paper.id, pages, skip_pages)
+            outputs = _stream_outputs(paper.id, pages, skip_pages).model_dump()
+        with db.get_connection(DB_PATH) as conn:
+            db.mark_processed(conn, paper.id, storage.PIPELINE_VERSION)
         st.success("Outputs regenerated.")
 
+    import pandas as pd
+
     if nav == "Overview":
         st.subheader(paper.display_title)
         st.write(outputs.get("metadata", {}))
     elif nav == "Intro Evidence Table":
-        st.dataframe(pd.DataFrame(outputs.get("intro_evidence_table", [])), use_container_width=True)
+        _evidence_table(paper, outputs.get("intro_evidence_table", []), "evidence_quote")
     elif nav == "Story Line":
         st.json(outputs.get("story_line", {}))
     elif nav == "Contributions":
@@ -204,13 +410,41 @@ def detail_page() -> None:
     elif nav == "Methods & Limits":
         st.json(outputs.get("method_process_limits", {}))
     elif nav == "Glossary":
-        st.dataframe(pd.DataFrame(outputs.get("glossary_terms", [])), use_container_width=True)
+        _evidence_table(paper, outputs.get("glossary_terms", []), "paper_usage_quote")
     elif nav == "Vocabulary":
         st.dataframe(pd.DataFrame(outputs.get("advanced_vocabulary", [])), use_container_width=True)
+    elif nav == "Evidence Search":
+        query = st.text_input("Find supporting passages")
+        scope = st.radio("Scope", ["This paper", "Library"], horizontal=True)
+        if query:
+            from distiller import extractors, retrieval
+
+            if scope == "Library":
+                index = _library_passage_index(papers)
+            else:
+                index = retrieval.BM25Index.load(storage_manager.paper_dir(paper.id) / pipeline.PASSAGE_INDEX)
+            titles = {item.id: item.display_title for item in papers}
+            hits = index.search(query, k=10) if index else []
+            st.dataframe(
+                pd.DataFrame(
+                    [
+                        {
+                            "paper": titles.get(passage.paper_id, ""),
+                            "page": passage.page,
+                            "score": round(score, 3),
+                            "passage": " ".join(passage.text.split())[: extractors.MAX_QUOTE_CHARS],
+                        }
+                        for passage, score in hits
+                    ]
+                ),
+                use_container_width=True,
+            )
     elif nav == "Exports":
+        from distiller import renderers
+
         st.subheader("Exports")
         markdown = renderers.render_markdown(outputs)
-        st.download_button("Download JSON", data=OutputBundle.model_validate(outputs).model_dump_json(indent=2), file_name="outputs.json")
+        st.download_button("Download JSON", data=storage_manager.read_bytes(paper.id, storage.BUNDLE_FILENAME), file_name="outputs.json")
         st.download_button("Download Markdown", data=markdown, file_name="outputs.md")
 
         intro_path = storage_manager.export_path(paper.id, "intro_evidence_table.csv")
@@ -227,9 +461,11 @@ def detail_page() -> None:
 
 
 def main() -> None:
-    page = st.sidebar.radio("Navigate", ["Library", "Paper Detail"])
+    page = st.sidebar.radio("Navigate", ["Library", "Paper Detail", "Dashboard"])
     if page == "Library":
         library_page()
+    elif page == "Dashboard":
+        dashboard_page()
     else:
         detail_page()
 
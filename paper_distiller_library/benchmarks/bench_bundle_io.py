@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from distiller.schemas import OutputBundle  # noqa: E402
+from distiller.storage import BUNDLE_FILENAME, StorageManager  # noqa: E402
+
+
+def _evidence(i: int) -> Dict:
+    return {"quote": f"Quoted passage number {i} " * 4, "page": i % 40 + 1, "citation_key": None, "evidence_level": "medium"}
+
+
+def _item(i: int) -> Dict:
+    return {"text": f"Item {i}", "type": "inference", "evidence": _evidence(i), "notes": None}
+
+
+def make_bundle(rows: int) -> OutputBundle:
+    row = {
+        "topic": "background",
+        "claim_type": "viewpoint",
+        "value": None,
+        "unit": None,
+        "context": "Motivation for the study.",
+        "citation_key": None,
+        "reference_entry": None,
+        "evidence_level": "medium",
+        "notes": None,
+    }
+    term = {"term_type": "abbreviation", "expansion": None, "zh": "", "definition": "d", "citation_key": None, "evidence_level": "medium", "notes": None}
+    return OutputBundle.model_validate(
+        {
+            "story_line": {"one_paragraph_summary": _item(0), "bullets": [_item(i) for i in range(5)]},
+            "intro_evidence_table": [
+                dict(row, claim_id=f"C{i:05d}", claim_text=f"Claim {i}", evidence_quote=_evidence(i)["quote"], page=i % 40 + 1)
+                for i in range(rows)
+            ],
+            "contributions_and_implications": {"innovations": [_item(i) for i in range(rows // 4)], "key_findings": [], "implications": []},
+            "method_process_limits": {"method_summary": [_item(i) for i in range(rows // 4)], "process_steps": [], "assumptions": [], "limitations": []},
+            "glossary_terms": [dict(term, term=f"T{i}", paper_usage_quote="q", page=1) for i in range(rows // 2)],
+            "advanced_vocabulary": [],
+            "metadata": {"generated_by": "bench"},
+        }
+    )
+
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare legacy and fast-path OutputBundle serialization.")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bundle = make_bundle(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = StorageManager(Path(tmp))
+        legacy_path = Path(tmp) / "legacy.json"
+
+        def legacy_save() -> None:
+            payload = bundle.model_dump()
+            legacy_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        def legacy_view() -> None:
+            outputs = json.loads(legacy_path.read_text(encoding="utf-8"))
+            OutputBundle.model_validate(outputs).model_dump_json(indent=2)
+
+        def fast_save() -> None:
+            storage.save_bundle("paper", bundle)
+
+        def fast_view() -> None:
+            storage.load_bundle("paper").get("intro_evidence_table")
+            storage.read_bytes("paper", BUNDLE_FILENAME)
+
+        results = {
+            "legacy save": _time(legacy_save, args.repeat),
+            "fast save": _time(fast_save, args.repeat),
+            "legacy view": _time(legacy_view, args.repeat),
+            "fast view": _time(fast_view, args.repeat),
+        }
+        sizes = (legacy_path.stat().st_size, (storage.paper_dir("paper") / BUNDLE_FILENAME).stat().st_size)
+
+    print(f"rows={args.rows} legacy_bytes={sizes[0]} fast_bytes={sizes[1]}")
+    for name, millis in results.items():
+        print(f"{name:<12} {millis:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+APP_PATH = Path(__file__).resolve().parents[1] / "app.py"
+WORDS = ["graph", "transformer", "retrieval", "dataset", "limitation", "reading", "evidence", "baseline", "model", "survey"]
+ACTION_WEIGHTS = {"browse": 30, "search": 25, "detail": 25, "edit": 8, "export": 7, "upload": 5}
+STATUSES = ["unread", "reading", "read"]
+LOCK_RETRY_SECONDS = 0.005
+
+
+class LockStats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.waits: List[float] = []
+        self.statements = 0
+
+    def record(self, waited: float) -> None:
+        with self.lock:
+            self.statements += 1
+            if waited:
+                self.waits.append(waited)
+
+
+LOCKS = LockStats()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Busy waiting is done here instead of inside SQLite so the time spent blocked on the write lock can be measured.
+    def _retry(self, call: Callable, *args):
+        waited = 0.0
+        while True:
+            try:
+                result = call(*args)
+            except sqlite3.OperationalError as exc:
+                if "locked" not in str(exc) or waited > 30:
+                    raise
+                time.sleep(LOCK_RETRY_SECONDS)
+                waited += LOCK_RETRY_SECONDS
+                continue
+            LOCKS.record(waited)
+            return result
+
+    def execute(self, *args):
+        return self._retry(super().execute, *args)
+
+    def executemany(self, *args):
+        return self._retry(super().executemany, *args)
+
+    def commit(self):
+        return self._retry(super().commit)
+
+
+def _instrument_db() -> None:
+    from distiller import db
+
+    def get_connection(db_path: Path) -> sqlite3.Connection:
+        conn = sqlite3.connect(db_path, timeout=0, factory=InstrumentedConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    db.get_connection = get_connection
+
+
+def _share_server_state() -> None:
+    # AppTest assumes one run at a time per process; these patches make overlapping session threads safe.
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    # Each run patches global.appTest on and back off; keep it on so overlapping runs all see it.
+    config.set_option("global.appTest", True)
+    # Like the server, compile app.py once for all sessions (ast.parse is not thread-safe on every Python).
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    # Each run installs a mock Runtime in a class attribute and clears it afterwards; one session finishing
+    # would clear it under the others, so fall back to the last one seen.
+    shared: List[Runtime] = []
+
+    def current(cls) -> Runtime:
+        if cls._instance is not None:
+            shared[:] = [cls._instance]
+        if not shared:
+            raise RuntimeError("Runtime hasn't been created!")
+        return shared[0]
+
+    Runtime.instance = classmethod(current)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(shared))
+
+
+def make_pdf(seed: int) -> bytes:
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    document = fitz.open()
+    sections = ["1 Introduction", "2 Methods", "3 Results", "4 Discussion", "References"]
+    for heading in sections:
+        body = " ".join(rng.choice(WORDS) for _ in range(180))
+        text = f"{heading}\nWe study Natural Language Processing (NLP) for {body}. A limitation is the {rng.choice(WORDS)}."
+        document.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800), text)
+    return document.tobytes()
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 1)
+
+    return {"count": len(ordered), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1], 1)}
+
+
+def _widget(widgets, label: str):
+    return next(widget for widget in widgets if widget.label == label)
+
+
+class Session:
+    def __init__(self, session_id: int, seed: int) -> None:
+        from streamlit.testing.v1 import AppTest
+
+        self.session_id = session_id
+        self.rng = random.Random(seed)
+        self.at = AppTest.from_file(str(APP_PATH), default_timeout=300)
+        self.at.run()
+        self.uploads = 0
+
+    def _library(self) -> None:
+        if self.at.sidebar.radio[0].value != "Library":
+            self.at.sidebar.radio[0].set_value("Library").run()
+
+    def browse(self) -> None:
+        self.at.sidebar.radio[0].set_value("Library").run()
+
+    def search(self) -> None:
+        self._library()
+        _widget(self.at.text_input, "Search").set_value(self.rng.choice(WORDS + [""])).run()
+
+    def edit(self) -> None:
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        self._library()
+        grid = next((frame for frame in self.at.dataframe if "id" in frame.value.columns), None)
+        if grid is None or grid.value.empty:
+            return
+        # AppTest cannot drive st.data_editor, so the cell edit is sent with the Save click like the browser does.
+        row = self.rng.randrange(len(grid.value))
+        edits = {"edited_rows": {str(row): {"status": self.rng.choice(STATUSES)}}, "added_rows": [], "deleted_rows": []}
+        _widget(self.at.button, "Save edits").click()
+        states = self.at._tree.get_widget_states()
+        states.widgets.append(WidgetState(id=grid.proto.id, string_value=json.dumps(edits)))
+        self.at._run(states)
+
+    def export(self) -> None:
+        self._library()
+        _widget(self.at.selectbox, "Format").set_value(self.rng.choice(["csv", "jsonl"]))
+        _widget(self.at.button, "Export").click().run()
+
+    def upload(self) -> None:
+        self._library()
+        self.uploads += 1
+        name = f"session{self.session_id}_{self.uploads}.pdf"
+        self.at.file_uploader[0].set_value((name, make_pdf(self.rng.randrange(1 << 30)), "application/pdf")).run()
+        self.at.file_uploader[0].set_value(None)
+
+    def detail(self) -> None:
+        if self.at.sidebar.radio[0].value != "Paper Detail":
+            self.at.sidebar.radio[0].set_value("Paper Detail").run()
+        if len(self.at.sidebar.radio) < 2:
+            return
+        papers = _widget(self.at.selectbox, "Select paper")
+        papers.set_value(self.rng.choice(papers.options))
+        nav = self.at.sidebar.radio[1]
+        nav.set_value(self.rng.choice([option for option in nav.options if option != "Evidence Search"])).run()
+
+
+def run_session(session_id: int, actions: int, seed: int, start_at: float) -> Dict[str, object]:
+    session = Session(session_id, seed)
+    names = list(ACTION_WEIGHTS)
+    weights = list(ACTION_WEIGHTS.values())
+    timings: Dict[str, List[float]] = defaultdict(list)
+    errors: List[str] = []
+    time.sleep(max(start_at - time.time(), 0))
+    for _ in range(actions):
+        action = session.rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            getattr(session, action)()
+            errors.extend(f"{action}: {item.value}" for item in session.at.exception)
+        except Exception as exc:
+            errors.append(f"{action}: {type(exc).__name__}: {exc}")
+        timings[action].append((time.perf_counter() - start) * 1000)
+    return {"timings": dict(timings), "errors": errors}
+
+
+def seed_library(papers: int) -> None:
+    logging.disable(logging.WARNING)
+    import app
+
+    for index in range(papers):
+        class _Upload:
+            name = f"seed_{index}.pdf"
+
+            def getvalue(self, _index=index) -> bytes:
+                return make_pdf(_index)
+
+        app._process_upload(_Upload())
+
+
+def run_load(sessions: int, actions: int, seed_papers: int, seed: int, warmup: float = 5.0) -> Dict[str, object]:
+    # Seeding runs in a throwaway process so the sessions start against a cold server.
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pool.submit(seed_library, seed_papers).result()
+    # Sessions are threads in this process, like browser tabs on one Streamlit server: they share the
+    # cache_resource singletons (similarity index, blob store, renderer) as well as the database.
+    _instrument_db()
+    _share_server_state()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        start_at = time.time() + warmup
+        futures = [pool.submit(run_session, index, actions, seed + index, start_at) for index in range(sessions)]
+        reports = [future.result() for future in futures]
+    wall = time.time() - start_at
+
+    timings: Dict[str, List[float]] = defaultdict(list)
+    for report in reports:
+        for name, values in report["timings"].items():
+            timings[name].extend(values)
+    waits = sorted(LOCKS.waits)
+    errors = [error for report in reports for error in report["errors"]]
+    all_timings = [value for values in timings.values() for value in values]
+    return {
+        "sessions": sessions,
+        "actions_per_session": actions,
+        "wall_s": round(wall, 1),
+        "throughput_actions_per_s": round(len(all_timings) / wall, 2),
+        "latency_ms": {"all": _percentiles(all_timings), **{name: _percentiles(values) for name, values in sorted(timings.items())}},
+        "sqlite": {
+            "statements": LOCKS.statements,
+            "lock_waits": len(waits),
+            "lock_wait_total_ms": round(sum(waits) * 1000, 1),
+            "lock_wait_p95_ms": round(waits[int(0.95 * len(waits))] * 1000, 1) if waits else 0.0,
+            "lock_wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+        },
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "errors": errors[:20],
+        "error_count": len(errors),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Drive the Streamlit app with concurrent simulated sessions.")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--actions", type=int, default=20, help="Actions per session.")
+    parser.add_argument("--seed-papers", type=int, default=10, help="Papers uploaded before the sessions start.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=None, help="Library to run against (default: a fresh temp dir).")
+    parser.add_argument("--json", type=Path, default=None, help="Append results as a JSON line to this file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["PAPER_DISTILLER_DATA_DIR"] = str(args.data_dir or Path(tmp) / "data")
+        results = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), **run_load(args.sessions, args.actions, args.seed_papers, args.seed)}
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with args.json.open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps(results) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+APP_DIR = Path(__file__).resolve().parents[1]
+APP_PATH = APP_DIR / "app.py"
+HEAVY_MODULES = ("pandas", "numpy", "wordfreq", "fitz", "pymupdf", "pdfplumber", "pyarrow")
+
+
+def _parse_importtime(stderr: str) -> Tuple[int, List[Tuple[str, int]]]:
+    top_level: List[Tuple[str, int]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        if not name.startswith("  "):
+            top_level.append((name.strip(), int(cumulative)))
+    total = sum(us for _, us in top_level)
+    return total, sorted(top_level, key=lambda item: -item[1])
+
+
+def cold_import(module_code: str) -> Dict[str, object]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", module_code],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    total_us, modules = _parse_importtime(proc.stderr)
+    loaded = set(proc.stdout.split())
+    return {
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(total_us / 1000, 1),
+        "top_imports": [f"{name}={us / 1000:.1f}ms" for name, us in modules[:5]],
+        "heavy_loaded": sorted(loaded.intersection(HEAVY_MODULES)),
+    }
+
+
+def app_runs(reruns: int) -> Dict[str, object]:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP_PATH), default_timeout=120)
+    start = time.perf_counter()
+    at.run()
+    first_ms = (time.perf_counter() - start) * 1000
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        timings.append((time.perf_counter() - start) * 1000)
+    heavy = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+    return {
+        "first_run_ms": round(first_ms, 1),
+        "warm_rerun_median_ms": round(statistics.median(timings), 1) if timings else None,
+        "warm_rerun_max_ms": round(max(timings), 1) if timings else None,
+        "heavy_loaded": heavy,
+        "exception": [str(item.value) for item in at.exception],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure cold import and warm rerun latency of the Streamlit app.")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--json", type=Path, default=None, help="Append results as a JSON line to this file.")
+    args = parser.parse_args()
+
+    probe = "import sys, {module}; print(' '.join(sys.modules))"
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cold_streamlit": cold_import(probe.format(module="streamlit")),
+        "cold_distiller_core": cold_import(probe.format(module="distiller.db, distiller.storage")),
+    }
+    # The app creates its database and starts background jobs on first run, so keep it off the real library.
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["PAPER_DISTILLER_DATA_DIR"] = str(Path(tmp) / "data")
+        results["app"] = app_runs(args.reruns)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with args.json.open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps(results) + "\n")
+
+
+if __name__ == "__main__":
+    main()
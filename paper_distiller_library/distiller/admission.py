@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, Iterator, Optional
+
+# Checked against the RSS growth of the mock pipeline (native PyMuPDF memory included): a fixed cost
+# for the extractors and chunked quality analysis plus the page texts, passages and JSON they produce.
+BASE_JOB_BYTES = 8 * 1024 * 1024
+BYTES_PER_PAGE = 24 * 1024
+FILE_BYTES_FACTOR = 2
+CPU_SECONDS_PER_PAGE = 0.006
+
+
+@dataclass
+class JobEstimate:
+    pages: int
+    file_bytes: int
+    memory_bytes: int
+    cpu_seconds: float
+
+
+def count_pages(content: bytes) -> int:
+    import fitz  # PyMuPDF
+
+    with fitz.open(stream=content, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def _estimate(pages: int, file_bytes: int) -> JobEstimate:
+    memory = BASE_JOB_BYTES + pages * BYTES_PER_PAGE + file_bytes * FILE_BYTES_FACTOR
+    return JobEstimate(pages=pages, file_bytes=file_bytes, memory_bytes=memory, cpu_seconds=pages * CPU_SECONDS_PER_PAGE)
+
+
+def estimate_job(content: bytes, pages: Optional[int] = None) -> JobEstimate:
+    return _estimate(count_pages(content) if pages is None else pages, len(content))
+
+
+def estimate_file(path: Path) -> JobEstimate:
+    import fitz  # PyMuPDF
+
+    with fitz.open(path) as doc:
+        return _estimate(doc.page_count, path.stat().st_size)
+
+
+def current_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        memory_budget_bytes: int,
+        cpu_slots: int = 1,
+        rss_limit_bytes: Optional[int] = None,
+        poll_seconds: float = 0.5,
+    ) -> None:
+        self.memory_budget_bytes = memory_budget_bytes
+        self.cpu_slots = max(cpu_slots, 1)
+        self.rss_limit_bytes = rss_limit_bytes
+        self.poll_seconds = poll_seconds
+        self.reserved_bytes = 0
+        self.active = 0
+        self.admitted = 0
+        self.peak_active = 0
+        self._queue: Deque[int] = deque()
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    def _fits(self, reservation: int) -> bool:
+        if self.active == 0:
+            return True
+        if self.active >= self.cpu_slots or self.reserved_bytes + reservation > self.memory_budget_bytes:
+            return False
+        rss = current_rss_bytes() if self.rss_limit_bytes else None
+        return rss is None or rss + reservation <= self.rss_limit_bytes
+
+    @contextmanager
+    def admit(self, estimate: JobEstimate) -> Iterator[None]:
+        # Jobs larger than the whole budget still run, but only once nothing else is in flight.
+        reservation = min(estimate.memory_bytes, self.memory_budget_bytes)
+        with self._condition:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            try:
+                while self._queue[0] != ticket or not self._fits(reservation):
+                    self._condition.wait(self.poll_seconds)
+            finally:
+                # On success the ticket is at the head; if the wait was interrupted it must not block later jobs.
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+            self.reserved_bytes += reservation
+            self.active += 1
+            self.admitted += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.reserved_bytes -= reservation
+                self.active -= 1
+                self._condition.notify_all()
+
+    def usage(self) -> Dict[str, Optional[int]]:
+        with self._condition:
+            return {
+                "active_jobs": self.active,
+                "queued_jobs": len(self._queue),
+                "cpu_slots": self.cpu_slots,
+                "reserved_bytes": self.reserved_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "rss_bytes": current_rss_bytes(),
+                "rss_limit_bytes": self.rss_limit_bytes,
+                "admitted_jobs": self.admitted,
+            }
+
+
+def get_admission_controller() -> AdmissionController:
+    rss_limit_mb = os.getenv("INGEST_RSS_LIMIT_MB")
+    return AdmissionController(
+        memory_budget_bytes=int(os.getenv("INGEST_MEMORY_BUDGET_MB", "512")) * 1024 * 1024,
+        cpu_slots=int(os.getenv("INGEST_CPU_SLOTS", str(max((os.cpu_count() or 2) // 2, 1)))),
+        rss_limit_bytes=int(rss_limit_mb) * 1024 * 1024 if rss_limit_mb else None,
+    )
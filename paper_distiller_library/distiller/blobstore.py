@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import threading
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from distiller import db
+from distiller.utils import to_iso, utc_now
+
+GC_GRACE_SECONDS = 3600
+GC_INTERVAL_SECONDS = 600
+
+
+def blob_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _shard(digest: str) -> Path:
+    return Path(digest[:2]) / digest[2:4] / digest
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with tmp_path.open("wb") as handle:
+        handle.write(data)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+class BlobBackend:
+    def put(self, digest: str, data: bytes, overwrite: bool = False) -> None:
+        raise NotImplementedError
+
+    def get(self, digest: str) -> bytes:
+        raise NotImplementedError
+
+    def exists(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, digest: str) -> None:
+        raise NotImplementedError
+
+    def local_path(self, digest: str) -> Path:
+        raise NotImplementedError
+
+
+class LocalBlobBackend(BlobBackend):
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def path(self, digest: str) -> Path:
+        return self.root / _shard(digest)
+
+    def put(self, digest: str, data: bytes, overwrite: bool = False) -> None:
+        if overwrite or not self.exists(digest):
+            _atomic_write(self.path(digest), data)
+
+    def get(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def delete(self, digest: str) -> None:
+        self.path(digest).unlink(missing_ok=True)
+
+    def local_path(self, digest: str) -> Path:
+        return self.path(digest)
+
+
+# Filesystem stand-in for the subset of the boto3 S3 client that ObjectStoreBackend uses.
+class LocalObjectClient:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def _path(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs: Any) -> Dict[str, Any]:
+        _atomic_write(self._path(Bucket, Key), Body)
+        return {"ETag": hashlib.md5(Body).hexdigest()}
+
+    def get_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise KeyError(Key)
+        return {"Body": io.BytesIO(path.read_bytes()), "ContentLength": path.stat().st_size}
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise KeyError(Key)
+        return {"ContentLength": path.stat().st_size}
+
+    def delete_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        self._path(Bucket, Key).unlink(missing_ok=True)
+        return {}
+
+
+class ObjectStoreBackend(BlobBackend):
+    def __init__(self, client: Any, bucket: str, prefix: str = "blobs", cache_dir: Optional[Path] = None) -> None:
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache = LocalBlobBackend(cache_dir) if cache_dir else None
+
+    def key(self, digest: str) -> str:
+        return f"{self.prefix}/{_shard(digest).as_posix()}"
+
+    def put(self, digest: str, data: bytes, overwrite: bool = False) -> None:
+        if overwrite or not self.exists(digest):
+            self.client.put_object(Bucket=self.bucket, Key=self.key(digest), Body=data)
+        if self.cache is not None:
+            self.cache.put(digest, data)
+
+    def get(self, digest: str) -> bytes:
+        if self.cache is not None and self.cache.exists(digest):
+            return self.cache.get(digest)
+        return self.client.get_object(Bucket=self.bucket, Key=self.key(digest))["Body"].read()
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(digest))
+        except Exception:
+            return False
+        return True
+
+    def delete(self, digest: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(digest))
+        if self.cache is not None:
+            self.cache.delete(digest)
+
+    def local_path(self, digest: str) -> Path:
+        if self.cache is None:
+            raise RuntimeError("ObjectStoreBackend needs a cache_dir to hand out local paths.")
+        if not self.cache.exists(digest):
+            self.cache.put(digest, self.client.get_object(Bucket=self.bucket, Key=self.key(digest))["Body"].read())
+        return self.cache.path(digest)
+
+
+class BlobStore:
+    def __init__(self, backend: BlobBackend, db_path: Path) -> None:
+        self.backend = backend
+        self.db_path = db_path
+        self._gc_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def put(self, data: bytes, owner: str) -> str:
+        digest = blob_digest(data)
+        with db.get_connection(self.db_path) as conn:
+            created = db.add_blob_ref(conn, digest, len(data), owner)
+        # A fresh row means the collector may just have removed the object, so always write it then.
+        self.backend.put(digest, data, overwrite=created)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return self.backend.get(digest)
+
+    def local_path(self, digest: str) -> Path:
+        return self.backend.local_path(digest)
+
+    def release(self, owner: str) -> None:
+        with db.get_connection(self.db_path) as conn:
+            db.release_blob_refs(conn, owner)
+
+    def refcount(self, digest: str) -> int:
+        with db.get_connection(self.db_path) as conn:
+            return db.blob_refcount(conn, digest)
+
+    def collect_garbage(self, grace_seconds: int = GC_GRACE_SECONDS) -> int:
+        cutoff = to_iso(utc_now() - timedelta(seconds=grace_seconds))
+        removed = 0
+        with db.get_connection(self.db_path) as conn:
+            for digest in db.fetch_unreferenced_blobs(conn, cutoff):
+                # The row delete is committed only once the object is gone, so a put that races with us
+                # waits for the lock and then re-creates both rather than having its object removed.
+                if db.delete_blob_if_unreferenced(conn, digest, cutoff):
+                    self.backend.delete(digest)
+                    removed += 1
+                conn.commit()
+        return removed
+
+    def start_gc(self, interval_seconds: int = GC_INTERVAL_SECONDS, grace_seconds: int = GC_GRACE_SECONDS) -> None:
+        if self._gc_thread is not None and self._gc_thread.is_alive():
+            return
+        self._stop.clear()
+
+        def _loop() -> None:
+            while not self._stop.wait(interval_seconds):
+                self.collect_garbage(grace_seconds)
+
+        self._gc_thread = threading.Thread(target=_loop, name="blob-gc", daemon=True)
+        self._gc_thread.start()
+
+    def stop_gc(self) -> None:
+        self._stop.set()
+
+
+def get_blob_store(db_path: Path, data_dir: Path) -> BlobStore:
+    backend_name = os.getenv("BLOB_BACKEND", "local").lower()
+    root = Path(os.getenv("BLOB_DIR", str(data_dir / "blobs")))
+    if backend_name == "s3":
+        import boto3
+
+        client = boto3.client("s3", endpoint_url=os.getenv("S3_ENDPOINT_URL") or None)
+        backend: BlobBackend = ObjectStoreBackend(client, os.environ["S3_BUCKET"], os.getenv("S3_PREFIX", "blobs"), root)
+    elif backend_name == "s3-local":
+        backend = ObjectStoreBackend(LocalObjectClient(root / "s3"), "library", "blobs", root / "cache")
+    else:
+        backend = LocalBlobBackend(root)
+    return BlobStore(backend, db_path)
@@ -1,10 +1,12 @@
 import sqlite3
 from dataclasses import dataclass
-from datetime import datetime
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from distiller.utils import now_iso, split_tags
 
 DB_FILENAME = "library.db"
+FACET_COLUMNS = ("category", "status", "year", "tags")
 
 
 @dataclass
@@ -22,6 +24,9 @@ class PaperRecord:
     added_at: str
     updated_at: str
     notes: Optional[str]
+    pipeline_version: int = 0
+    last_viewed_at: Optional[str] = None
+    pdf_digest: Optional[str] = None
 
 
 def get_connection(db_path: Path) -> sqlite3.Connection:
@@ -30,28 +35,137 @@ def get_connection(db_path: Path) -> sqlite3.Connection:
     return conn
 
 
+def _migrate_v1(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS papers (
+            id TEXT PRIMARY KEY,
+            original_filename TEXT NOT NULL,
+            display_title TEXT NOT NULL,
+            short_title TEXT NOT NULL,
+            authors TEXT,
+            year INTEGER,
+            doi TEXT,
+            category TEXT,
+            tags TEXT,
+            status TEXT,
+            added_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            notes TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_papers_updated_at ON papers (updated_at)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS abbreviations (
+            term TEXT NOT NULL,
+            expansion TEXT NOT NULL,
+            paper_id TEXT NOT NULL,
+            PRIMARY KEY (term, expansion, paper_id)
+        )
+        """
+    )
+
+
+def _migrate_v2(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE papers ADD COLUMN pipeline_version INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE papers ADD COLUMN last_viewed_at TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_papers_stale ON papers (pipeline_version, last_viewed_at)")
+
+
+def _migrate_v3(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE papers ADD COLUMN pdf_digest TEXT")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            digest TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            last_put_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blob_refs (
+            digest TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            PRIMARY KEY (digest, owner)
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_blob_refs_owner ON blob_refs (owner)")
+
+
+def _migrate_v4(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS paper_facets (
+            paper_id TEXT NOT NULL,
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (paper_id, facet, value)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS facet_counts (
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            papers INTEGER NOT NULL,
+            PRIMARY KEY (facet, value)
+        )
+        """
+    )
+    for row in conn.execute("SELECT id, category, status, year, tags FROM papers").fetchall():
+        _sync_facets(conn, row[0], {"category": row[1], "status": row[2], "year": row[3], "tags": row[4]})
+
+
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _facet_values(values: Optional[dict]) -> Set[Tuple[str, str]]:
+    if values is None:
+        return set()
+    facets = {("all", "")}
+    if values.get("category"):
+        facets.add(("category", values["category"]))
+    if values.get("status"):
+        facets.add(("status", values["status"]))
+    if values.get("year") is not None:
+        facets.add(("year", str(int(values["year"]))))
+    facets.update(("tag", tag) for tag in split_tags(values.get("tags")))
+    return facets
+
+
+def _sync_facets(conn: sqlite3.Connection, paper_id: str, values: Optional[dict]) -> None:
+    old = {(row[0], row[1]) for row in conn.execute("SELECT facet, value FROM paper_facets WHERE paper_id = ?", (paper_id,))}
+    new = _facet_values(values)
+    removed = old - new
+    added = new - old
+    conn.executemany("DELETE FROM paper_facets WHERE paper_id = ? AND facet = ? AND value = ?", [(paper_id, *item) for item in removed])
+    conn.executemany("UPDATE facet_counts SET papers = papers - 1 WHERE facet = ? AND value = ?", list(removed))
+    if removed:
+        conn.execute("DELETE FROM facet_counts WHERE papers <= 0")
+    conn.executemany("INSERT INTO paper_facets (paper_id, facet, value) VALUES (?, ?, ?)", [(paper_id, *item) for item in added])
+    conn.executemany(
+        """
+        INSERT INTO facet_counts (facet, value, papers) VALUES (?, ?, 1)
+        ON CONFLICT (facet, value) DO UPDATE SET papers = papers + 1
+        """,
+        list(added),
+    )
+
+
 def init_db(db_path: Path) -> None:
     db_path.parent.mkdir(parents=True, exist_ok=True)
     with get_connection(db_path) as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS papers (
-                id TEXT PRIMARY KEY,
-                original_filename TEXT NOT NULL,
-                display_title TEXT NOT NULL,
-                short_title TEXT NOT NULL,
-                authors TEXT,
-                year INTEGER,
-                doi TEXT,
-                category TEXT,
-                tags TEXT,
-                status TEXT,
-                added_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                notes TEXT
-            )
-            """
-        )
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
 
 
 def insert_paper(conn: sqlite3.Connection, record: PaperRecord) -> None:
@@ -59,8 +173,8 @@ def insert_paper(conn: sqlite3.Connection, record: PaperRecord) -> None:
         """
         INSERT INTO papers (
             id, original_filename, display_title, short_title, authors, year, doi,
-            category, tags, status, added_at, updated_at, notes
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            category, tags, status, added_at, updated_at, notes, pipeline_version, last_viewed_at, pdf_digest
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             record.id,
@@ -76,26 +190,54 @@ def insert_paper(conn: sqlite3.Connection, record: PaperRecord) -> None:
             record.added_at,
             record.updated_at,
             record.notes,
+            record.pipeline_version,
+            record.last_viewed_at,
+            record.pdf_digest,
         ),
     )
+    _sync_facets(conn, record.id, record.__dict__)
     conn.commit()
 
 
 def update_paper_fields(conn: sqlite3.Connection, paper_id: str, fields: dict) -> None:
     if not fields:
         return
-    fields["updated_at"] = datetime.utcnow().isoformat()
+    fields["updated_at"] = now_iso()
     assignments = ", ".join(f"{key} = ?" for key in fields)
     values = list(fields.values()) + [paper_id]
     conn.execute(
         f"UPDATE papers SET {assignments} WHERE id = ?",
         values,
     )
+    if any(column in fields for column in FACET_COLUMNS):
+        row = conn.execute("SELECT category, status, year, tags FROM papers WHERE id = ?", (paper_id,)).fetchone()
+        _sync_facets(conn, paper_id, dict(zip(FACET_COLUMNS, row)) if row else None)
+    conn.commit()
+
+
+def touch_paper(conn: sqlite3.Connection, paper_id: str) -> None:
+    conn.execute("UPDATE papers SET updated_at = ? WHERE id = ?", (now_iso(), paper_id))
+    conn.commit()
+
+
+def mark_processed(conn: sqlite3.Connection, paper_id: str, version: int) -> None:
+    conn.execute(
+        "UPDATE papers SET pipeline_version = ?, updated_at = ? WHERE id = ?",
+        (version, now_iso(), paper_id),
+    )
+    conn.commit()
+
+
+def mark_viewed(conn: sqlite3.Connection, paper_id: str) -> None:
+    conn.execute("UPDATE papers SET last_viewed_at = ? WHERE id = ?", (now_iso(), paper_id))
     conn.commit()
 
 
 def delete_paper(conn: sqlite3.Connection, paper_id: str) -> None:
     conn.execute("DELETE FROM papers WHERE id = ?", (paper_id,))
+    conn.execute("DELETE FROM abbreviations WHERE paper_id = ?", (paper_id,))
+    conn.execute("DELETE FROM blob_refs WHERE owner = ?", (paper_id,))
+    _sync_facets(conn, paper_id, None)
     conn.commit()
 
 
@@ -108,3 +250,120 @@ def fetch_papers(conn: sqlite3.Connection) -> Iterable[PaperRecord]:
 def fetch_paper(conn: sqlite3.Connection, paper_id: str) -> Optional[PaperRecord]:
     row = conn.execute("SELECT * FROM papers WHERE id = ?", (paper_id,)).fetchone()
     return PaperRecord(**dict(row)) if row else None
+
+
+def fetch_paper_ids(conn: sqlite3.Connection) -> Set[str]:
+    return {row[0] for row in conn.execute("SELECT id FROM papers")}
+
+
+def fetch_papers_updated_since(conn: sqlite3.Connection, since: Optional[str]) -> Iterable[PaperRecord]:
+    if since:
+        rows = conn.execute("SELECT * FROM papers WHERE updated_at > ? ORDER BY updated_at", (since,)).fetchall()
+    else:
+        rows = conn.execute("SELECT * FROM papers ORDER BY updated_at").fetchall()
+    for row in rows:
+        yield PaperRecord(**dict(row))
+
+
+def fetch_stale_paper_ids(conn: sqlite3.Connection, version: int, limit: int = -1) -> list[str]:
+    rows = conn.execute(
+        """
+        SELECT id FROM papers
+        WHERE pipeline_version != ?
+        ORDER BY last_viewed_at IS NULL, last_viewed_at DESC, added_at DESC
+        LIMIT ?
+        """,
+        (version, limit),
+    ).fetchall()
+    return [row["id"] for row in rows]
+
+
+def count_stale_papers(conn: sqlite3.Connection, version: int) -> int:
+    return conn.execute("SELECT COUNT(*) FROM papers WHERE pipeline_version != ?", (version,)).fetchone()[0]
+
+
+def fetch_facet_counts(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    facets: Dict[str, Dict[str, int]] = {}
+    for row in conn.execute("SELECT facet, value, papers FROM facet_counts ORDER BY facet, papers DESC, value"):
+        facets.setdefault(row[0], {})[row[1]] = row[2]
+    return facets
+
+
+def fetch_library_stats(conn: sqlite3.Connection) -> Dict[str, object]:
+    facets = fetch_facet_counts(conn)
+    return {
+        "papers": facets.get("all", {}).get("", 0),
+        "by_status": facets.get("status", {}),
+        "by_year": dict(sorted(facets.get("year", {}).items())),
+        "by_category": facets.get("category", {}),
+        "by_tag": facets.get("tag", {}),
+    }
+
+
+def replace_abbreviations(conn: sqlite3.Connection, paper_id: str, pairs: Iterable[tuple[str, str]]) -> None:
+    conn.execute("DELETE FROM abbreviations WHERE paper_id = ?", (paper_id,))
+    conn.executemany(
+        "INSERT OR IGNORE INTO abbreviations (term, expansion, paper_id) VALUES (?, ?, ?)",
+        [(term, expansion, paper_id) for term, expansion in pairs],
+    )
+    conn.commit()
+
+
+def fetch_abbreviations(conn: sqlite3.Connection) -> Dict[str, str]:
+    rows = conn.execute(
+        """
+        SELECT term, expansion, COUNT(*) AS papers, MIN(rowid) AS first_seen
+        FROM abbreviations
+        GROUP BY term, expansion
+        ORDER BY term, papers DESC, first_seen
+        """
+    ).fetchall()
+    entries: Dict[str, str] = {}
+    for row in rows:
+        entries.setdefault(row["term"], row["expansion"])
+    return entries
+
+
+def add_blob_ref(conn: sqlite3.Connection, digest: str, size: int, owner: str) -> bool:
+    now = now_iso()
+    created = conn.execute(
+        "INSERT OR IGNORE INTO blobs (digest, size, last_put_at) VALUES (?, ?, ?)", (digest, size, now)
+    ).rowcount == 1
+    if not created:
+        conn.execute("UPDATE blobs SET last_put_at = ? WHERE digest = ?", (now, digest))
+    conn.execute("INSERT OR IGNORE INTO blob_refs (digest, owner) VALUES (?, ?)", (digest, owner))
+    conn.commit()
+    return created
+
+
+def release_blob_refs(conn: sqlite3.Connection, owner: str) -> None:
+    conn.execute("DELETE FROM blob_refs WHERE owner = ?", (owner,))
+    conn.commit()
+
+
+def blob_refcount(conn: sqlite3.Connection, digest: str) -> int:
+    return conn.execute("SELECT COUNT(*) FROM blob_refs WHERE digest = ?", (digest,)).fetchone()[0]
+
+
+def fetch_unreferenced_blobs(conn: sqlite3.Connection, before: str) -> list[str]:
+    rows = conn.execute(
+        """
+        SELECT digest FROM blobs
+        WHERE last_put_at < ? AND NOT EXISTS (SELECT 1 FROM blob_refs WHERE blob_refs.digest = blobs.digest)
+        """,
+        (before,),
+    ).fetchall()
+    return [row["digest"] for row in rows]
+
+
+def delete_blob_if_unreferenced(conn: sqlite3.Connection, digest: str, before: str) -> bool:
+    cursor = conn.execute(
+        """
+        DELETE FROM blobs
+        WHERE digest = ? AND last_put_at < ?
+          AND NOT EXISTS (SELECT 1 FROM blob_refs WHERE blob_refs.digest = blobs.digest)
+        """,
+        (digest, before),
+    )
+    # Not committed: the caller removes the object first, holding the write lock against a concurrent put.
+    return cursor.rowcount == 1
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from distiller import db
+from distiller.storage import BUNDLE_FILENAME, StorageManager
+from distiller.utils import days_ago_iso, now_iso
+
+STATE_FILENAME = "digest_state.json"
+ENTRIES_DIRNAME = "entries"
+DIGEST_FORMATS = ("markdown", "site")
+# Bump when the entry template changes so cached entries are rebuilt.
+TEMPLATE_VERSION = 2
+
+
+@dataclass
+class DigestResult:
+    format: str
+    papers: int = 0
+    rendered: int = 0
+    reused: int = 0
+    removed: int = 0
+    path: Optional[Path] = None
+    since: Optional[str] = None
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+def _paper_fields(paper: db.PaperRecord) -> Dict[str, Any]:
+    return {
+        "id": paper.id,
+        "title": paper.display_title,
+        "authors": paper.authors,
+        "year": int(paper.year) if paper.year is not None else None,
+        "category": paper.category,
+    }
+
+
+def _entry_key(paper: Dict[str, Any], content: bytes) -> str:
+    digest = hashlib.sha256(content)
+    digest.update(json.dumps(paper, sort_keys=True).encode("utf-8"))
+    digest.update(str(TEMPLATE_VERSION).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _render_entry(paper: Dict[str, Any], content: bytes) -> Tuple[Optional[str], List[Tuple[str, str]], Optional[str]]:
+    from distiller import renderers
+
+    try:
+        outputs = json.loads(content)
+        glossary = [(term["term"], term.get("definition")) for term in outputs.get("glossary_terms", []) if term.get("term")]
+        return renderers.render_digest_entry(paper, outputs), glossary, None
+    except Exception as exc:
+        return None, [], f"{type(exc).__name__}: {exc}"
+
+
+def _chunks(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def load_state(out_dir: Path) -> Dict[str, Any]:
+    path = out_dir / STATE_FILENAME
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def _write_text(path: Path, text: str) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def _glossary_lines(entries: Dict[str, Dict[str, Any]], order: Sequence[str]) -> Iterator[str]:
+    terms: Dict[str, Tuple[str, int]] = {}
+    for paper_id in order:
+        for term, definition in entries[paper_id]["glossary"]:
+            first, count = terms.get(term, (definition, 0))
+            terms[term] = (first, count + 1)
+    for term in sorted(terms, key=str.lower):
+        definition, count = terms[term]
+        yield f"- **{term}**: {definition}" + (f" ({count} papers)\n" if count > 1 else "\n")
+
+
+def _write_document(path: Path, title: str, entries_dir: Path, entries: Dict[str, Dict[str, Any]], order: Sequence[str]) -> None:
+    # Entries are streamed from disk one at a time, so the document never has to fit in memory.
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as handle:
+        handle.write(f"# {title}\n\n{len(order)} papers · generated {now_iso()[:16]}\n\n")
+        for paper_id in order:
+            handle.write((entries_dir / f"{paper_id}.md").read_text(encoding="utf-8"))
+            handle.write("\n")
+        handle.write("# Library Glossary\n\n")
+        handle.writelines(_glossary_lines(entries, order))
+    tmp_path.replace(path)
+
+
+def _write_site(out_dir: Path, title: str, entries: Dict[str, Dict[str, Any]], order: Sequence[str]) -> Path:
+    index_path = out_dir / "index.md"
+    tmp_path = index_path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as handle:
+        handle.write(f"# {title}\n\n{len(order)} papers · generated {now_iso()[:16]}\n\n")
+        handle.writelines(f"- [{entries[paper_id]['title']}]({ENTRIES_DIRNAME}/{paper_id}.md)\n" for paper_id in order)
+        handle.write("\n[Library glossary](glossary.md)\n")
+    tmp_path.replace(index_path)
+    with (out_dir / "glossary.tmp").open("w", encoding="utf-8") as handle:
+        handle.write("# Library Glossary\n\n")
+        handle.writelines(_glossary_lines(entries, order))
+    (out_dir / "glossary.tmp").replace(out_dir / "glossary.md")
+    return index_path
+
+
+def build_digest(
+    db_path: Path,
+    storage: StorageManager,
+    out_dir: Path,
+    fmt: str = "markdown",
+    since: Optional[str] = None,
+    title: str = "Library Digest",
+    workers: int = 2,
+    chunk_size: int = 64,
+) -> DigestResult:
+    if fmt not in DIGEST_FORMATS:
+        raise ValueError(f"Unknown digest format: {fmt}")
+    entries_dir = out_dir / ENTRIES_DIRNAME
+    entries_dir.mkdir(parents=True, exist_ok=True)
+    cached: Dict[str, Dict[str, Any]] = load_state(out_dir).get("entries", {})
+    with db.get_connection(db_path) as conn:
+        papers = list(db.fetch_papers_updated_since(conn, since))[::-1]
+
+    result = DigestResult(format=fmt, since=since)
+    entries: Dict[str, Dict[str, Any]] = {}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        for chunk in _chunks(papers, chunk_size):
+            pending = []
+            for paper in chunk:
+                content = storage.read_bytes(paper.id, BUNDLE_FILENAME)
+                if not content:
+                    continue
+                fields = _paper_fields(paper)
+                key = _entry_key(fields, content)
+                entry = cached.get(paper.id)
+                if entry and entry["key"] == key and (entries_dir / f"{paper.id}.md").exists():
+                    entries[paper.id] = entry
+                    result.reused += 1
+                else:
+                    pending.append((fields, content, key))
+            # Only changed bundles are parsed and rendered; the chunk bounds how many are in flight at once.
+            fields_list = [item[0] for item in pending]
+            contents = [item[1] for item in pending]
+            rendered = pool.map(_render_entry, fields_list, contents) if pool else map(_render_entry, fields_list, contents)
+            for (fields, _, key), (text, glossary, error) in zip(pending, rendered):
+                if error:
+                    result.failed[fields["id"]] = error
+                    continue
+                _write_text(entries_dir / f"{fields['id']}.md", text)
+                entries[fields["id"]] = {"key": key, "title": fields["title"], "glossary": glossary}
+                result.rendered += 1
+    finally:
+        if pool:
+            pool.shutdown()
+
+    if since is None:
+        for paper_id in set(cached) - set(entries) - set(result.failed):
+            (entries_dir / f"{paper_id}.md").unlink(missing_ok=True)
+            result.removed += 1
+        state_entries = entries
+    else:
+        # A partial (e.g. weekly) build keeps older cached entries for the next full build.
+        state_entries = {**cached, **entries}
+    order = [paper.id for paper in papers if paper.id in entries]
+    result.papers = len(order)
+    if fmt == "markdown":
+        result.path = out_dir / "digest.md"
+        _write_document(result.path, title, entries_dir, entries, order)
+    else:
+        result.path = _write_site(out_dir, title, entries, order)
+    _write_text(
+        out_dir / STATE_FILENAME,
+        json.dumps({"template_version": TEMPLATE_VERSION, "built_at": now_iso(), "entries": state_entries}, ensure_ascii=False),
+    )
+    return result
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Render a digest of story lines, contributions and glossary for many papers.")
+    parser.add_argument("--data-dir", type=Path, default=Path(__file__).resolve().parents[1] / "data")
+    parser.add_argument("--out", type=Path, default=None)
+    parser.add_argument("--format", choices=DIGEST_FORMATS, default="markdown")
+    parser.add_argument("--days", type=int, default=None, help="Only include papers updated in the last N days.")
+    parser.add_argument("--title", default=None)
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) // 2, 1))
+    args = parser.parse_args(argv)
+
+    since = days_ago_iso(args.days) if args.days else None
+    out_dir = args.out or args.data_dir / "exports" / "digest"
+    title = args.title or (f"Weekly Digest ({now_iso()[:10]})" if args.days == 7 else "Library Digest")
+    result = build_digest(
+        args.data_dir / db.DB_FILENAME,
+        StorageManager(args.data_dir / "papers"),
+        out_dir,
+        fmt=args.format,
+        since=since,
+        title=title,
+        workers=args.workers,
+    )
+    print(f"Digest of {result.papers} papers -> {result.path}")
+    print(f"  rendered: {result.rendered}, unchanged: {result.reused}, removed: {result.removed}, failed: {len(result.failed)}")
+    for paper_id, error in result.failed.items():
+        print(f"  {paper_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 import re
-from typing import List, Tuple
-
-from wordfreq import zipf_frequency
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
+from distiller.glossary import GlossaryDictionary, hit_context, scan_glossary
+from distiller.llm_provider import BaseProvider, MockProvider
+from distiller.prompting import PromptBudget, PromptBuilder
+from distiller.quality import filter_pages
+from distiller.retrieval import BM25Index, chunk_pages
 from distiller.schemas import (
     AdvancedVocabularyItem,
     Contributions,
@@ -16,6 +19,7 @@ from distiller.schemas import (
     OutputBundle,
     StoryLine,
 )
+from distiller.stream_parser import BUNDLE_SECTIONS, BundleStreamParser
 
 MAX_QUOTE_CHARS = 160
 
@@ -25,19 +29,63 @@ def _short_quote(text: str) -> str:
     return trimmed[:MAX_QUOTE_CHARS]
 
 
-def _page_evidence(pages: List[Tuple[int, str]]) -> tuple[int | None, str]:
+def _page_evidence(
+    pages: List[Tuple[int, str]], index: Optional[BM25Index] = None, query: str = ""
+) -> tuple[int | None, str]:
+    ranked = _ranked_evidence(index, query, 1)
+    if ranked:
+        return ranked[0]
     for page_num, text in pages:
         if text.strip():
             return page_num, _short_quote(text)
     return None, ""
 
 
+def _ranked_evidence(index: Optional[BM25Index], query: str, k: int) -> List[tuple[int, str]]:
+    if index is None or not query:
+        return []
+    return [(passage.page, _short_quote(passage.text)) for passage, _ in index.search(query, k)]
+
+
 def _make_evidence(quote: str, page: int | None, citation_key: str | None, level: str) -> Evidence:
     return Evidence(quote=quote, page=page, citation_key=citation_key, evidence_level=level)
 
 
-def extract_story_line(pages: List[Tuple[int, str]]) -> StoryLine:
-    page_num, quote = _page_evidence(pages)
+STORY_STAGES = [
+    ("Motivation: why the topic matters.", "motivation importance challenge problem"),
+    ("Gap: what is missing in prior work.", "gap prior work however limited lack"),
+    ("Method: how the study approaches the problem.", "method approach propose model framework"),
+    ("Results: key outcomes reported.", "results show outperform improvement performance"),
+    ("Implications: why the findings are meaningful.", "implications conclusion future impact"),
+]
+
+EVIDENCE_QUERIES = {
+    "summary": "paper propose study approach results",
+    "intro": "introduction background motivation recent studies",
+    "Innovation": "novel contribution propose first new",
+    "Finding": "results show find demonstrate significant",
+    "Implication": "implications suggest future practice",
+    "Method": "method approach model framework",
+    "Process step": "procedure step first then dataset training",
+    "Assumption": "assume assumption given suppose",
+    "Limitation": "limitation limitations future work however",
+}
+
+
+def _evidence_for(
+    pages: List[Tuple[int, str]], index: Optional[BM25Index], query: str, count: int
+) -> List[Evidence]:
+    ranked = _ranked_evidence(index, query, count)
+    fallback_page, fallback_quote = _page_evidence(pages)
+    evidence = []
+    for i in range(count):
+        page_num, quote = ranked[i] if i < len(ranked) else (fallback_page, fallback_quote)
+        evidence.append(_make_evidence(quote or "", page_num, None, "low" if not quote else "medium"))
+    return evidence
+
+
+def extract_story_line(pages: List[Tuple[int, str]], index: Optional[BM25Index] = None) -> StoryLine:
+    page_num, quote = _page_evidence(pages, index, EVIDENCE_QUERIES["summary"])
     evidence = _make_evidence(quote or "", page_num, None, "low" if not quote else "medium")
     summary = EvidenceItem(
         text="This paper addresses a research gap, outlines a method, and discusses implications based on reported findings.",
@@ -46,29 +94,21 @@ def extract_story_line(pages: List[Tuple[int, str]]) -> StoryLine:
         notes="Mock summary generated from available text.",
     )
     bullets = []
-    stages = [
-        "Motivation: why the topic matters.",
-        "Gap: what is missing in prior work.",
-        "Method: how the study approaches the problem.",
-        "Results: key outcomes reported.",
-        "Implications: why the findings are meaningful.",
-    ]
-    for stage in stages:
+    for stage, query in STORY_STAGES:
         bullets.append(
             EvidenceItem(
                 text=stage,
                 type="inference",
-                evidence=evidence,
+                evidence=_evidence_for(pages, index, query, 1)[0],
                 notes="Placeholder bullet; regenerate with LLM for stronger grounding.",
             )
         )
     return StoryLine(one_paragraph_summary=summary, bullets=bullets)
 
 
-def extract_intro_evidence(pages: List[Tuple[int, str]]) -> List[IntroEvidenceRow]:
-    page_num, quote = _page_evidence(pages)
+def extract_intro_evidence(pages: List[Tuple[int, str]], index: Optional[BM25Index] = None) -> List[IntroEvidenceRow]:
     rows = []
-    for idx in range(1, 9):
+    for idx, evidence in enumerate(_evidence_for(pages, index, EVIDENCE_QUERIES["intro"], 8), start=1):
         rows.append(
             IntroEvidenceRow(
                 claim_id=f"C{idx:02d}",
@@ -78,90 +118,90 @@ def extract_intro_evidence(pages: List[Tuple[int, str]]) -> List[IntroEvidenceRo
                 value=None,
                 unit=None,
                 context="Motivation for the study.",
-                evidence_quote=quote,
-                page=page_num,
+                evidence_quote=evidence.quote,
+                page=evidence.page,
                 citation_key=None,
                 reference_entry=None,
-                evidence_level="low" if not quote else "medium",
+                evidence_level=evidence.evidence_level,
                 notes="Placeholder; update with extracted claims when available.",
             )
         )
     return rows
 
 
-def extract_contributions(pages: List[Tuple[int, str]]) -> Contributions:
-    page_num, quote = _page_evidence(pages)
-    evidence = _make_evidence(quote, page_num, None, "low" if not quote else "medium")
-    def _items(prefix: str, count: int) -> List[EvidenceItem]:
-        return [
-            EvidenceItem(
-                text=f"{prefix} placeholder {i + 1}.",
-                type="inference",
-                evidence=evidence,
-                notes="Mock output; replace with grounded extraction.",
-            )
-            for i in range(count)
-        ]
+def _placeholder_items(
+    pages: List[Tuple[int, str]], index: Optional[BM25Index], prefix: str, count: int
+) -> List[EvidenceItem]:
+    return [
+        EvidenceItem(
+            text=f"{prefix} placeholder {i + 1}.",
+            type="inference",
+            evidence=evidence,
+            notes="Mock output; replace with grounded extraction.",
+        )
+        for i, evidence in enumerate(_evidence_for(pages, index, EVIDENCE_QUERIES[prefix], count))
+    ]
+
 
+def extract_contributions(pages: List[Tuple[int, str]], index: Optional[BM25Index] = None) -> Contributions:
     return Contributions(
-        innovations=_items("Innovation", 3),
-        key_findings=_items("Finding", 3),
-        implications=_items("Implication", 2),
+        innovations=_placeholder_items(pages, index, "Innovation", 3),
+        key_findings=_placeholder_items(pages, index, "Finding", 3),
+        implications=_placeholder_items(pages, index, "Implication", 2),
     )
 
 
-def extract_methods_limits(pages: List[Tuple[int, str]]) -> MethodsAndLimits:
-    page_num, quote = _page_evidence(pages)
-    evidence = _make_evidence(quote, page_num, None, "low" if not quote else "medium")
-    def _items(prefix: str, count: int) -> List[EvidenceItem]:
-        return [
-            EvidenceItem(
-                text=f"{prefix} placeholder {i + 1}.",
-                type="inference",
-                evidence=evidence,
-                notes="Mock output; replace with grounded extraction.",
-            )
-            for i in range(count)
-        ]
-
+def extract_methods_limits(pages: List[Tuple[int, str]], index: Optional[BM25Index] = None) -> MethodsAndLimits:
     return MethodsAndLimits(
-        method_summary=_items("Method", 5),
-        process_steps=_items("Process step", 5),
-        assumptions=_items("Assumption", 3),
-        limitations=_items("Limitation", 3),
+        method_summary=_placeholder_items(pages, index, "Method", 5),
+        process_steps=_placeholder_items(pages, index, "Process step", 5),
+        assumptions=_placeholder_items(pages, index, "Assumption", 3),
+        limitations=_placeholder_items(pages, index, "Limitation", 3),
     )
 
 
-def _find_glossary_candidates(pages: List[Tuple[int, str]]) -> List[Tuple[str, int, str]]:
-    candidates: List[Tuple[str, int, str]] = []
-    pattern = re.compile(r"\b[A-Z]{2,}\b")
-    for page_num, text in pages:
-        for match in pattern.finditer(text):
-            term = match.group(0)
-            if term not in {"THE", "AND", "FOR"}:
-                quote = _short_quote(text[max(0, match.start() - 40): match.end() + 40])
-                candidates.append((term, page_num, quote))
-        if len(candidates) > 60:
-            break
-    return candidates
+MAX_GLOSSARY_TERMS = 20
+DEFINED_IN_PAPER_NOTE = "First definition in this paper."
 
 
-def extract_glossary(pages: List[Tuple[int, str]]) -> List[GlossaryTerm]:
+def extract_glossary(pages: List[Tuple[int, str]], dictionary: Optional[GlossaryDictionary] = None) -> List[GlossaryTerm]:
     terms = []
-    candidates = _find_glossary_candidates(pages)
-    if not candidates:
+    page_text = dict(pages)
+    hits = scan_glossary(pages, dictionary)[:MAX_GLOSSARY_TERMS]
+    for hit in hits:
+        quote = _short_quote(hit_context(page_text, hit))
+        if hit.defined_here:
+            definition, notes, source = f"Defined in the paper as {hit.expansion}.", DEFINED_IN_PAPER_NOTE, "paper"
+        elif hit.expansion:
+            definition, notes, source = f"Usually expands to {hit.expansion}.", "Expansion from the library abbreviation dictionary.", "dictionary"
+        else:
+            definition, notes, source = "Placeholder definition derived from paper usage.", "Mock glossary term; update with extracted definitions.", None
+        terms.append(
+            GlossaryTerm(
+                term=hit.term,
+                term_type="abbreviation",
+                expansion=hit.expansion,
+                zh="",
+                definition=definition,
+                paper_usage_quote=quote,
+                page=hit.page,
+                citation_key=None,
+                evidence_level="low" if not quote else "medium",
+                notes=notes,
+                source=source,
+            )
+        )
+    if not terms:
         page_num, quote = _page_evidence(pages)
-        candidates = [("TERM", page_num or 1, quote)]
-    for term, page_num, quote in candidates[:20]:
         terms.append(
             GlossaryTerm(
-                term=term,
+                term="TERM",
                 term_type="abbreviation",
                 expansion=None,
                 zh="",
                 definition="Placeholder definition derived from paper usage.",
                 paper_usage_quote=quote,
-                page=page_num,
+                page=page_num or 1,
                 citation_key=None,
                 evidence_level="low" if not quote else "medium",
                 notes="Mock glossary term; update with extracted definitions.",
@@ -170,6 +210,14 @@ def extract_glossary(pages: List[Tuple[int, str]]) -> List[GlossaryTerm]:
     return terms
 
 
+LEARNED_SOURCES = ("paper", "llm")
+
+
+def learned_abbreviations(terms: List[GlossaryTerm]) -> List[Tuple[str, str]]:
+    # Dictionary expansions are not learned back, so the dictionary cannot reinforce itself.
+    return [(term.term, term.expansion) for term in terms if term.expansion and term.source in LEARNED_SOURCES]
+
+
 def _candidate_vocab(text: str) -> List[str]:
     words = re.findall(r"[A-Za-z][A-Za-z\-]{2,}", text)
     seen = []
@@ -181,6 +229,8 @@ def _candidate_vocab(text: str) -> List[str]:
 
 
 def extract_vocabulary(pages: List[Tuple[int, str]]) -> List[AdvancedVocabularyItem]:
+    from wordfreq import zipf_frequency
+
     items: List[AdvancedVocabularyItem] = []
     for page_num, text in pages:
         candidates = _candidate_vocab(text)
@@ -225,14 +275,130 @@ def extract_vocabulary(pages: List[Tuple[int, str]]) -> List[AdvancedVocabularyI
     return items
 
 
-def build_output_bundle(pages: List[Tuple[int, str]]) -> OutputBundle:
-    bundle = OutputBundle(
-        story_line=extract_story_line(pages),
-        intro_evidence_table=extract_intro_evidence(pages),
-        contributions_and_implications=extract_contributions(pages),
-        method_process_limits=extract_methods_limits(pages),
-        glossary_terms=extract_glossary(pages),
-        advanced_vocabulary=extract_vocabulary(pages),
-        metadata={"generated_by": "mock"},
-    )
-    return bundle
+BUNDLE_INSTRUCTION = (
+    "Read the paper excerpts and answer with one JSON object with the keys "
+    + ", ".join(BUNDLE_SECTIONS)
+    + ", in that order. Follow the field names of the Paper Distiller schema, quote evidence verbatim "
+    "and give the page number from the [p.N] markers."
+)
+SECTION_INSTRUCTION = (
+    "Read the paper excerpts and answer with one JSON object with the single key {name}. "
+    "Follow the field names of the Paper Distiller schema, quote evidence verbatim "
+    "and give the page number from the [p.N] markers."
+)
+SECTION_QUERIES = {
+    "story_line": " ".join(query for _, query in STORY_STAGES),
+    "intro_evidence_table": EVIDENCE_QUERIES["intro"],
+    "contributions_and_implications": " ".join(EVIDENCE_QUERIES[key] for key in ("Innovation", "Finding", "Implication")),
+    "method_process_limits": " ".join(
+        EVIDENCE_QUERIES[key] for key in ("Method", "Process step", "Assumption", "Limitation")
+    ),
+    "glossary_terms": "defined as refers to known as abbreviation term definition",
+    "advanced_vocabulary": EVIDENCE_QUERIES["summary"],
+}
+
+
+def _heuristic_sections(
+    pages: List[Tuple[int, str]],
+    index: BM25Index,
+    dictionary: Optional[GlossaryDictionary] = None,
+    only: Optional[Sequence[str]] = None,
+) -> Iterator[Tuple[str, Any]]:
+    extractors = {
+        "story_line": lambda: extract_story_line(pages, index),
+        "intro_evidence_table": lambda: extract_intro_evidence(pages, index),
+        "contributions_and_implications": lambda: extract_contributions(pages, index),
+        "method_process_limits": lambda: extract_methods_limits(pages, index),
+        "glossary_terms": lambda: extract_glossary(pages, dictionary),
+        "advanced_vocabulary": lambda: extract_vocabulary(pages),
+    }
+    for name, extract in extractors.items():
+        if only is None or name in only:
+            yield name, extract()
+
+
+def _tag_llm_terms(name: str, value: Any) -> Any:
+    if name == "glossary_terms":
+        for term in value:
+            term.source = term.source or "llm"
+    return value
+
+
+def _llm_sections(index: BM25Index, provider: BaseProvider, metadata: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    builder = PromptBuilder(provider, PromptBudget.for_provider(provider, max_output_tokens=4096))
+    parser = BundleStreamParser()
+    seen = set()
+    try:
+        try:
+            for chunk in builder.stream_packed(BUNDLE_INSTRUCTION, index, " ".join(EVIDENCE_QUERIES.values())):
+                for name, value in parser.feed(chunk):
+                    if name == "metadata":
+                        # Model-reported metadata is kept apart so it cannot overwrite our own keys.
+                        if isinstance(value, dict):
+                            metadata["model_metadata"] = value
+                        continue
+                    seen.add(name)
+                    yield name, _tag_llm_terms(name, value)
+        except Exception as exc:
+            # A dropped stream keeps the sections already parsed; the rest are retried or filled below.
+            parser.errors.append(f"stream: {type(exc).__name__}: {exc}")
+        # Sections the single packed call dropped get one more packed call over that section's evidence,
+        # so each retry costs at most one context window.
+        for name in BUNDLE_SECTIONS:
+            if name in seen:
+                continue
+            try:
+                response = builder.run_packed(SECTION_INSTRUCTION.format(name=name), index, SECTION_QUERIES[name])
+            except Exception as exc:
+                metadata.setdefault("section_errors", {})[name] = f"{type(exc).__name__}: {exc}"
+                continue
+            section_parser = BundleStreamParser()
+            for parsed_name, value in section_parser.feed(response):
+                if parsed_name == name:
+                    seen.add(name)
+                    yield name, _tag_llm_terms(name, value)
+            parser.errors.extend(section_parser.errors)
+    finally:
+        metadata["tokens"] = builder.report.as_dict()
+        if parser.errors:
+            metadata["stream_errors"] = parser.errors
+
+
+def iter_output_sections(
+    pages: List[Tuple[int, str]],
+    skip_pages: Optional[Set[int]] = None,
+    index: Optional[BM25Index] = None,
+    provider: Optional[BaseProvider] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    dictionary: Optional[GlossaryDictionary] = None,
+) -> Iterator[Tuple[str, Any]]:
+    pages = filter_pages(pages, skip_pages)
+    if index is None:
+        index = BM25Index.build(chunk_pages(pages))
+    metadata = metadata if metadata is not None else {}
+    if provider is None or isinstance(provider, MockProvider):
+        metadata["generated_by"] = "mock"
+        yield from _heuristic_sections(pages, index, dictionary)
+        return
+    metadata["generated_by"] = type(provider).__name__
+    seen = set()
+    for name, value in _llm_sections(index, provider, metadata):
+        if name not in seen:
+            seen.add(name)
+            yield name, value
+    missing = [name for name in BUNDLE_SECTIONS if name not in seen]
+    if missing:
+        metadata["heuristic_sections"] = missing
+        yield from _heuristic_sections(pages, index, dictionary, only=missing)
+
+
+def build_output_bundle(
+    pages: List[Tuple[int, str]],
+    skip_pages: Optional[Set[int]] = None,
+    index: Optional[BM25Index] = None,
+    provider: Optional[BaseProvider] = None,
+    dictionary: Optional[GlossaryDictionary] = None,
+) -> OutputBundle:
+    metadata: Dict[str, Any] = {}
+    sections = dict(iter_output_sections(pages, skip_pages, index, provider, metadata, dictionary))
+    return OutputBundle(**sections, metadata=metadata)
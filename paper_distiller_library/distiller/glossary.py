@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFINITION_PATTERN = re.compile(r"\(\s*([A-Za-z][A-Za-z0-9\-]{1,11}s?)\s*\)")
+ALL_CAPS_PATTERN = re.compile(r"\b[A-Z]{2,}\b")
+STOP_TERMS = {"THE", "AND", "FOR"}
+CONTEXT_CHARS = 40
+MAX_LONG_FORM_WORDS = 10
+RECENT_MERGE_THRESHOLD = 1024
+
+
+@dataclass
+class GlossaryHit:
+    term: str
+    expansion: Optional[str]
+    page: int
+    start: int
+    end: int
+    defined_here: bool
+
+
+def _is_abbreviation(candidate: str) -> bool:
+    return sum(char.isupper() for char in candidate) >= 2 and not candidate.isdigit()
+
+
+def _long_form(short: str, preceding: str) -> Optional[str]:
+    s_index = len(short) - 1
+    l_index = len(preceding) - 1
+    while s_index >= 0:
+        char = short[s_index].lower()
+        if not char.isalnum():
+            s_index -= 1
+            continue
+        while l_index >= 0 and (
+            preceding[l_index].lower() != char
+            or (s_index == 0 and l_index > 0 and preceding[l_index - 1].isalnum())
+        ):
+            l_index -= 1
+        if l_index < 0:
+            return None
+        l_index -= 1
+        s_index -= 1
+    start = preceding.rfind(" ", 0, l_index + 1) + 1
+    long_form = preceding[start:].strip()
+    if len(long_form) <= len(short) or long_form.upper() == long_form:
+        return None
+    return long_form
+
+
+def find_definitions(text: str) -> Iterator[Tuple[str, str, int, int]]:
+    for match in DEFINITION_PATTERN.finditer(text):
+        short = match.group(1)
+        if short.endswith("s") and short[:-1].isupper():
+            short = short[:-1]
+        if not _is_abbreviation(short):
+            continue
+        window_words = min(len(short) + 5, len(short) * 2, MAX_LONG_FORM_WORDS)
+        preceding = " ".join(text[max(0, match.start() - 200): match.start()].split()[-window_words:])
+        preceding = re.split(r"[.;:()\[\]]", preceding)[-1]
+        long_form = _long_form(short, preceding)
+        if long_form:
+            yield short, long_form, match.start(), match.end()
+
+
+class AhoCorasick:
+    def __init__(self, terms: Iterable[str]) -> None:
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Optional[str]] = [None]
+        self.dict_suffix: List[int] = [0]
+        for term in terms:
+            self._add(term)
+        self._link()
+
+    def _add(self, term: str) -> None:
+        node = 0
+        for char in term:
+            nxt = self.goto[node].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+                self.dict_suffix.append(0)
+            node = nxt
+        self.output[node] = term
+
+    def _link(self) -> None:
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                link = self.fail[child]
+                self.dict_suffix[child] = link if self.output[link] is not None else self.dict_suffix[link]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        goto, fail, output, dict_suffix = self.goto, self.fail, self.output, self.dict_suffix
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            match = node if output[node] is not None else dict_suffix[node]
+            while match:
+                term = output[match]
+                yield position + 1 - len(term), position + 1, term
+                match = dict_suffix[match]
+
+
+class GlossaryDictionary:
+    def __init__(self, entries: Optional[Dict[str, str]] = None) -> None:
+        self.entries: Dict[str, str] = dict(entries or {})
+        self._base: Optional[AhoCorasick] = None
+        self._recent: Dict[str, str] = {}
+        self._recent_matcher: Optional[AhoCorasick] = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def update(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        for term, expansion in pairs:
+            if term in self.entries:
+                continue
+            self.entries[term] = expansion
+            if self._base is not None:
+                self._recent[term] = expansion
+                self._recent_matcher = None
+        if len(self._recent) > RECENT_MERGE_THRESHOLD:
+            self._base = None
+            self._recent = {}
+
+    @property
+    def matchers(self) -> List[AhoCorasick]:
+        if self._base is None:
+            self._base = AhoCorasick(self.entries)
+            self._recent = {}
+            self._recent_matcher = None
+        if not self._recent:
+            return [self._base]
+        if self._recent_matcher is None:
+            self._recent_matcher = AhoCorasick(self._recent)
+        return [self._base, self._recent_matcher]
+
+
+def _at_word_boundary(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not before.isalnum() and not after.isalnum()
+
+
+def scan_glossary(pages: List[Tuple[int, str]], dictionary: Optional[GlossaryDictionary] = None) -> List[GlossaryHit]:
+    local: Dict[str, GlossaryHit] = {}
+    for page_num, text in pages:
+        for short, long_form, start, end in find_definitions(text):
+            if short not in local:
+                local[short] = GlossaryHit(short, long_form, page_num, start, end, defined_here=True)
+
+    hits: Dict[str, GlossaryHit] = dict(local)
+    entries = dictionary.entries if dictionary is not None else {}
+    matchers = dictionary.matchers if dictionary is not None and len(dictionary) else []
+    unknown: Dict[str, GlossaryHit] = {}
+    for page_num, text in pages:
+        for matcher in matchers:
+            for start, end, term in matcher.finditer(text):
+                if term not in hits and _at_word_boundary(text, start, end):
+                    hits[term] = GlossaryHit(term, entries[term], page_num, start, end, defined_here=False)
+        for match in ALL_CAPS_PATTERN.finditer(text):
+            term = match.group(0)
+            if term not in STOP_TERMS and term not in entries and term not in local and term not in unknown:
+                unknown[term] = GlossaryHit(term, None, page_num, match.start(), match.end(), defined_here=False)
+
+    ordered = sorted(hits.values(), key=lambda hit: (hit.page, hit.start))
+    ordered.extend(sorted(unknown.values(), key=lambda hit: (hit.page, hit.start)))
+    return ordered
+
+
+def hit_context(pages: Dict[int, str], hit: GlossaryHit) -> str:
+    text = pages.get(hit.page, "")
+    return text[max(0, hit.start - CONTEXT_CHARS): hit.end + CONTEXT_CHARS]
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from distiller import db
+from distiller.schemas import AdvancedVocabularyItem, GlossaryTerm, IntroEvidenceRow
+from distiller.storage import BUNDLE_FILENAME, StorageManager
+from distiller.utils import now_iso
+
+EXPORT_TABLES = {
+    "intro_evidence_table": IntroEvidenceRow,
+    "glossary_terms": GlossaryTerm,
+    "advanced_vocabulary": AdvancedVocabularyItem,
+}
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+PAPER_COLUMNS = ["paper_id", "paper_title", "paper_updated_at"]
+STATE_FILENAME = "export_state.json"
+
+
+@dataclass
+class ExportResult:
+    format: str
+    papers: int = 0
+    rows: Dict[str, int] = field(default_factory=dict)
+    files: Dict[str, Path] = field(default_factory=dict)
+    since: Optional[str] = None
+    last_updated_at: Optional[str] = None
+
+
+def _columns(table: str) -> List[str]:
+    return PAPER_COLUMNS + list(EXPORT_TABLES[table].model_fields)
+
+
+class _CsvWriter:
+    def __init__(self, path: Path, columns: List[str], append: bool) -> None:
+        if append and path.exists():
+            self._align_header(path, columns)
+        write_header = not (append and path.exists())
+        self.handle = path.open("a" if append else "w", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.handle, fieldnames=columns, extrasaction="ignore")
+        if write_header:
+            self.writer.writeheader()
+
+    @staticmethod
+    def _align_header(path: Path, columns: List[str]) -> None:
+        # A file written before a column was added is rewritten once under the current header before appending.
+        with path.open(encoding="utf-8", newline="") as handle:
+            if next(csv.reader(handle), None) == columns:
+                return
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with path.open(encoding="utf-8", newline="") as source, tmp_path.open("w", encoding="utf-8", newline="") as target:
+            writer = csv.DictWriter(target, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(csv.DictReader(source))
+        os.replace(tmp_path, path)
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.handle.close()
+
+
+class _JsonlWriter:
+    def __init__(self, path: Path, columns: List[str], append: bool) -> None:
+        self.columns = columns
+        self.handle = path.open("a" if append else "w", encoding="utf-8")
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self.handle.writelines(
+            json.dumps({column: row.get(column) for column in self.columns}, ensure_ascii=False) + "\n" for row in rows
+        )
+
+    def close(self) -> None:
+        self.handle.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path: Path, columns: List[str], append: bool, model: Any) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow).") from exc
+        self.pa = pa
+        fields = []
+        for column in columns:
+            annotation = model.model_fields[column].annotation if column in model.model_fields else str
+            fields.append(pa.field(column, pa.int64() if "int" in str(annotation) else pa.string()))
+        self.schema = pa.schema(fields)
+        if not append:
+            for stale in path.glob("part-*.parquet"):
+                stale.unlink()
+        path.mkdir(parents=True, exist_ok=True)
+        part = path / f"part-{now_iso().replace(':', '').replace('.', '')}.parquet"
+        self.writer = pq.ParquetWriter(part, self.schema)
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if rows:
+            self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def _open_writer(fmt: str, out_dir: Path, table: str, append: bool):
+    columns = _columns(table)
+    if fmt == "csv":
+        return out_dir / f"{table}.csv", _CsvWriter(out_dir / f"{table}.csv", columns, append)
+    if fmt == "jsonl":
+        return out_dir / f"{table}.jsonl", _JsonlWriter(out_dir / f"{table}.jsonl", columns, append)
+    if fmt == "parquet":
+        return out_dir / table, _ParquetWriter(out_dir / table, columns, append, EXPORT_TABLES[table])
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def _chunks(papers: Sequence[db.PaperRecord], size: int) -> Iterator[Sequence[db.PaperRecord]]:
+    for start in range(0, len(papers), size):
+        yield papers[start:start + size]
+
+
+def load_state(out_dir: Path) -> Dict[str, Any]:
+    path = out_dir / STATE_FILENAME
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def _save_state(out_dir: Path, fmt: str, last_updated_at: Optional[str], hashes: Dict[str, str]) -> None:
+    state = {"format": fmt, "last_updated_at": last_updated_at, "exported_at": now_iso(), "paper_hashes": hashes}
+    (out_dir / STATE_FILENAME).write_text(json.dumps(state, sort_keys=True), encoding="utf-8")
+
+
+def _load_outputs(storage: StorageManager, paper_id: str) -> Tuple[str, Dict[str, Any]]:
+    path = storage.paper_dir(paper_id) / BUNDLE_FILENAME
+    raw = path.read_bytes() if path.exists() else b""
+    return hashlib.sha256(raw).hexdigest(), json.loads(raw) if raw else {}
+
+
+def export_library(
+    db_path: Path,
+    storage: StorageManager,
+    out_dir: Path,
+    fmt: str = "csv",
+    tables: Sequence[str] = tuple(EXPORT_TABLES),
+    incremental: bool = False,
+    workers: int = 4,
+    chunk_size: int = 64,
+) -> ExportResult:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state = load_state(out_dir)
+    since = state.get("last_updated_at") if incremental and state.get("format") == fmt else None
+    hashes: Dict[str, str] = state.get("paper_hashes", {})
+    with db.get_connection(db_path) as conn:
+        papers = list(db.fetch_papers_updated_since(conn, since))
+        # Appending is only safe for papers never exported before; an exported paper whose bundle changed,
+        # or one that was deleted, would leave stale rows behind, so those runs rewrite the whole export.
+        # Edits that only bump updated_at (notes, status, reprocessing to the same outputs) keep their rows.
+        if since is not None:
+            revisited = [paper.id for paper in papers if paper.id in hashes]
+            if (
+                "paper_hashes" not in state
+                or any(_load_outputs(storage, paper_id)[0] != hashes[paper_id] for paper_id in revisited)
+                or set(hashes) - db.fetch_paper_ids(conn)
+            ):
+                since = None
+                papers = list(db.fetch_papers_updated_since(conn, None))
+
+    result = ExportResult(format=fmt, since=since, last_updated_at=since)
+    if since is None:
+        hashes = {}
+    else:
+        result.last_updated_at = max([since] + [paper.updated_at for paper in papers])
+        papers = [paper for paper in papers if paper.id not in hashes]
+        if not papers:
+            _save_state(out_dir, fmt, result.last_updated_at, hashes)
+            return result
+    writers = {}
+    try:
+        for table in tables:
+            path, writer = _open_writer(fmt, out_dir, table, append=since is not None)
+            writers[table] = writer
+            result.files[table] = path
+            result.rows[table] = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for chunk in _chunks(papers, chunk_size):
+                for paper, (digest, outputs) in zip(chunk, pool.map(lambda p: _load_outputs(storage, p.id), chunk)):
+                    paper_columns = {"paper_id": paper.id, "paper_title": paper.display_title, "paper_updated_at": paper.updated_at}
+                    for table, writer in writers.items():
+                        rows = [{**paper_columns, **row} for row in outputs.get(table, [])]
+                        writer.write(rows)
+                        result.rows[table] += len(rows)
+                    hashes[paper.id] = digest
+                    result.papers += 1
+                    result.last_updated_at = max(result.last_updated_at or "", paper.updated_at)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    _save_state(out_dir, fmt, result.last_updated_at, hashes)
+    return result
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export evidence, glossary and vocabulary rows for the whole library.")
+    parser.add_argument("--data-dir", type=Path, default=Path(__file__).resolve().parents[1] / "data")
+    parser.add_argument("--out", type=Path, default=None)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--tables", nargs="+", choices=list(EXPORT_TABLES), default=list(EXPORT_TABLES))
+    parser.add_argument(
+        "--incremental", action="store_true", help="Append only papers added since the last export (rewrites if any exported paper changed)."
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    storage = StorageManager(args.data_dir / "papers")
+    out_dir = args.out or args.data_dir / "exports"
+    result = export_library(
+        args.data_dir / db.DB_FILENAME,
+        storage,
+        out_dir,
+        fmt=args.format,
+        tables=args.tables,
+        incremental=args.incremental,
+        workers=args.workers,
+    )
+    print(f"Exported {result.papers} papers to {out_dir}")
+    for table, count in result.rows.items():
+        print(f"  {table}: {count} rows -> {result.files[table]}")
+
+
+if __name__ == "__main__":
+    main()
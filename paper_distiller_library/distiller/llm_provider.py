@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import json
 import os
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List
+
+MOCK_STREAM_CHUNK_CHARS = 32
 
 
 @dataclass
@@ -11,9 +14,14 @@ class LLMResponse:
 
 
 class BaseProvider:
+    context_window = 8192
+
     def generate(self, prompt: str, temperature: float = 0.2) -> LLMResponse:
         raise NotImplementedError
 
+    def stream(self, prompt: str, temperature: float = 0.2) -> Iterator[str]:
+        yield self.generate(prompt, temperature=temperature).content
+
 
 class MockProvider(BaseProvider):
     def generate(self, prompt: str, temperature: float = 0.2) -> LLMResponse:
@@ -21,6 +29,32 @@ class MockProvider(BaseProvider):
         lines = ["Mock response:", prompt[:400]]
         return LLMResponse(content="\n".join(lines))
 
+    def stream(self, prompt: str, temperature: float = 0.2) -> Iterator[str]:
+        content = self.generate(prompt, temperature=temperature).content
+        for start in range(0, len(content), MOCK_STREAM_CHUNK_CHARS):
+            yield content[start:start + MOCK_STREAM_CHUNK_CHARS]
+
+
+def iter_sse_data(lines: Iterable[bytes]) -> Iterator[str]:
+    data: List[str] = []
+    for raw in lines:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                payload = "\n".join(data)
+                data = []
+                if payload == "[DONE]":
+                    return
+                yield payload
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if field == "data":
+            data.append(value[1:] if value.startswith(" ") else value)
+    if data and "\n".join(data) != "[DONE]":
+        yield "\n".join(data)
+
 
 class OpenAIProvider(BaseProvider):
     def __init__(self) -> None:
@@ -29,17 +63,19 @@ class OpenAIProvider(BaseProvider):
             raise ValueError("OPENAI_API_KEY not set")
         self.api_key = api_key
         self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.context_window = int(os.getenv("OPENAI_CONTEXT_TOKENS", "128000"))
 
-    def generate(self, prompt: str, temperature: float = 0.2) -> LLMResponse:
-        import json
+    def _request(self, prompt: str, temperature: float, stream: bool):
         import urllib.request
 
-        body = {
+        body: Dict[str, Any] = {
             "model": self.model,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": temperature,
         }
-        req = urllib.request.Request(
+        if stream:
+            body["stream"] = True
+        return urllib.request.Request(
             "https://api.openai.com/v1/chat/completions",
             data=json.dumps(body).encode("utf-8"),
             headers={
@@ -47,11 +83,27 @@ class OpenAIProvider(BaseProvider):
                 "Content-Type": "application/json",
             },
         )
+
+    def generate(self, prompt: str, temperature: float = 0.2) -> LLMResponse:
+        import urllib.request
+
+        req = self._request(prompt, temperature, stream=False)
         with urllib.request.urlopen(req, timeout=30) as resp:
             data = json.loads(resp.read().decode("utf-8"))
         content = data["choices"][0]["message"]["content"]
         return LLMResponse(content=content)
 
+    def stream(self, prompt: str, temperature: float = 0.2) -> Iterator[str]:
+        import urllib.request
+
+        req = self._request(prompt, temperature, stream=True)
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            for payload in iter_sse_data(resp):
+                choices = json.loads(payload).get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
 
 def get_provider() -> BaseProvider:
     provider_name = os.getenv("LLM_PROVIDER", "mock").lower()
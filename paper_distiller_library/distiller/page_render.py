@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+RENDER_FORMATS = ("png", "webp")
+DEFAULT_ZOOM = 1.5
+MAX_ZOOM = 4.0
+MAX_OPEN_DOCUMENTS = 8
+QUOTE_PROBE_WORDS = 8
+HIGHLIGHT_COLOR = (1.0, 0.85, 0.0)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.replace("…", " ").replace("...", " ").split())
+
+
+def quote_probes(quote: str) -> List[str]:
+    words = _normalize(quote).split()
+    if not words:
+        return []
+    if len(words) <= QUOTE_PROBE_WORDS * 2:
+        return [" ".join(words)]
+    return [" ".join(words[:QUOTE_PROBE_WORDS]), " ".join(words[-QUOTE_PROBE_WORDS:])]
+
+
+@dataclass
+class _OpenDocument:
+    document: Any
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    pins: int = 0
+
+
+class PageRenderer:
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_bytes: int = 256 * 1024 * 1024,
+        fmt: str = "png",
+        prefetch: int = 1,
+        workers: int = 2,
+    ) -> None:
+        if fmt not in RENDER_FORMATS:
+            raise ValueError(f"Unknown render format: {fmt}")
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.prefetch = prefetch
+        self._documents: Dict[str, _OpenDocument] = {}
+        self._lock = threading.Lock()
+        self._inflight: Set[Path] = set()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="page-render")
+        self._cache_bytes = sum(path.stat().st_size for path in self.cache_dir.glob(f"*.{fmt}"))
+        self.hits = 0
+        self.misses = 0
+
+    def cache_path(self, pdf_path: Path, page: int, zoom: float, quote: Optional[str] = None) -> Path:
+        stat = pdf_path.stat()
+        key = f"{pdf_path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{page}|{zoom:.2f}|{_normalize(quote or '')}"
+        return self.cache_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.{self.fmt}"
+
+    @contextmanager
+    def _document(self, pdf_path: Path) -> Iterator[Any]:
+        import fitz  # PyMuPDF
+
+        key = str(pdf_path)
+        with self._lock:
+            entry = self._documents.pop(key, None)
+            if entry is None:
+                entry = _OpenDocument(fitz.open(pdf_path))
+            self._documents[key] = entry
+            entry.pins += 1
+        # A pinned document is skipped by eviction, so it cannot be closed while we wait for or hold its lock.
+        try:
+            with entry.lock:
+                yield entry.document
+        finally:
+            with self._lock:
+                entry.pins -= 1
+                closable = self._evict_documents()
+            for document in closable:
+                document.close()
+
+    def _evict_documents(self) -> List[Any]:
+        # Called under self._lock; unpinned documents have no users, so they are closed after it is released.
+        closable = []
+        for key in list(self._documents):
+            if len(self._documents) <= MAX_OPEN_DOCUMENTS:
+                break
+            if self._documents[key].pins == 0:
+                closable.append(self._documents.pop(key).document)
+        return closable
+
+    def page_count(self, pdf_path: Path) -> int:
+        with self._document(pdf_path) as document:
+            return len(document)
+
+    def _rasterize(self, pdf_path: Path, page: int, zoom: float, quote: Optional[str]) -> bytes:
+        import fitz  # PyMuPDF
+
+        with self._document(pdf_path) as document:
+            pdf_page = document.load_page(page - 1)
+            quads = [quad for probe in quote_probes(quote or "") for quad in pdf_page.search_for(probe, quads=True)]
+            annot = None
+            if quads:
+                annot = pdf_page.add_highlight_annot(quads)
+                annot.set_colors(stroke=HIGHLIGHT_COLOR)
+                annot.update()
+            try:
+                pixmap = pdf_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), annots=True)
+            finally:
+                if annot is not None:
+                    pdf_page.delete_annot(annot)
+        if self.fmt == "png":
+            return pixmap.tobytes("png")
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples).save(buffer, format="WEBP", quality=80)
+        return buffer.getvalue()
+
+    def _store(self, path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+        with self._lock:
+            self._cache_bytes += len(data)
+            over = self._cache_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> int:
+        entries = []
+        for path in self.cache_dir.glob(f"*.{self.fmt}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        with self._lock:
+            self._cache_bytes = total
+        return removed
+
+    def _render_cached(self, pdf_path: Path, page: int, zoom: float, quote: Optional[str]) -> bytes:
+        path = self.cache_path(pdf_path, page, zoom, quote)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self.misses += 1
+            data = self._rasterize(pdf_path, page, zoom, quote)
+            self._store(path, data)
+            return data
+        self.hits += 1
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def render(
+        self,
+        pdf_path: Path,
+        page: int,
+        zoom: float = DEFAULT_ZOOM,
+        quote: Optional[str] = None,
+        neighbours: Optional[Iterable[Tuple[int, Optional[str]]]] = None,
+    ) -> bytes:
+        # neighbours are the (page, quote) pairs likely to be asked for next; by default the plain adjacent pages.
+        zoom = min(max(zoom, 0.25), MAX_ZOOM)
+        total = self.page_count(pdf_path)
+        if not 1 <= page <= total:
+            raise ValueError(f"Page {page} is outside {pdf_path.name} (1-{total})")
+        data = self._render_cached(pdf_path, page, zoom, quote)
+        if neighbours is None:
+            neighbours = ((page + offset, None) for offset in range(-self.prefetch, self.prefetch + 1) if offset)
+        self.prefetch_pages(pdf_path, neighbours, zoom)
+        return data
+
+    def prefetch_pages(self, pdf_path: Path, targets: Iterable[Tuple[int, Optional[str]]], zoom: float = DEFAULT_ZOOM) -> None:
+        total = self.page_count(pdf_path)
+        for page, quote in targets:
+            if not 1 <= page <= total:
+                continue
+            path = self.cache_path(pdf_path, page, zoom, quote)
+            with self._lock:
+                if path in self._inflight or path.exists():
+                    continue
+                self._inflight.add(path)
+            self._pool.submit(self._prefetch_one, path, pdf_path, page, zoom, quote)
+
+    def _prefetch_one(self, path: Path, pdf_path: Path, page: int, zoom: float, quote: Optional[str]) -> None:
+        try:
+            self._store(path, self._rasterize(pdf_path, page, zoom, quote))
+        finally:
+            with self._lock:
+                self._inflight.discard(path)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            for entry in self._documents.values():
+                entry.document.close()
+            self._documents.clear()
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import List, Optional
+
+from distiller.quality import DocumentQuality, analyze_pages
 
 
 @dataclass
@@ -11,41 +13,46 @@ class PageText:
     text: str
     char_count: int
     suspicious: bool
+    text_density: float = 0.0
+    garbage_ratio: float = 0.0
+    columns: int = 1
+    hyphenation_rate: float = 0.0
 
 
 @dataclass
 class PdfReadResult:
     pages: List[PageText]
     source: str
+    quality: Optional[DocumentQuality] = None
 
 
-def _analyze_page(text: str) -> tuple[int, bool]:
-    char_count = len(text.strip())
-    suspicious = char_count < 30
-    if any(char.isdigit() for char in text[:100]) and char_count < 100:
-        suspicious = True
-    return char_count, suspicious
+def _build_pages(texts: List[str]) -> tuple[List[PageText], DocumentQuality]:
+    quality = analyze_pages(texts)
+    pages = [
+        PageText(
+            page=index + 1,
+            text=text,
+            char_count=int(quality.char_counts[index]),
+            suspicious=bool(quality.low_quality[index]),
+            **quality.page_metrics(index),
+        )
+        for index, text in enumerate(texts)
+    ]
+    return pages, quality
 
 
 def read_pdf(path: Path) -> PdfReadResult:
     try:
         import fitz  # PyMuPDF
 
-        doc = fitz.open(path)
-        pages = []
-        for index in range(len(doc)):
-            page = doc.load_page(index)
-            text = page.get_text("text")
-            char_count, suspicious = _analyze_page(text)
-            pages.append(PageText(page=index + 1, text=text, char_count=char_count, suspicious=suspicious))
-        return PdfReadResult(pages=pages, source="pymupdf")
+        with fitz.open(path) as doc:
+            texts = [doc.load_page(index).get_text("text") for index in range(len(doc))]
+        pages, quality = _build_pages(texts)
+        return PdfReadResult(pages=pages, source="pymupdf", quality=quality)
     except Exception:
         import pdfplumber
 
-        pages = []
         with pdfplumber.open(path) as pdf:
-            for index, page in enumerate(pdf.pages):
-                text = page.extract_text() or ""
-                char_count, suspicious = _analyze_page(text)
-                pages.append(PageText(page=index + 1, text=text, char_count=char_count, suspicious=suspicious))
-        return PdfReadResult(pages=pages, source="pdfplumber")
+            texts = [page.extract_text() or "" for page in pdf.pages]
+        pages, quality = _build_pages(texts)
+        return PdfReadResult(pages=pages, source="pdfplumber", quality=quality)
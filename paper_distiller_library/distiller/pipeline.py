@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from contextlib import nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Optional, Set, Tuple
+
+from distiller import db
+from distiller.schemas import OutputBundle
+from distiller.storage import BUNDLE_FILENAME, StorageManager
+
+if TYPE_CHECKING:
+    from distiller.admission import AdmissionController
+    from distiller.glossary import GlossaryDictionary
+    from distiller.llm_provider import BaseProvider
+    from distiller.retrieval import BM25Index
+    from distiller.similarity import SimilarityIndex
+
+PARSED_TEXT = "parsed_text.json"
+SECTIONS = "sections.json"
+PASSAGE_INDEX = "passage_index.npz"
+SIMILARITY_DIR = "similarity"
+
+
+def prepare_page_text(storage: StorageManager, paper_id: str, pdf_path: Path) -> Tuple[List[Tuple[int, str]], Set[int]]:
+    from distiller import pdf_reader
+
+    parsed = pdf_reader.read_pdf(pdf_path)
+    pages = [(page.page, page.text) for page in parsed.pages]
+    skip_pages = parsed.quality.low_quality_pages() if parsed.quality else set()
+    storage.save_json(
+        paper_id,
+        PARSED_TEXT,
+        {
+            "source": parsed.source,
+            "pages": [page.__dict__ for page in parsed.pages],
+            "quality": parsed.quality.summary() if parsed.quality else {},
+            "low_quality_pages": sorted(skip_pages),
+        },
+    )
+    return pages, skip_pages
+
+
+def save_sections(storage: StorageManager, paper_id: str, pages: List[Tuple[int, str]], skip_pages: Optional[Set[int]]) -> None:
+    from distiller import sectioner
+
+    sections = sectioner.section_pages(pages, skip_pages)
+    storage.save_json(paper_id, SECTIONS, {"sections": [section.__dict__ for section in sections]})
+
+
+def build_passage_index(
+    storage: StorageManager, paper_id: str, pages: List[Tuple[int, str]], skip_pages: Optional[Set[int]]
+) -> BM25Index:
+    from distiller import quality, retrieval
+
+    passages = retrieval.chunk_pages(quality.filter_pages(pages, skip_pages), paper_id=paper_id)
+    index = retrieval.BM25Index.build(passages)
+    index.save(storage.artifact_path(paper_id, PASSAGE_INDEX))
+    storage.stamp(paper_id, PASSAGE_INDEX)
+    drop_library_passage_index(storage)
+    return index
+
+
+def drop_library_passage_index(storage: StorageManager) -> None:
+    # The merged library index is rebuilt lazily from the per-paper indexes on the next library search.
+    storage.library_path(PASSAGE_INDEX).unlink(missing_ok=True)
+
+
+def open_similarity_index(storage: StorageManager) -> SimilarityIndex:
+    from distiller.similarity import SimilarityIndex
+
+    return SimilarityIndex(storage.library_path(SIMILARITY_DIR))
+
+
+# Every insert, delete, reprocess and restore goes through these so both library indexes follow the papers table.
+def index_paper(
+    storage: StorageManager,
+    paper_id: str,
+    pages: Optional[List[Tuple[int, str]]] = None,
+    index: Optional[SimilarityIndex] = None,
+) -> None:
+    from distiller import similarity
+
+    if pages is None:
+        pages, _ = load_page_text(storage, paper_id)
+    index = index or open_similarity_index(storage)
+    if pages:
+        index.upsert(paper_id, similarity.fingerprint(text for _, text in pages))
+    else:
+        index.remove(paper_id)
+    drop_library_passage_index(storage)
+
+
+def unindex_paper(storage: StorageManager, paper_id: str, index: Optional[SimilarityIndex] = None) -> None:
+    (index or open_similarity_index(storage)).remove(paper_id)
+    drop_library_passage_index(storage)
+
+
+def sync_library_indexes(storage: StorageManager, paper_ids: Iterable[str], index: Optional[SimilarityIndex] = None) -> None:
+    index = index or open_similarity_index(storage)
+    paper_ids = set(paper_ids)
+    for paper_id in set(index.paper_ids()) - paper_ids:
+        index.remove(paper_id)
+    for paper_id in sorted(paper_ids):
+        index_paper(storage, paper_id, index=index)
+    drop_library_passage_index(storage)
+
+
+def load_dictionary(db_path: Path) -> GlossaryDictionary:
+    from distiller.glossary import GlossaryDictionary
+
+    with db.get_connection(db_path) as conn:
+        return GlossaryDictionary(db.fetch_abbreviations(conn))
+
+
+def learn_abbreviations(
+    db_path: Path, paper_id: str, pairs: List[Tuple[str, str]], dictionary: Optional[GlossaryDictionary] = None
+) -> None:
+    # Always replace, so a regenerated paper that no longer defines a term stops contributing it.
+    with db.get_connection(db_path) as conn:
+        db.replace_abbreviations(conn, paper_id, pairs)
+    if dictionary is not None and pairs:
+        dictionary.update(pairs)
+
+
+def generate_outputs(
+    storage: StorageManager,
+    paper_id: str,
+    pages: List[Tuple[int, str]],
+    skip_pages: Optional[Set[int]] = None,
+    provider: Optional[BaseProvider] = None,
+    dictionary: Optional[GlossaryDictionary] = None,
+) -> OutputBundle:
+    from distiller import extractors, llm_provider
+
+    index = build_passage_index(storage, paper_id, pages, skip_pages)
+    bundle = extractors.build_output_bundle(pages, skip_pages, index, provider or llm_provider.get_provider(), dictionary)
+    storage.save_bundle(paper_id, bundle)
+    return bundle
+
+
+def load_page_text(storage: StorageManager, paper_id: str) -> Tuple[List[Tuple[int, str]], Set[int]]:
+    parsed = storage.load_json(paper_id, PARSED_TEXT)
+    pages = [(page["page"], page["text"]) for page in parsed.get("pages", [])]
+    return pages, set(parsed.get("low_quality_pages", []))
+
+
+def reprocess_paper(
+    storage: StorageManager,
+    paper_id: str,
+    pdf_filename: str,
+    pdf_digest: Optional[str] = None,
+    provider: Optional[BaseProvider] = None,
+    dictionary: Optional[GlossaryDictionary] = None,
+) -> Optional[OutputBundle]:
+    # Only stale artifacts are rebuilt; returns the new bundle, or None when the stored one is still current.
+    stale = set(storage.stale_artifacts(paper_id))
+    if not stale:
+        return None
+    if PARSED_TEXT in stale:
+        pages, skip_pages = prepare_page_text(storage, paper_id, storage.pdf_path(paper_id, pdf_filename, pdf_digest))
+        stale.update((SECTIONS, PASSAGE_INDEX, BUNDLE_FILENAME))
+    else:
+        pages, skip_pages = load_page_text(storage, paper_id)
+    if SECTIONS in stale:
+        save_sections(storage, paper_id, pages, skip_pages)
+    if BUNDLE_FILENAME in stale:
+        return generate_outputs(storage, paper_id, pages, skip_pages, provider, dictionary)
+    if PASSAGE_INDEX in stale:
+        build_passage_index(storage, paper_id, pages, skip_pages)
+    return None
+
+
+def ingest_pdf(
+    storage: StorageManager,
+    paper_id: str,
+    filename: str,
+    content: bytes,
+    controller: Optional[AdmissionController] = None,
+    provider: Optional[BaseProvider] = None,
+    dictionary: Optional[GlossaryDictionary] = None,
+) -> Tuple[List[Tuple[int, str]], OutputBundle]:
+    from distiller.admission import estimate_job
+
+    with controller.admit(estimate_job(content)) if controller else nullcontext():
+        pdf_path = storage.save_pdf(paper_id, filename, content)
+        pages, skip_pages = prepare_page_text(storage, paper_id, pdf_path)
+        save_sections(storage, paper_id, pages, skip_pages)
+        bundle = generate_outputs(storage, paper_id, pages, skip_pages, provider, dictionary)
+    return pages, bundle
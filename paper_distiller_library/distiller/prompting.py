@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from distiller.llm_provider import BaseProvider
+from distiller.retrieval import BM25Index, Passage
+from distiller.sectioner import SectionRange
+
+CHARS_PER_TOKEN = 4
+TOKENS_PER_WORD = 1.3
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+MAP_INSTRUCTION = "Extract only the facts from this excerpt that are relevant to the task below, with page numbers."
+REDUCE_INSTRUCTION = "Combine the partial notes below into a single answer for the task."
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    by_chars = len(text) // CHARS_PER_TOKEN
+    by_words = int(len(WORD_PATTERN.findall(text)) * TOKENS_PER_WORD)
+    return max(by_chars, by_words, 1)
+
+
+@dataclass
+class PromptBudget:
+    context_window: int = 8192
+    max_output_tokens: int = 1024
+    overhead_tokens: int = 64
+
+    @property
+    def input_tokens(self) -> int:
+        return max(self.context_window - self.max_output_tokens - self.overhead_tokens, 0)
+
+    @classmethod
+    def for_provider(cls, provider: BaseProvider, max_output_tokens: int = 1024) -> "PromptBudget":
+        return cls(context_window=provider.context_window, max_output_tokens=max_output_tokens)
+
+
+@dataclass
+class TokenReport:
+    stages: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def add(self, stage: str, prompt_tokens: int, completion_tokens: int) -> None:
+        entry = self.stages.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(entry["prompt_tokens"] + entry["completion_tokens"] for entry in self.stages.values())
+
+    def as_dict(self) -> Dict[str, Dict[str, int]]:
+        return {stage: dict(entry) for stage, entry in self.stages.items()}
+
+
+def _format_passage(passage: Passage) -> str:
+    return f"[p.{passage.page}] {' '.join(passage.text.split())}"
+
+
+def section_passages(passages: Sequence[Passage], section: SectionRange) -> List[Passage]:
+    return [passage for passage in passages if section.start_page <= passage.page <= section.end_page]
+
+
+def pack_passages(
+    index: BM25Index,
+    query: str,
+    budget_tokens: int,
+    candidates: Optional[Sequence[Passage]] = None,
+) -> List[Passage]:
+    allowed = None if candidates is None else {id(passage) for passage in candidates}
+    scores = index.scores(query)
+    order = sorted(range(len(index.passages)), key=lambda doc: (-scores[doc], doc))
+    packed: List[Passage] = []
+    used = 0
+    for doc in order:
+        passage = index.passages[doc]
+        if allowed is not None and id(passage) not in allowed:
+            continue
+        cost = estimate_tokens(_format_passage(passage))
+        if used + cost > budget_tokens:
+            continue
+        packed.append(passage)
+        used += cost
+    return sorted(packed, key=lambda passage: (passage.page, passage.start))
+
+
+def split_to_budget(text: str, budget_tokens: int) -> List[str]:
+    if estimate_tokens(text) <= budget_tokens:
+        return [text]
+    pieces: List[str] = []
+    current: List[str] = []
+    used = 0
+    for sentence in SENTENCE_BREAK.split(text):
+        cost = estimate_tokens(sentence)
+        if cost > budget_tokens:
+            step = max(budget_tokens * CHARS_PER_TOKEN, 1)
+            pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+            continue
+        if current and used + cost > budget_tokens:
+            pieces.append(" ".join(current))
+            current, used = [], 0
+        current.append(sentence)
+        used += cost
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def build_prompt(instruction: str, context: str) -> str:
+    return f"{instruction}\n\n---\n{context}\n---"
+
+
+class PromptBuilder:
+    def __init__(self, provider: BaseProvider, budget: Optional[PromptBudget] = None) -> None:
+        self.provider = provider
+        self.budget = budget or PromptBudget.for_provider(provider)
+        self.report = TokenReport()
+
+    def _call(self, stage: str, prompt: str, temperature: float) -> str:
+        response = self.provider.generate(prompt, temperature=temperature)
+        self.report.add(stage, estimate_tokens(prompt), estimate_tokens(response.content))
+        return response.content
+
+    def context_budget(self, instruction: str) -> int:
+        return max(self.budget.input_tokens - estimate_tokens(build_prompt(instruction, "")), 1)
+
+    def run(self, instruction: str, context: str, temperature: float = 0.2) -> str:
+        budget = self.context_budget(instruction)
+        chunks = split_to_budget(context, budget)
+        if len(chunks) == 1:
+            return self._call("direct", build_prompt(instruction, context), temperature)
+        map_instruction = f"{MAP_INSTRUCTION}\nTask: {instruction}"
+        map_budget = self.context_budget(map_instruction)
+        notes = [
+            self._call("map", build_prompt(map_instruction, piece), temperature)
+            for chunk in chunks
+            for piece in split_to_budget(chunk, map_budget)
+        ]
+        reduce_instruction = f"{REDUCE_INSTRUCTION}\nTask: {instruction}"
+        reduce_budget = self.context_budget(reduce_instruction)
+        combined = "\n\n".join(notes)
+        groups = split_to_budget(combined, reduce_budget)
+        while len(groups) > 1:
+            combined = "\n\n".join(self._call("reduce", build_prompt(reduce_instruction, group), temperature) for group in groups)
+            regrouped = split_to_budget(combined, reduce_budget)
+            if len(regrouped) >= len(groups):
+                groups = regrouped[:1]
+                combined = groups[0]
+                break
+            groups = regrouped
+        return self._call("reduce", build_prompt(reduce_instruction, combined), temperature)
+
+    def run_section(
+        self,
+        instruction: str,
+        pages: Sequence[tuple[int, str]],
+        section: SectionRange,
+        temperature: float = 0.2,
+    ) -> str:
+        context = "\n".join(
+            f"[p.{page_num}] {text}" for page_num, text in pages if section.start_page <= page_num <= section.end_page
+        )
+        return self.run(instruction, context, temperature)
+
+    def run_packed(
+        self,
+        instruction: str,
+        index: BM25Index,
+        query: str,
+        section: Optional[SectionRange] = None,
+        temperature: float = 0.2,
+    ) -> str:
+        return self.run(instruction, self.packed_context(instruction, index, query, section), temperature)
+
+    def packed_context(
+        self, instruction: str, index: BM25Index, query: str, section: Optional[SectionRange] = None
+    ) -> str:
+        # The passages are costed and emitted with the same formatting, so the packed budget is what is sent.
+        candidates = section_passages(index.passages, section) if section else None
+        packed = pack_passages(index, query, self.context_budget(instruction), candidates)
+        return "\n".join(_format_passage(passage) for passage in packed)
+
+    def stream_packed(self, instruction: str, index: BM25Index, query: str, temperature: float = 0.2) -> Iterator[str]:
+        prompt = build_prompt(instruction, self.packed_context(instruction, index, query))
+        completion = 0
+        try:
+            for chunk in self.provider.stream(prompt, temperature=temperature):
+                completion += estimate_tokens(chunk)
+                yield chunk
+        finally:
+            self.report.add("stream", estimate_tokens(prompt), completion)
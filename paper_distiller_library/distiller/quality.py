@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+MIN_CHARS = 30
+SHORT_PAGE_CHARS = 100
+MAX_GARBAGE_RATIO = 0.2
+MIN_TEXT_DENSITY = 0.5
+NARROW_LINE_CHARS = 55
+MIN_LINES_FOR_LAYOUT = 10
+# Bounds the temporary codepoint/mask arrays to a few MB however long the document is.
+ANALYSIS_CHUNK_CHARS = 262144
+
+_NEWLINE = 10
+_HYPHEN = 45
+# Every codepoint str.strip() removes (str.isspace()).
+_STRIP_SPACE = np.array([cp for cp in range(0x3001) if chr(cp).isspace()], dtype=np.uint32)
+
+
+@dataclass
+class DocumentQuality:
+    pages: np.ndarray
+    char_counts: np.ndarray
+    text_density: np.ndarray
+    garbage_ratio: np.ndarray
+    columns: np.ndarray
+    hyphenation_rate: np.ndarray
+    low_quality: np.ndarray
+
+    def low_quality_pages(self) -> Set[int]:
+        return {int(page) for page in self.pages[self.low_quality]}
+
+    def page_metrics(self, index: int) -> Dict[str, float]:
+        return {
+            "text_density": round(float(self.text_density[index]), 4),
+            "garbage_ratio": round(float(self.garbage_ratio[index]), 4),
+            "columns": int(self.columns[index]),
+            "hyphenation_rate": round(float(self.hyphenation_rate[index]), 4),
+        }
+
+    def summary(self) -> Dict[str, float]:
+        if not len(self.pages):
+            return {"pages": 0, "low_quality_pages": 0, "mean_text_density": 0.0, "mean_garbage_ratio": 0.0}
+        return {
+            "pages": int(len(self.pages)),
+            "low_quality_pages": int(self.low_quality.sum()),
+            "mean_text_density": round(float(self.text_density.mean()), 4),
+            "mean_garbage_ratio": round(float(self.garbage_ratio.mean()), 4),
+        }
+
+
+def _codepoints(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    # PyMuPDF can emit lone surrogates; keep them as single codepoints so offsets stay aligned.
+    joined = "".join(texts).encode("utf-32-le", errors="surrogatepass")
+    codes = np.frombuffer(joined, dtype=np.uint32)
+    return codes, lengths
+
+
+def _per_page_sum(mask: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    cumulative = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    return cumulative[offsets + lengths] - cumulative[offsets]
+
+
+def analyze_pages(texts: Sequence[str], page_numbers: Optional[Sequence[int]] = None) -> DocumentQuality:
+    if page_numbers is None:
+        page_numbers = range(1, len(texts) + 1)
+    pages = np.asarray(list(page_numbers), dtype=np.int64)
+    chunks: List[DocumentQuality] = []
+    start = 0
+    while start < len(texts) or not chunks:
+        end, size = start, 0
+        while end < len(texts) and (end == start or size + len(texts[end]) <= ANALYSIS_CHUNK_CHARS):
+            size += len(texts[end])
+            end += 1
+        chunks.append(_analyze_chunk(texts[start:end], pages[start:end]))
+        start = end
+    if len(chunks) == 1:
+        return chunks[0]
+    return DocumentQuality(
+        **{name: np.concatenate([getattr(chunk, name) for chunk in chunks]) for name in DocumentQuality.__dataclass_fields__}
+    )
+
+
+def _analyze_chunk(texts: Sequence[str], pages: np.ndarray) -> DocumentQuality:
+    codes, lengths = _codepoints(texts)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64) if len(texts) else np.zeros(0, dtype=np.int64)
+
+    whitespace = (codes == 32) | (codes == 9) | (codes == _NEWLINE) | (codes == 13) | (codes == 12) | (codes == 11)
+    digits = (codes >= 48) & (codes <= 57)
+    control = (codes < 32) & ~whitespace
+    private_use = (codes >= 0xE000) & (codes <= 0xF8FF)
+    surrogates = (codes >= 0xD800) & (codes <= 0xDFFF)
+    garbage = control | private_use | surrogates | (codes == 0xFFFD)
+    newlines = codes == _NEWLINE
+    hyphen_breaks = np.zeros_like(newlines)
+    if len(codes) > 1:
+        hyphen_breaks[:-1] = (codes[:-1] == _HYPHEN) & newlines[1:]
+
+    total = lengths.astype(np.float64)
+    non_space = _per_page_sum(~whitespace, offsets, lengths)
+    garbage_counts = _per_page_sum(garbage, offsets, lengths)
+    line_counts = _per_page_sum(newlines, offsets, lengths) + (lengths > 0)
+    hyphen_counts = _per_page_sum(hyphen_breaks, offsets, lengths)
+
+    safe_total = np.maximum(total, 1.0)
+    safe_non_space = np.maximum(non_space, 1)
+    text_density = non_space / safe_total
+    garbage_ratio = garbage_counts / safe_non_space
+    hyphenation_rate = hyphen_counts / np.maximum(line_counts, 1)
+
+    char_counts = _stripped_lengths(codes, offsets, lengths)
+    leading_digit = np.zeros(len(texts), dtype=bool)
+    if len(texts):
+        head = np.minimum(lengths, 100)
+        leading_digit = _per_page_sum(digits, offsets, head) > 0
+
+    columns = _estimate_columns(codes, offsets, lengths)
+
+    low_quality = (
+        (char_counts < MIN_CHARS)
+        | (leading_digit & (char_counts < SHORT_PAGE_CHARS))
+        | (garbage_ratio > MAX_GARBAGE_RATIO)
+        | ((text_density < MIN_TEXT_DENSITY) & (char_counts < SHORT_PAGE_CHARS * 5))
+    )
+    return DocumentQuality(
+        pages=pages,
+        char_counts=char_counts,
+        text_density=text_density,
+        garbage_ratio=garbage_ratio,
+        columns=columns,
+        hyphenation_rate=hyphenation_rate,
+        low_quality=low_quality,
+    )
+
+
+def _stripped_lengths(codes: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    # strip() semantics: count everything between the first and last non-space character of each page.
+    kept = np.flatnonzero(~np.isin(codes, _STRIP_SPACE))
+    first = np.searchsorted(kept, offsets)
+    last = np.searchsorted(kept, offsets + lengths) - 1
+    has_text = last >= first
+    counts = np.zeros(len(lengths), dtype=np.int64)
+    counts[has_text] = kept[last[has_text]] - kept[first[has_text]] + 1
+    return counts
+
+
+def _estimate_columns(codes: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    columns = np.ones(len(lengths), dtype=np.int64)
+    if not len(codes):
+        return columns
+    # Give every character a line id (lines restart at each page start and after each newline),
+    # then take the median non-empty line length per page from one sort.
+    newlines = codes == _NEWLINE
+    line_starts = np.zeros(len(codes), dtype=bool)
+    line_starts[offsets[lengths > 0]] = True
+    line_starts[1:] |= newlines[:-1]
+    line_ids = np.cumsum(line_starts) - 1
+    line_lengths = np.bincount(line_ids[~newlines], minlength=int(line_ids[-1]) + 1)
+    line_pages = np.repeat(np.arange(len(lengths)), lengths)[np.flatnonzero(line_starts)]
+    line_pages, line_lengths = line_pages[line_lengths > 0], line_lengths[line_lengths > 0]
+    order = np.lexsort((line_lengths, line_pages))
+    sorted_lengths = line_lengths[order]
+    counts = np.bincount(line_pages, minlength=len(lengths))
+    starts = np.cumsum(counts) - counts
+    laid_out = np.flatnonzero(counts >= MIN_LINES_FOR_LAYOUT)
+    low = sorted_lengths[starts[laid_out] + (counts[laid_out] - 1) // 2]
+    high = sorted_lengths[starts[laid_out] + counts[laid_out] // 2]
+    columns[laid_out[(low + high) / 2 < NARROW_LINE_CHARS]] = 2
+    return columns
+
+
+def filter_pages(pages: List[Tuple[int, str]], skip_pages: Optional[Set[int]]) -> List[Tuple[int, str]]:
+    if not skip_pages:
+        return pages
+    kept = [(page_num, text) for page_num, text in pages if page_num not in skip_pages]
+    return kept or pages
@@ -4,48 +4,67 @@ import json
 from pathlib import Path
 from typing import Any, Dict, List
 
-import pandas as pd
+CONTRIBUTION_KEYS = ("innovations", "key_findings", "implications")
+METHOD_KEYS = ("method_summary", "process_steps", "assumptions", "limitations")
+_SUBHEADINGS = {key: f"## {key.replace('_', ' ').title()}" for key in CONTRIBUTION_KEYS + METHOD_KEYS}
+_DIGEST_LABELS = {key: f"*{key.replace('_', ' ').capitalize()}*" for key in CONTRIBUTION_KEYS}
+_EMPTY: Dict[str, Any] = {}
+
+# Headings and the digest entry template are built once at import; rendering only fills them in.
+DIGEST_ENTRY_TEMPLATE = "## {title}\n{byline}\n{summary}\n\n{story}{contributions}{glossary}"
+
+
+def _bullets(items: List[Dict[str, Any]]) -> str:
+    return "".join([f"- {item.get('text', '')}\n" for item in items])
 
 
 def render_markdown(outputs: Dict[str, Any]) -> str:
     lines: List[str] = []
-    story = outputs.get("story_line", {})
+    story = outputs.get("story_line") or _EMPTY
     if story:
-        lines.append("# Story Line")
-        summary = story.get("one_paragraph_summary", {}).get("text", "")
-        lines.append(summary)
-        lines.append("")
-        lines.append("## Bullets")
-        for bullet in story.get("bullets", []):
-            lines.append(f"- {bullet.get('text', '')}")
+        lines += ["# Story Line", (story.get("one_paragraph_summary") or _EMPTY).get("text", ""), "", "## Bullets"]
+        lines += [f"- {item.get('text', '')}" for item in story.get("bullets", ())]
         lines.append("")
     lines.append("# Intro Evidence Table")
-    for row in outputs.get("intro_evidence_table", []):
-        lines.append(f"- {row.get('claim_id')}: {row.get('claim_text')}")
-    lines.append("")
-    lines.append("# Contributions & Implications")
-    for key in ["innovations", "key_findings", "implications"]:
-        lines.append(f"## {key.replace('_', ' ').title()}")
-        for item in outputs.get("contributions_and_implications", {}).get(key, []):
-            lines.append(f"- {item.get('text', '')}")
-    lines.append("")
-    lines.append("# Methods & Limits")
-    for key in ["method_summary", "process_steps", "assumptions", "limitations"]:
-        lines.append(f"## {key.replace('_', ' ').title()}")
-        for item in outputs.get("method_process_limits", {}).get(key, []):
-            lines.append(f"- {item.get('text', '')}")
-    lines.append("")
-    lines.append("# Glossary")
-    for term in outputs.get("glossary_terms", []):
-        lines.append(f"- {term.get('term')}: {term.get('definition')}")
-    lines.append("")
-    lines.append("# Advanced Vocabulary")
-    for vocab in outputs.get("advanced_vocabulary", []):
-        lines.append(f"- {vocab.get('word_or_phrase')}: {vocab.get('simple_explanation')}")
+    lines += [f"- {row.get('claim_id')}: {row.get('claim_text')}" for row in outputs.get("intro_evidence_table", ())]
+    lines += ["", "# Contributions & Implications"]
+    section = outputs.get("contributions_and_implications") or _EMPTY
+    for key in CONTRIBUTION_KEYS:
+        lines.append(_SUBHEADINGS[key])
+        lines += [f"- {item.get('text', '')}" for item in section.get(key, ())]
+    lines += ["", "# Methods & Limits"]
+    section = outputs.get("method_process_limits") or _EMPTY
+    for key in METHOD_KEYS:
+        lines.append(_SUBHEADINGS[key])
+        lines += [f"- {item.get('text', '')}" for item in section.get(key, ())]
+    lines += ["", "# Glossary"]
+    lines += [f"- {term.get('term')}: {term.get('definition')}" for term in outputs.get("glossary_terms", ())]
+    lines += ["", "# Advanced Vocabulary"]
+    lines += [f"- {item.get('word_or_phrase')}: {item.get('simple_explanation')}" for item in outputs.get("advanced_vocabulary", ())]
     return "\n".join(lines)
 
 
+def render_digest_entry(paper: Dict[str, Any], outputs: Dict[str, Any]) -> str:
+    story = outputs.get("story_line") or _EMPTY
+    bullets = story.get("bullets")
+    byline = " · ".join(str(value) for value in (paper.get("authors"), paper.get("year"), paper.get("category")) if value)
+    section = outputs.get("contributions_and_implications") or _EMPTY
+    contributions = "".join([f"{_DIGEST_LABELS[key]}\n{_bullets(section[key])}" for key in CONTRIBUTION_KEYS if section.get(key)])
+    terms = outputs.get("glossary_terms", [])
+    glossary = "*Glossary*\n" + "".join([f"- **{term.get('term')}**: {term.get('definition')}\n" for term in terms]) if terms else ""
+    return DIGEST_ENTRY_TEMPLATE.format(
+        title=paper.get("title") or paper.get("id"),
+        byline=f"_{byline}_\n" if byline else "",
+        summary=(story.get("one_paragraph_summary") or _EMPTY).get("text", ""),
+        story=f"*Story line*\n{_bullets(bullets)}" if bullets else "",
+        contributions=contributions,
+        glossary=glossary,
+    )
+
+
 def export_csv(path: Path, rows: List[Dict[str, Any]]) -> None:
+    import pandas as pd
+
     df = pd.DataFrame(rows)
     df.to_csv(path, index=False)
 
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from distiller import db, pipeline
+from distiller.blobstore import get_blob_store
+from distiller.extractors import learned_abbreviations
+from distiller.storage import PIPELINE_VERSION, StorageManager
+from distiller.utils import now_iso
+
+CHECKPOINT_FILENAME = "reprocess_checkpoint.json"
+DEFAULT_NICENESS = 10
+
+_worker_storage: Optional[StorageManager] = None
+_worker_dictionary = None
+
+
+@dataclass
+class ReprocessResult:
+    version: int
+    processed: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    remaining: int = 0
+    throttled_seconds: float = 0.0
+
+
+def system_load() -> Tuple[float, Optional[int]]:
+    try:
+        load = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        load = 0.0
+    available_mb = None
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("MemAvailable:"):
+                    available_mb = int(line.split()[1]) // 1024
+                    break
+    except OSError:
+        pass
+    return load, available_mb
+
+
+def wait_for_capacity(
+    max_load: float,
+    min_available_mb: int,
+    poll_seconds: float = 5.0,
+    probe: Callable[[], Tuple[float, Optional[int]]] = system_load,
+    sleep: Callable[[float], None] = time.sleep,
+) -> float:
+    waited = 0.0
+    while True:
+        load, available_mb = probe()
+        if load <= max_load and (available_mb is None or available_mb >= min_available_mb):
+            return waited
+        sleep(poll_seconds)
+        waited += poll_seconds
+
+
+def load_checkpoint(path: Path, version: int) -> Dict[str, object]:
+    state = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    if state.get("version") != version:
+        state = {"version": version, "processed": 0, "failed": {}}
+    return state
+
+
+def save_checkpoint(path: Path, state: Dict[str, object]) -> None:
+    state["updated_at"] = now_iso()
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(state), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def _init_worker(papers_dir: str, index_dir: str, db_path: str, use_blobs: bool, niceness: int) -> None:
+    global _worker_storage, _worker_dictionary
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+    blobs = get_blob_store(Path(db_path), Path(papers_dir).parent) if use_blobs else None
+    _worker_storage = StorageManager(Path(papers_dir), Path(index_dir), blobs)
+    _worker_dictionary = pipeline.load_dictionary(Path(db_path))
+
+
+def _reprocess_one(paper_id: str, pdf_filename: str, pdf_digest: Optional[str]) -> Optional[List[Tuple[str, str]]]:
+    bundle = pipeline.reprocess_paper(_worker_storage, paper_id, pdf_filename, pdf_digest, dictionary=_worker_dictionary)
+    return learned_abbreviations(bundle.glossary_terms) if bundle else None
+
+
+def reprocess_library(
+    db_path: Path,
+    storage: StorageManager,
+    workers: int = 2,
+    limit: Optional[int] = None,
+    max_load: float = 0.75,
+    min_available_mb: int = 512,
+    niceness: int = DEFAULT_NICENESS,
+    checkpoint_path: Optional[Path] = None,
+    version: int = PIPELINE_VERSION,
+) -> ReprocessResult:
+    checkpoint_path = checkpoint_path or storage.library_path(CHECKPOINT_FILENAME)
+    state = load_checkpoint(checkpoint_path, version)
+    failed: Dict[str, str] = state["failed"]
+    result = ReprocessResult(version=version, failed=failed)
+    pending: Dict[Future, str] = {}
+    submitted = 0
+    similarity_index = pipeline.open_similarity_index(storage)
+    initargs = (str(storage.base_dir), str(storage.index_dir), str(db_path), storage.blobs is not None, niceness)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        while True:
+            while len(pending) < workers and (limit is None or submitted < limit):
+                with db.get_connection(db_path) as conn:
+                    candidates = db.fetch_stale_paper_ids(conn, version, len(pending) + len(failed) + 1)
+                    in_flight = set(pending.values())
+                    paper_id = next((item for item in candidates if item not in in_flight and item not in failed), None)
+                    paper = db.fetch_paper(conn, paper_id) if paper_id else None
+                if paper is None:
+                    break
+                result.throttled_seconds += wait_for_capacity(max_load, min_available_mb)
+                pending[pool.submit(_reprocess_one, paper.id, paper.original_filename, paper.pdf_digest)] = paper.id
+                submitted += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                paper_id = pending.pop(future)
+                try:
+                    pairs = future.result()
+                except Exception as exc:
+                    failed[paper_id] = f"{type(exc).__name__}: {exc}"
+                else:
+                    if pairs is not None:
+                        pipeline.learn_abbreviations(db_path, paper_id, pairs)
+                    with db.get_connection(db_path) as conn:
+                        db.mark_processed(conn, paper_id, version)
+                    pipeline.index_paper(storage, paper_id, index=similarity_index)
+                    result.processed += 1
+                    state["processed"] += 1
+                save_checkpoint(checkpoint_path, state)
+
+    with db.get_connection(db_path) as conn:
+        result.remaining = db.count_stale_papers(conn, version)
+    return result
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Regenerate artifacts for papers processed by an older pipeline version.")
+    parser.add_argument("--data-dir", type=Path, default=Path(__file__).resolve().parents[1] / "data")
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) // 2, 1))
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many papers.")
+    parser.add_argument("--max-load", type=float, default=0.75, help="Pause while the 1-minute load per CPU is above this.")
+    parser.add_argument("--min-available-mb", type=int, default=512, help="Pause while available memory is below this.")
+    parser.add_argument("--retry-failed", action="store_true", help="Forget papers that failed in an earlier run.")
+    args = parser.parse_args(argv)
+
+    db_path = args.data_dir / db.DB_FILENAME
+    db.init_db(db_path)
+    storage = StorageManager(args.data_dir / "papers", blobs=get_blob_store(db_path, args.data_dir))
+    checkpoint_path = storage.library_path(CHECKPOINT_FILENAME)
+    if args.retry_failed:
+        state = load_checkpoint(checkpoint_path, PIPELINE_VERSION)
+        state["failed"] = {}
+        save_checkpoint(checkpoint_path, state)
+    result = reprocess_library(
+        db_path,
+        storage,
+        workers=args.workers,
+        limit=args.limit,
+        max_load=args.max_load,
+        min_available_mb=args.min_available_mb,
+        checkpoint_path=checkpoint_path,
+    )
+    print(f"Reprocessed {result.processed} papers to pipeline version {result.version}")
+    print(f"  failed: {len(result.failed)}, still stale: {result.remaining}, throttled: {result.throttled_seconds:.0f}s")
+    for paper_id, error in result.failed.items():
+        print(f"  {paper_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
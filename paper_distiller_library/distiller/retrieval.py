@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import json
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+PASSAGE_CHARS = 600
+PASSAGE_OVERLAP = 150
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "with", "we", "our",
+}
+
+
+@dataclass
+class Passage:
+    passage_id: int
+    page: int
+    start: int
+    end: int
+    text: str
+    paper_id: Optional[str] = None
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _snap_to_space(text: str, position: int, lower: int) -> int:
+    cut = text.rfind(" ", lower, position)
+    if cut == -1:
+        cut = text.rfind("\n", lower, position)
+    return cut if cut > lower else position
+
+
+def chunk_pages(
+    pages: Iterable[Tuple[int, str]],
+    size: int = PASSAGE_CHARS,
+    overlap: int = PASSAGE_OVERLAP,
+    paper_id: Optional[str] = None,
+) -> List[Passage]:
+    passages: List[Passage] = []
+    for page_num, text in pages:
+        start = 0
+        length = len(text)
+        while start < length:
+            end = min(start + size, length)
+            if end < length:
+                end = _snap_to_space(text, end, start + size // 2)
+            chunk = text[start:end]
+            if chunk.strip():
+                passages.append(
+                    Passage(passage_id=len(passages), page=page_num, start=start, end=end, text=chunk, paper_id=paper_id)
+                )
+            if end >= length:
+                break
+            next_start = max(end - overlap, start + 1)
+            boundary = text.find(" ", next_start, end)
+            start = boundary + 1 if boundary != -1 else next_start
+    return passages
+
+
+class BM25Index:
+    def __init__(
+        self,
+        passages: List[Passage],
+        vocabulary: Dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+    ) -> None:
+        self.passages = passages
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        doc_count = len(passages)
+        doc_freqs = np.diff(indptr).astype(np.float64)
+        self.idf = np.log1p((doc_count - doc_freqs + 0.5) / (doc_freqs + 0.5))
+        self.avg_length = float(doc_lengths.mean()) if doc_count else 0.0
+
+    @classmethod
+    def build(cls, passages: List[Passage]) -> "BM25Index":
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        term_freqs: List[int] = []
+        doc_lengths = np.zeros(len(passages), dtype=np.float32)
+        for doc, passage in enumerate(passages):
+            tokens = tokenize(passage.text)
+            doc_lengths[doc] = len(tokens)
+            for term, count in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc)
+                term_freqs.append(count)
+        terms = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocabulary)), out=indptr[1:])
+        return cls(
+            passages,
+            vocabulary,
+            indptr,
+            np.asarray(doc_ids, dtype=np.int32)[order],
+            np.asarray(term_freqs, dtype=np.float32)[order],
+            doc_lengths,
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.passages), dtype=np.float64)
+        if not self.passages:
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(self.avg_length, 1.0))
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[lo:hi]
+            tf = self.term_freqs[lo:hi]
+            scores[docs] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        return scores
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[Passage, float]]:
+        scores = self.scores(query)
+        if not len(scores) or k <= 0:
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.passages[doc], float(scores[doc])) for doc in top if scores[doc] > 0]
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        with path.open("wb") as handle:
+            np.savez(
+                handle,
+                vocabulary=np.asarray(terms, dtype=str),
+                indptr=self.indptr,
+                doc_ids=self.doc_ids,
+                term_freqs=self.term_freqs,
+                doc_lengths=self.doc_lengths,
+            )
+        passages_path = path.with_suffix(".passages.json")
+        passages_path.write_text(json.dumps([asdict(p) for p in self.passages], ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        passages_path = path.with_suffix(".passages.json")
+        if not path.exists() or not passages_path.exists():
+            return None
+        passages = [Passage(**item) for item in json.loads(passages_path.read_text(encoding="utf-8"))]
+        with np.load(path) as data:
+            vocabulary = {term: idx for idx, term in enumerate(data["vocabulary"].tolist())}
+            return cls(passages, vocabulary, data["indptr"], data["doc_ids"], data["term_freqs"], data["doc_lengths"])
+
+
+def build_library_index(paper_indexes: Iterable[BM25Index]) -> BM25Index:
+    passages: List[Passage] = []
+    for index in paper_indexes:
+        for passage in index.passages:
+            passages.append(
+                Passage(
+                    passage_id=len(passages),
+                    page=passage.page,
+                    start=passage.start,
+                    end=passage.end,
+                    text=passage.text,
+                    paper_id=passage.paper_id,
+                )
+            )
+    return BM25Index.build(passages)
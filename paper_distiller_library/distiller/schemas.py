@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
+
+SCHEMA_VERSION = 1
 
 
 class Evidence(BaseModel):
@@ -64,6 +67,8 @@ class GlossaryTerm(BaseModel):
     citation_key: Optional[str]
     evidence_level: str
     notes: Optional[str]
+    # Where the expansion came from: "paper" (defined in the text), "dictionary" (library lookup) or "llm".
+    source: Optional[str] = None
 
 
 class AdvancedVocabularyItem(BaseModel):
@@ -87,3 +92,36 @@ class OutputBundle(BaseModel):
     glossary_terms: List[GlossaryTerm]
     advanced_vocabulary: List[AdvancedVocabularyItem]
     metadata: dict = Field(default_factory=dict)
+
+
+@lru_cache(maxsize=None)
+def section_adapter(name: str) -> TypeAdapter:
+    return TypeAdapter(OutputBundle.model_fields[name].annotation)
+
+
+def stamp_bundle(bundle: OutputBundle) -> OutputBundle:
+    bundle.metadata["schema_version"] = SCHEMA_VERSION
+    return bundle
+
+
+def is_trusted(payload: Dict[str, Any]) -> bool:
+    return payload.get("metadata", {}).get("schema_version") == SCHEMA_VERSION
+
+
+class LazyBundle:
+    def __init__(self, raw: Dict[str, Any]) -> None:
+        self.raw = raw
+        self._sections: Dict[str, Any] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        if name not in OutputBundle.model_fields:
+            raise AttributeError(name)
+        if name not in self._sections:
+            self._sections[name] = section_adapter(name).validate_python(self.raw.get(name, {}))
+        return self._sections[name]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.raw.get(key, default)
+
+    def to_model(self) -> OutputBundle:
+        return OutputBundle.model_validate(self.raw)
@@ -1,6 +1,6 @@
 import re
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 
 @dataclass
@@ -20,9 +20,11 @@ SECTION_PATTERNS = {
 }
 
 
-def _find_section_pages(pages: List[Tuple[int, str]]) -> Dict[str, int]:
+def _find_section_pages(pages: List[Tuple[int, str]], skip_pages: Optional[Set[int]] = None) -> Dict[str, int]:
     hits = {}
     for page_num, text in pages:
+        if skip_pages and page_num in skip_pages:
+            continue
         for name, pattern in SECTION_PATTERNS.items():
             if name in hits:
                 continue
@@ -31,8 +33,8 @@ def _find_section_pages(pages: List[Tuple[int, str]]) -> Dict[str, int]:
     return hits
 
 
-def section_pages(pages: List[Tuple[int, str]]) -> List[SectionRange]:
-    hits = _find_section_pages(pages)
+def section_pages(pages: List[Tuple[int, str]], skip_pages: Optional[Set[int]] = None) -> List[SectionRange]:
+    hits = _find_section_pages(pages, skip_pages)
     if not hits:
         if pages:
             return [SectionRange(name="full_text", start_page=1, end_page=pages[-1][0], confidence=0.2)]
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from distiller.retrieval import tokenize
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies.
+    fcntl = None
+
+FINGERPRINT_DIM = 512
+INITIAL_CAPACITY = 1024
+COMPACT_FACTOR = 2
+
+
+def fingerprint(texts: Iterable[str], dim: int = FINGERPRINT_DIM) -> np.ndarray:
+    buckets = [zlib.crc32(token.encode("utf-8")) % dim for text in texts for token in tokenize(text)]
+    counts = np.bincount(np.asarray(buckets, dtype=np.int64), minlength=dim).astype(np.float32)
+    vector = np.log1p(counts)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class SimilarityIndex:
+    def __init__(self, directory: Path, dim: int = FINGERPRINT_DIM) -> None:
+        self.directory = directory
+        self.dim = dim
+        self.vectors_path = directory / "vectors.f32"
+        self.log_path = directory / "ids.log"
+        self.lock_path = directory / ".lock"
+        self._lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, self._file_lock():
+            self._migrate_legacy()
+            self._reload()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        # Reprocessing and restores update the index from other processes, so writers also take a file lock.
+        with open(self.lock_path, "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def _migrate_legacy(self) -> None:
+        legacy_path = self.directory / "ids.json"
+        if legacy_path.exists() and not self.log_path.exists():
+            self.ids = json.loads(legacy_path.read_text(encoding="utf-8"))
+            self._compact()
+            legacy_path.unlink()
+            (self.directory / "doc_freq.npy").unlink(missing_ok=True)
+
+    def _reload(self) -> None:
+        self.ids: List[Optional[str]] = []
+        self.log_entries = 0
+        self._log_offset = 0
+        self._log_inode = self.log_path.stat().st_ino if self.log_path.exists() else None
+        self._read_log()
+        self._open(max(INITIAL_CAPACITY, len(self.ids)))
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self.rows = {paper_id: row for row, paper_id in enumerate(self.ids) if paper_id is not None}
+        self.free = [row for row, paper_id in enumerate(self.ids) if paper_id is None]
+        # Document frequencies are derived from the vectors when the ids are (re)read instead of being persisted.
+        self.doc_freq = (np.asarray(self.matrix[: len(self.ids)]) > 0).sum(axis=0).astype(np.int64)
+
+    def _read_log(self) -> bool:
+        if not self.log_path.exists():
+            return False
+        changed = False
+        with self.log_path.open("rb") as handle:
+            handle.seek(self._log_offset)
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    break  # torn or in-flight write
+                row, paper_id = json.loads(line)
+                self.ids.extend([None] * (row + 1 - len(self.ids)))
+                self.ids[row] = paper_id
+                self.log_entries += 1
+                self._log_offset += len(line)
+                changed = True
+        return changed
+
+    def _refresh(self) -> None:
+        # Pick up rows written by other processes; compaction or a restore replaces the files outright.
+        log_inode = self.log_path.stat().st_ino if self.log_path.exists() else None
+        if log_inode != self._log_inode or self.vectors_path.stat().st_ino != self._vectors_inode:
+            self._reload()
+        elif self._read_log():
+            if len(self.ids) > self.matrix.shape[0]:
+                self._open(len(self.ids))
+            self._reindex()
+
+    def _open(self, capacity: int) -> None:
+        size = capacity * self.dim * 4
+        with open(self.vectors_path, "ab") as handle:
+            if handle.tell() < size:
+                handle.truncate(size)
+        stat = self.vectors_path.stat()
+        self._vectors_inode = stat.st_ino
+        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(stat.st_size // (self.dim * 4), self.dim))
+
+    def _compact(self) -> None:
+        tmp_path = self.log_path.with_suffix(".tmp")
+        entries = [(row, paper_id) for row, paper_id in enumerate(self.ids) if paper_id is not None]
+        if self.ids and self.ids[-1] is None:
+            entries.append((len(self.ids) - 1, None))
+        tmp_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries), encoding="utf-8")
+        tmp_path.replace(self.log_path)
+        stat = self.log_path.stat()
+        self.log_entries, self._log_offset, self._log_inode = len(entries), stat.st_size, stat.st_ino
+
+    def _log(self, row: int, paper_id: Optional[str]) -> None:
+        # The vectors live in a shared mapping, so only the row assignment needs an (append-only) write.
+        with self.log_path.open("ab") as handle:
+            if handle.tell() > self._log_offset:
+                handle.truncate(self._log_offset)  # a writer died mid-line; we hold the file lock, so nobody is writing
+            handle.write((json.dumps([row, paper_id]) + "\n").encode("utf-8"))
+            self._log_offset = handle.tell()
+            self._log_inode = os.fstat(handle.fileno()).st_ino
+        self.log_entries += 1
+        if self.log_entries > COMPACT_FACTOR * len(self.ids) + INITIAL_CAPACITY:
+            self._compact()
+
+    def __contains__(self, paper_id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return paper_id in self.rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def vector(self, paper_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            self._refresh()
+            row = self.rows.get(paper_id)
+            return None if row is None else np.array(self.matrix[row])
+
+    def upsert(self, paper_id: str, vector: np.ndarray) -> None:
+        with self._lock, self._file_lock():
+            self._refresh()
+            row = self.rows.get(paper_id)
+            if row is not None:
+                self.doc_freq -= self.matrix[row] > 0
+            else:
+                row = self.free.pop() if self.free else len(self.ids)
+                if row == len(self.ids):
+                    self.ids.append(None)
+                if row >= self.matrix.shape[0]:
+                    self.matrix.flush()
+                    del self.matrix
+                    self._open(len(self.ids) * 2)
+            self.matrix[row] = vector
+            self.ids[row] = paper_id
+            self.rows[paper_id] = row
+            self.doc_freq += vector > 0
+            self._log(row, paper_id)
+
+    def remove(self, paper_id: str) -> None:
+        with self._lock, self._file_lock():
+            self._refresh()
+            row = self.rows.pop(paper_id, None)
+            if row is None:
+                return
+            self.doc_freq -= self.matrix[row] > 0
+            self.matrix[row] = 0
+            self.ids[row] = None
+            self.free.append(row)
+            self._log(row, None)
+
+    def query(self, vector: np.ndarray, k: int = 5, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        # Held for the whole scoring pass: upsert may remap or grow the matrix.
+        with self._lock:
+            self._refresh()
+            return self._query(vector, k, exclude)
+
+    def paper_ids(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return list(self.rows)
+
+    def _query(self, vector: np.ndarray, k: int, exclude: Optional[str]) -> List[Tuple[str, float]]:
+        used = len(self.ids)
+        if not self.rows or k <= 0:
+            return []
+        idf = np.log((len(self.rows) + 1) / (self.doc_freq + 1)).astype(np.float32) + 1
+        # Cosine between IDF-weighted query and IDF-weighted documents: (q*idf)·(d*idf) / (|q*idf| |d*idf|).
+        weights = idf * idf
+        query_norm = float(np.linalg.norm(vector * idf))
+        if not query_norm:
+            return []
+        matrix = self.matrix[:used]
+        doc_norms = np.sqrt(np.square(matrix) @ weights)
+        scores = np.asarray(matrix @ (vector * weights)) / (np.maximum(doc_norms, 1e-12) * query_norm)
+        scores[self.free] = -np.inf
+        if exclude in self.rows:
+            scores[self.rows[exclude]] = -np.inf
+        k = min(k, used)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[row], float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+    def related(self, paper_id: str, k: int = 5) -> List[Tuple[str, float]]:
+        vector = self.vector(paper_id)
+        if vector is None:
+            return []
+        return self.query(vector, k=k, exclude=paper_id)
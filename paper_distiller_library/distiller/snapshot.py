@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from distiller import db, pipeline
+from distiller.blobstore import LocalBlobBackend, _shard
+from distiller.storage import StorageManager
+from distiller.utils import now_iso, utc_now
+
+SNAPSHOT_ROOTS = ("papers", "blobs", "index")
+MANIFEST_FILENAME = "manifest.json"
+BACKUP_PAGES_PER_STEP = 1024
+CHUNK_BYTES = 1024 * 1024
+
+
+def _copy_hashed(source: Path, target: Path) -> Tuple[str, int]:
+    # Hashes while copying in fixed-size chunks, so large PDFs and databases never have to fit in memory.
+    digest = hashlib.sha256()
+    size = 0
+    with source.open("rb") as reader, target.open("wb") as writer:
+        for chunk in iter(lambda: reader.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+            writer.write(chunk)
+            size += len(chunk)
+        writer.flush()
+        os.fsync(writer.fileno())
+    return digest.hexdigest(), size
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as reader:
+        for chunk in iter(lambda: reader.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class SnapshotResult:
+    snapshot_id: str
+    files: int = 0
+    copied: int = 0
+    copied_bytes: int = 0
+    reused: int = 0
+    problems: List[str] = field(default_factory=list)
+
+
+class SnapshotStore:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.objects = LocalBlobBackend(root / "objects")
+        self.snapshots_dir = root / "snapshots"
+
+    def manifest_path(self, snapshot_id: str) -> Path:
+        return self.snapshots_dir / snapshot_id / MANIFEST_FILENAME
+
+    def list_snapshots(self) -> List[str]:
+        if not self.snapshots_dir.exists():
+            return []
+        return sorted(path.parent.name for path in self.snapshots_dir.glob(f"*/{MANIFEST_FILENAME}"))
+
+    def load_manifest(self, snapshot_id: str) -> Dict:
+        return json.loads(self.manifest_path(snapshot_id).read_text(encoding="utf-8"))
+
+    def latest_manifest(self) -> Dict:
+        snapshots = self.list_snapshots()
+        return self.load_manifest(snapshots[-1]) if snapshots else {}
+
+    def put_file(self, source: Path) -> Tuple[str, int, bool]:
+        self.objects.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.objects.root / f".{uuid.uuid4().hex}.tmp"
+        try:
+            digest, size = _copy_hashed(source, tmp_path)
+            if self.objects.exists(digest):
+                return digest, size, False
+            target = self.objects.path(digest)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, target)
+            return digest, size, True
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def check(self, digest: str) -> None:
+        if _hash_file(self.objects.path(digest)) != digest:
+            raise ValueError(f"Object {digest} is corrupt")
+
+    def copy_out(self, digest: str, target: Path) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.restore.tmp")
+        try:
+            if _copy_hashed(self.objects.path(digest), tmp_path)[0] != digest:
+                raise ValueError(f"Object {digest} is corrupt")
+            os.replace(tmp_path, target)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+
+def _iter_files(data_dir: Path) -> Iterator[Path]:
+    for root in SNAPSHOT_ROOTS:
+        base = data_dir / root
+        if not base.exists():
+            continue
+        for path in base.rglob("*"):
+            if path.is_file() and not path.name.endswith(".tmp") and not path.name.startswith("."):
+                yield path
+
+
+def _copy_database(source_path: Path, target_path: Path) -> None:
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP)
+    finally:
+        target.close()
+        source.close()
+
+
+def _backup_database(store: SnapshotStore, db_path: Path) -> Tuple[str, bool]:
+    store.root.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=store.root) as tmp:
+        target_path = Path(tmp) / db.DB_FILENAME
+        _copy_database(db_path, target_path)
+        digest, _, copied = store.put_file(target_path)
+    return digest, copied
+
+
+def create_snapshot(data_dir: Path, backup_dir: Path, workers: int = 8, verify: bool = True) -> SnapshotResult:
+    store = SnapshotStore(backup_dir)
+    previous = store.latest_manifest().get("files", {})
+    snapshot_id = utc_now().strftime("%Y%m%dT%H%M%S%fZ")
+    result = SnapshotResult(snapshot_id=snapshot_id)
+
+    db_digest, db_copied = _backup_database(store, data_dir / db.DB_FILENAME)
+
+    def _copy(path: Path) -> Tuple[str, Dict, bool, int]:
+        relpath = path.relative_to(data_dir).as_posix()
+        stat = path.stat()
+        known = previous.get(relpath)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns and store.objects.exists(known["sha256"]):
+            return relpath, known, False, 0
+        digest, size, copied = store.put_file(path)
+        return relpath, {"sha256": digest, "size": size, "mtime_ns": stat.st_mtime_ns}, copied, size if copied else 0
+
+    files: Dict[str, Dict] = {}
+    new_digests = {db_digest} if db_copied else set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for relpath, entry, copied, size in pool.map(_copy, _iter_files(data_dir)):
+            files[relpath] = entry
+            result.files += 1
+            result.copied += copied
+            result.copied_bytes += size
+            result.reused += not copied
+            if copied:
+                new_digests.add(entry["sha256"])
+
+    manifest = {
+        "snapshot_id": snapshot_id,
+        "created_at": now_iso(),
+        "database": {"sha256": db_digest, "copied": db_copied},
+        "files": dict(sorted(files.items())),
+    }
+    path = store.manifest_path(snapshot_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+    try:
+        # Reused objects were checked when they were first copied; verify_snapshot re-hashes everything.
+        if verify:
+            result.problems = _verify(store, new_digests, workers)
+            if result.problems:
+                raise RuntimeError(f"Snapshot {snapshot_id} failed verification: {result.problems[:5]}")
+        tmp_path.replace(path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return result
+
+
+def _verify(store: SnapshotStore, digests: Iterable[str], workers: int) -> List[str]:
+    def _check(digest: str) -> Optional[str]:
+        try:
+            store.check(digest)
+        except (OSError, ValueError) as exc:
+            return f"{digest}: {exc}"
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [problem for problem in pool.map(_check, sorted(set(digests))) if problem]
+
+
+def verify_snapshot(backup_dir: Path, snapshot_id: str, workers: int = 8) -> List[str]:
+    store = SnapshotStore(backup_dir)
+    manifest = store.load_manifest(snapshot_id)
+    digests = [entry["sha256"] for entry in manifest["files"].values()] + [manifest["database"]["sha256"]]
+    return _verify(store, digests, workers)
+
+
+def _restore_files(store: SnapshotStore, data_dir: Path, entries: Dict[str, Dict], workers: int) -> int:
+    def _restore(item: Tuple[str, Dict]) -> int:
+        relpath, entry = item
+        target = data_dir / relpath
+        if target.exists() and target.stat().st_size == entry["size"] and _hash_file(target) == entry["sha256"]:
+            return 0
+        store.copy_out(entry["sha256"], target)
+        return 1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(_restore, entries.items()))
+
+
+def restore_snapshot(data_dir: Path, backup_dir: Path, snapshot_id: str, workers: int = 8, prune: bool = False) -> int:
+    store = SnapshotStore(backup_dir)
+    manifest = store.load_manifest(snapshot_id)
+    restored = _restore_files(store, data_dir, manifest["files"], workers)
+    if prune:
+        for path in _iter_files(data_dir):
+            if path.relative_to(data_dir).as_posix() not in manifest["files"]:
+                path.unlink()
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_db = Path(tmp) / db.DB_FILENAME
+        store.copy_out(manifest["database"]["sha256"], snapshot_db)
+        # Restoring through the backup API takes the target's locks instead of swapping the file under open connections.
+        _copy_database(snapshot_db, data_dir / db.DB_FILENAME)
+    with db.get_connection(data_dir / db.DB_FILENAME) as conn:
+        paper_ids = db.fetch_paper_ids(conn)
+    pipeline.sync_library_indexes(StorageManager(data_dir / "papers"), paper_ids)
+    return restored
+
+
+def restore_paper(data_dir: Path, backup_dir: Path, snapshot_id: str, paper_id: str, workers: int = 8) -> int:
+    store = SnapshotStore(backup_dir)
+    manifest = store.load_manifest(snapshot_id)
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_db = Path(tmp) / db.DB_FILENAME
+        store.copy_out(manifest["database"]["sha256"], snapshot_db)
+        with db.get_connection(snapshot_db) as conn:
+            record = db.fetch_paper(conn, paper_id)
+            if record is None:
+                raise KeyError(f"Paper {paper_id} is not in snapshot {snapshot_id}")
+            abbreviations = conn.execute("SELECT term, expansion FROM abbreviations WHERE paper_id = ?", (paper_id,)).fetchall()
+            blob_refs = conn.execute(
+                "SELECT blobs.digest, blobs.size FROM blob_refs JOIN blobs USING (digest) WHERE owner = ?", (paper_id,)
+            ).fetchall()
+
+    prefixes = [f"papers/{paper_id}/"] + [(Path("blobs") / _shard(digest)).as_posix() for digest, _ in blob_refs]
+    entries = {relpath: entry for relpath, entry in manifest["files"].items() if relpath.startswith(tuple(prefixes))}
+    restored = _restore_files(store, data_dir, entries, workers)
+
+    db_path = data_dir / db.DB_FILENAME
+    db.init_db(db_path)
+    with db.get_connection(db_path) as conn:
+        db.delete_paper(conn, paper_id)
+        db.insert_paper(conn, record)
+        db.replace_abbreviations(conn, paper_id, [(row[0], row[1]) for row in abbreviations])
+        for digest, size in blob_refs:
+            db.add_blob_ref(conn, digest, size, paper_id)
+    pipeline.index_paper(StorageManager(data_dir / "papers"), paper_id)
+    return restored
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Create, verify and restore incremental library snapshots.")
+    parser.add_argument("command", choices=["create", "list", "verify", "restore"])
+    parser.add_argument("snapshot", nargs="?", help="Snapshot id for verify/restore (default: latest).")
+    parser.add_argument("--data-dir", type=Path, default=Path(__file__).resolve().parents[1] / "data")
+    parser.add_argument("--backup-dir", type=Path, default=None)
+    parser.add_argument("--paper", default=None, help="Restore only this paper.")
+    parser.add_argument("--prune", action="store_true", help="On full restore, delete files the snapshot does not contain.")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    backup_dir = args.backup_dir or args.data_dir.parent / "backups"
+    store = SnapshotStore(backup_dir)
+    if args.command == "create":
+        result = create_snapshot(args.data_dir, backup_dir, workers=args.workers)
+        print(f"Snapshot {result.snapshot_id}: {result.files} files, {result.copied} new objects ({result.copied_bytes} bytes)")
+        return
+    if args.command == "list":
+        for snapshot_id in store.list_snapshots():
+            print(snapshot_id)
+        return
+    snapshot_id = args.snapshot or (store.list_snapshots() or [None])[-1]
+    if snapshot_id is None:
+        raise SystemExit(f"No snapshots in {backup_dir}")
+    if args.command == "verify":
+        problems = verify_snapshot(backup_dir, snapshot_id, workers=args.workers)
+        print(f"Snapshot {snapshot_id}: {'OK' if not problems else f'{len(problems)} problems'}")
+        for problem in problems:
+            print(f"  {problem}")
+        raise SystemExit(1 if problems else 0)
+    if args.paper:
+        restored = restore_paper(args.data_dir, backup_dir, snapshot_id, args.paper, workers=args.workers)
+    else:
+        restored = restore_snapshot(args.data_dir, backup_dir, snapshot_id, workers=args.workers, prune=args.prune)
+    print(f"Restored {restored} files from snapshot {snapshot_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,51 @@
+from __future__ import annotations
+
 import json
+import os
+import shutil
+import uuid
+import zlib
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+
+from distiller.schemas import LazyBundle, OutputBundle, is_trusted, stamp_bundle
+from distiller.utils import now_iso
+
+if TYPE_CHECKING:
+    from distiller.blobstore import BlobStore
+
+BUNDLE_FILENAME = "outputs.json"
+MANIFEST_FILENAME = "artifacts.json"
+SOURCE_FILENAME = "source.json"
+
+# Bump the version of an artifact whenever the code that produces it changes its content.
+ARTIFACT_VERSIONS = {
+    "parsed_text.json": 2,
+    "sections.json": 1,
+    "passage_index.npz": 1,
+    BUNDLE_FILENAME: 3,
+}
+# A fingerprint of every artifact version: any bump changes it, so papers are stale when it differs (not when it is lower).
+PIPELINE_VERSION = zlib.crc32(json.dumps(sorted(ARTIFACT_VERSIONS.items())).encode("utf-8"))
+
+
+@contextmanager
+def atomic_path(path: Path) -> Iterator[Path]:
+    # Written to a temp file and swapped in, so readers never see a half-written artifact.
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
 
 class StorageManager:
-    def __init__(self, base_dir: Path) -> None:
+    def __init__(self, base_dir: Path, index_dir: Optional[Path] = None, blobs: Optional[BlobStore] = None) -> None:
         self.base_dir = base_dir
+        self.index_dir = index_dir or base_dir.parent / "index"
+        self.blobs = blobs
 
     def paper_dir(self, paper_id: str) -> Path:
         return self.base_dir / paper_id
@@ -17,16 +57,77 @@ class StorageManager:
         return path
 
     def save_pdf(self, paper_id: str, filename: str, content: bytes) -> Path:
-        paper_dir = self.ensure_paper_dir(paper_id)
-        pdf_path = paper_dir / filename
-        pdf_path.write_bytes(content)
-        return pdf_path
+        if self.blobs is None:
+            pdf_path = self.ensure_paper_dir(paper_id) / filename
+            pdf_path.write_bytes(content)
+            return pdf_path
+        digest = self.blobs.put(content, owner=paper_id)
+        self.save_json(paper_id, SOURCE_FILENAME, {"digest": digest, "filename": filename})
+        return self.blobs.local_path(digest)
+
+    def pdf_digest(self, paper_id: str) -> Optional[str]:
+        return self.load_json(paper_id, SOURCE_FILENAME).get("digest")
+
+    def pdf_path(self, paper_id: str, filename: str, digest: Optional[str] = None) -> Path:
+        digest = digest or self.pdf_digest(paper_id)
+        if digest and self.blobs is not None:
+            return self.blobs.local_path(digest)
+        return self.paper_dir(paper_id) / filename
+
+    def delete_paper(self, paper_id: str) -> None:
+        if self.blobs is not None:
+            self.blobs.release(paper_id)
+        shutil.rmtree(self.paper_dir(paper_id), ignore_errors=True)
 
     def save_json(self, paper_id: str, name: str, payload: Dict[str, Any]) -> Path:
         path = self.ensure_paper_dir(paper_id) / name
-        path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        with atomic_path(path) as tmp_path, tmp_path.open("w", encoding="utf-8") as handle:
+            json.dump(payload, handle, ensure_ascii=False, separators=(",", ":"))
+        self.stamp(paper_id, name)
+        return path
+
+    def save_bundle(self, paper_id: str, bundle: OutputBundle) -> Path:
+        path = self._write_bundle(paper_id, bundle)
+        self.stamp(paper_id, BUNDLE_FILENAME)
+        return path
+
+    def _write_bundle(self, paper_id: str, bundle: OutputBundle) -> Path:
+        path = self.ensure_paper_dir(paper_id) / BUNDLE_FILENAME
+        with atomic_path(path) as tmp_path:
+            tmp_path.write_bytes(stamp_bundle(bundle).model_dump_json().encode("utf-8"))
         return path
 
+    def stamp(self, paper_id: str, name: str) -> None:
+        manifest = self.artifact_versions(paper_id)
+        manifest[name] = {"version": ARTIFACT_VERSIONS.get(name, 1), "written_at": now_iso()}
+        with atomic_path(self.ensure_paper_dir(paper_id) / MANIFEST_FILENAME) as tmp_path:
+            tmp_path.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+
+    def artifact_versions(self, paper_id: str) -> Dict[str, Dict[str, Any]]:
+        return self.load_json(paper_id, MANIFEST_FILENAME)
+
+    def stale_artifacts(self, paper_id: str) -> Dict[str, int]:
+        manifest = self.artifact_versions(paper_id)
+        return {
+            name: manifest.get(name, {}).get("version", 0)
+            for name, version in ARTIFACT_VERSIONS.items()
+            if manifest.get(name, {}).get("version", 0) < version
+        }
+
+    def load_bundle(self, paper_id: str) -> Optional[LazyBundle]:
+        payload = self.load_json(paper_id, BUNDLE_FILENAME)
+        if not payload:
+            return None
+        if not is_trusted(payload):
+            bundle = OutputBundle.model_validate(payload)
+            self._write_bundle(paper_id, bundle)
+            payload = bundle.model_dump()
+        return LazyBundle(payload)
+
+    def read_bytes(self, paper_id: str, name: str) -> bytes:
+        path = self.paper_dir(paper_id) / name
+        return path.read_bytes() if path.exists() else b""
+
     def load_json(self, paper_id: str, name: str) -> Dict[str, Any]:
         path = self.paper_dir(paper_id) / name
         if not path.exists():
@@ -35,3 +136,10 @@ class StorageManager:
 
     def export_path(self, paper_id: str, filename: str) -> Path:
         return self.ensure_paper_dir(paper_id) / "exports" / filename
+
+    def artifact_path(self, paper_id: str, name: str) -> Path:
+        return self.ensure_paper_dir(paper_id) / name
+
+    def library_path(self, name: str) -> Path:
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        return self.index_dir / name
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Iterable, Iterator, List, Tuple
+
+from pydantic import ValidationError
+
+from distiller.schemas import OutputBundle, section_adapter
+
+BUNDLE_SECTIONS = [name for name in OutputBundle.model_fields if name != "metadata"]
+
+
+class BundleStreamParser:
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.member_start = -1
+        self.done = False
+        self.errors: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.buffer += chunk
+        sections: List[Tuple[str, Any]] = []
+        while self.position < len(self.buffer) and not self.done:
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                    self.member_start = self.position + 1
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == 1:
+                    sections.extend(self._emit(self.position))
+                    self.done = True
+                self.depth -= 1
+            elif char == "," and self.depth == 1:
+                sections.extend(self._emit(self.position))
+                self.member_start = self.position + 1
+            self.position += 1
+        return sections
+
+    def _emit(self, end: int) -> List[Tuple[str, Any]]:
+        member = self.buffer[self.member_start:end].strip()
+        if not member:
+            return []
+        try:
+            ((name, value),) = json.loads("{" + member + "}").items()
+        except (ValueError, TypeError):
+            self.errors.append(member[:80])
+            return []
+        if name not in BUNDLE_SECTIONS:
+            return [(name, value)] if name == "metadata" else []
+        try:
+            return [(name, section_adapter(name).validate_python(value))]
+        except ValidationError as exc:
+            self.errors.append(f"{name}: {exc.error_count()} validation errors")
+            return []
+
+
+def parse_stream(chunks: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    parser = BundleStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
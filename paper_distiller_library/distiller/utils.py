@@ -1,12 +1,30 @@
 import re
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def to_iso(moment: datetime) -> str:
+    # Stored timestamps are naive UTC isoformat strings, so they compare correctly as text.
+    return moment.astimezone(timezone.utc).replace(tzinfo=None).isoformat()
 
 
 def now_iso() -> str:
-    return datetime.utcnow().isoformat()
+    return to_iso(utc_now())
+
+
+def days_ago_iso(days: float) -> str:
+    return to_iso(utc_now() - timedelta(days=days))
 
 
 def simplify_title(filename: str) -> str:
     base = re.sub(r"\.[Pp][Dd][Ff]$", "", filename)
     base = re.sub(r"[_\-]+", " ", base)
     return base.strip()[:80] or "Untitled"
+
+
+def split_tags(tags: Optional[str]) -> List[str]:
+    return [tag.strip() for tag in (tags or "").split(",") if tag.strip()]
@@ -0,0 +1,17 @@
+import pytest
+
+from distiller import db
+
+
+@pytest.fixture
+def paper_record():
+    def make(paper_id, **fields):
+        values = dict(
+            id=paper_id, original_filename="paper.pdf", display_title=paper_id, short_title=paper_id, authors=None,
+            year=None, doi=None, category=None, tags=None, status="unread", added_at="2024-01-01", notes=None,
+        )
+        values.update(fields)
+        values.setdefault("updated_at", values["added_at"])
+        return db.PaperRecord(**values)
+
+    return make
@@ -0,0 +1,114 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import fitz
+import pytest
+
+from distiller import pipeline
+from distiller.admission import AdmissionController, JobEstimate, current_rss_bytes, estimate_job
+from distiller.storage import StorageManager
+
+
+def _large_pdf(pages, seed):
+    document = fitz.open()
+    words = ["graph", "retrieval", "dataset", "limitation", "evidence", "baseline", "model", "survey"]
+    for page in range(pages):
+        body = " ".join(words[(page * seed + index) % len(words)] for index in range(450))
+        document.new_page().insert_textbox(fitz.Rect(40, 40, 560, 800), f"{page + 1} Results\n{body}")
+    return document.tobytes()
+
+
+def _ingest_concurrently(tmp_dir, budget_factor):
+    storage = StorageManager(Path(tmp_dir) / "papers")
+    pipeline.ingest_pdf(storage, "warmup", "warmup.pdf", _large_pdf(2, 1))
+    uploads = [_large_pdf(60, seed) for seed in range(1, 5)]
+    estimate = estimate_job(uploads[0])
+    controller = AdmissionController(
+        memory_budget_bytes=int(estimate.memory_bytes * budget_factor), cpu_slots=4, poll_seconds=0.05
+    )
+    errors = []
+
+    def _ingest(index):
+        try:
+            pipeline.ingest_pdf(storage, f"paper{index}", "large.pdf", uploads[index], controller=controller)
+        except Exception as exc:
+            errors.append(repr(exc))
+
+    # RSS includes PyMuPDF's native allocations, which tracemalloc does not see.
+    baseline = peak = current_rss_bytes()
+    done = threading.Event()
+
+    def _sample():
+        nonlocal peak
+        while not done.wait(0.002):
+            peak = max(peak, current_rss_bytes())
+
+    sampler = threading.Thread(target=_sample)
+    sampler.start()
+    threads = [threading.Thread(target=_ingest, args=(index,)) for index in range(len(uploads))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    sampler.join()
+    return {
+        "errors": errors,
+        "admitted": controller.admitted,
+        "peak_active": controller.peak_active,
+        "reserved_bytes": controller.usage()["reserved_bytes"],
+        "budget_bytes": controller.memory_budget_bytes,
+        "rss_growth_bytes": peak - baseline,
+    }
+
+
+def _measure(tmp_path, budget_factor):
+    # A fresh process gives a clean RSS baseline; a single malloc arena keeps glibc from reserving
+    # one heap per worker thread, so the growth reflects the jobs rather than the thread count.
+    env = {**os.environ, "MALLOC_ARENA_MAX": "1", "PYTHONPATH": str(Path(__file__).resolve().parents[1])}
+    completed = subprocess.run(
+        [sys.executable, __file__, str(tmp_path / str(budget_factor)), str(budget_factor)],
+        env=env, capture_output=True, text=True, check=True, timeout=300,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_concurrent_large_uploads_stay_within_memory_budget(tmp_path):
+    if current_rss_bytes() is None:
+        pytest.skip("RSS is read from /proc")
+    limited = _measure(tmp_path, 1.5)
+    assert not limited["errors"]
+    assert limited["admitted"] == 4 and limited["peak_active"] == 1
+    assert limited["reserved_bytes"] == 0
+    assert limited["rss_growth_bytes"] <= limited["budget_bytes"]
+
+    unlimited = _measure(tmp_path, 100)
+    assert unlimited["peak_active"] > 1 and unlimited["rss_growth_bytes"] > limited["rss_growth_bytes"]
+
+
+def test_interrupted_wait_releases_its_place_in_the_queue(monkeypatch):
+    controller = AdmissionController(memory_budget_bytes=100, cpu_slots=1, poll_seconds=0.01)
+    estimate = JobEstimate(pages=1, file_bytes=1, memory_bytes=10, cpu_seconds=0.0)
+    with controller.admit(estimate):
+        def interrupted(reservation):
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(controller, "_fits", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            with controller.admit(estimate):
+                pass
+        monkeypatch.undo()
+        assert controller.usage()["queued_jobs"] == 0
+
+    later = threading.Thread(target=lambda: controller.admit(estimate).__enter__())
+    later.start()
+    later.join(timeout=5)
+    assert not later.is_alive() and controller.admitted == 2
+
+
+if __name__ == "__main__":
+    print(json.dumps(_ingest_concurrently(sys.argv[1], float(sys.argv[2]))))
@@ -0,0 +1,65 @@
+import threading
+
+from distiller import db
+from distiller.blobstore import BlobStore, LocalBlobBackend, LocalObjectClient, ObjectStoreBackend
+from distiller.storage import StorageManager
+
+
+def test_blob_store_dedups_refcounts_and_collects(tmp_path):
+    db_path = tmp_path / "library.db"
+    db.init_db(db_path)
+    store = BlobStore(LocalBlobBackend(tmp_path / "blobs"), db_path)
+    storage = StorageManager(tmp_path / "papers", blobs=store)
+
+    first = storage.save_pdf("a", "paper.pdf", b"%PDF-1.4 same bytes")
+    second = storage.save_pdf("b", "copy.pdf", b"%PDF-1.4 same bytes")
+    digest = storage.pdf_digest("a")
+    assert first == second == storage.pdf_path("b", "copy.pdf") and first.parent.parent.name == digest[:2]
+    assert store.refcount(digest) == 2 and len(list((tmp_path / "blobs").rglob("*"))) == 3
+
+    storage.delete_paper("a")
+    assert not storage.paper_dir("a").exists()
+    assert store.collect_garbage(grace_seconds=0) == 0 and first.exists()
+    storage.delete_paper("b")
+    assert store.collect_garbage(grace_seconds=3600) == 0
+    assert store.collect_garbage(grace_seconds=0) == 1 and not first.exists()
+
+    storage.save_pdf("c", "paper.pdf", b"%PDF-1.4 same bytes")
+    assert first.read_bytes() == b"%PDF-1.4 same bytes"
+
+
+def test_object_store_backend_serves_local_paths_from_cache(tmp_path):
+    client = LocalObjectClient(tmp_path / "s3")
+    writer = ObjectStoreBackend(client, "library", cache_dir=tmp_path / "node-a")
+    reader = ObjectStoreBackend(client, "library", cache_dir=tmp_path / "node-b")
+    writer.put("ab" * 32, b"pdf bytes")
+    assert reader.exists("ab" * 32) and reader.local_path("ab" * 32).read_bytes() == b"pdf bytes"
+    writer.delete("ab" * 32)
+    assert not reader.exists("ab" * 32)
+
+
+class _RacingBackend(LocalBlobBackend):
+    def __init__(self, root, racer):
+        super().__init__(root)
+        self.racer = racer
+
+    def delete(self, digest):
+        # A put for the same bytes arrives while the collector is removing the object.
+        self.racer.start()
+        self.racer.join(0.2)
+        super().delete(digest)
+
+
+def test_put_racing_with_collection_keeps_its_object(tmp_path):
+    db_path = tmp_path / "library.db"
+    db.init_db(db_path)
+    racer = threading.Thread(target=lambda: store.put(b"%PDF-1.4 bytes", owner="b"))
+    store = BlobStore(_RacingBackend(tmp_path / "blobs", racer), db_path)
+    digest = store.put(b"%PDF-1.4 bytes", owner="a")
+    with db.get_connection(db_path) as conn:
+        db.delete_paper(conn, "a")
+    assert store.refcount(digest) == 0
+
+    assert store.collect_garbage(grace_seconds=0) == 1
+    racer.join()
+    assert store.refcount(digest) == 1 and store.get(digest) == b"%PDF-1.4 bytes"
@@ -0,0 +1,56 @@
+import json
+
+from distiller import db
+from distiller.digest import build_digest, load_state
+from distiller.storage import BUNDLE_FILENAME, StorageManager
+from distiller.utils import days_ago_iso, now_iso
+
+
+def _bundle(summary, term):
+    return {
+        "story_line": {"one_paragraph_summary": {"text": summary}, "bullets": [{"text": f"{summary} gap"}]},
+        "contributions_and_implications": {"innovations": [{"text": f"{summary} innovation"}]},
+        "glossary_terms": [{"term": term, "definition": f"{term} definition"}],
+    }
+
+
+def test_digest_rerenders_only_changed_bundles(tmp_path, paper_record):
+    db_path = tmp_path / "library.db"
+    db.init_db(db_path)
+    storage = StorageManager(tmp_path / "papers")
+    with db.get_connection(db_path) as conn:
+        for index, paper_id in enumerate(["a", "b", "c"]):
+            db.insert_paper(conn, paper_record(paper_id, display_title=f"Paper {paper_id}", added_at=f"2024-01-0{index + 1}"))
+            storage.save_json(paper_id, BUNDLE_FILENAME, _bundle(f"Summary {paper_id}", "RAG" if paper_id != "c" else "BM25"))
+    storage.artifact_path("c", BUNDLE_FILENAME).write_text("{broken", encoding="utf-8")
+    out_dir = tmp_path / "digest"
+
+    first = build_digest(db_path, storage, out_dir, workers=0)
+    assert (first.rendered, first.reused, list(first.failed)) == (2, 0, ["c"])
+    text = first.path.read_text(encoding="utf-8")
+    assert text.index("## Paper b") < text.index("## Paper a") and "*Innovations*\n- Summary a innovation" in text
+    assert "*Story line*\n- Summary a gap\n" in text
+    assert "- **RAG**: RAG definition (2 papers)" in text
+
+    storage.save_json("a", BUNDLE_FILENAME, _bundle("Rewritten", "RAG"))
+    second = build_digest(db_path, storage, out_dir, fmt="site", workers=2)
+    assert (second.papers, second.rendered, second.reused) == (2, 1, 1)
+    assert "Rewritten" in (out_dir / "entries" / "a.md").read_text(encoding="utf-8")
+    assert "[Paper b](entries/b.md)" in second.path.read_text(encoding="utf-8")
+
+    weekly = build_digest(db_path, storage, out_dir, since="2024-01-01T12:00:00", workers=0)
+    assert weekly.papers == 1 and weekly.reused == 1 and "## Paper a" not in weekly.path.read_text(encoding="utf-8")
+    assert set(load_state(out_dir)["entries"]) == {"a", "b"}
+    assert json.loads((out_dir / "digest_state.json").read_text(encoding="utf-8"))["template_version"] == 2
+
+    with db.get_connection(db_path) as conn:
+        db.insert_paper(conn, paper_record("d", display_title="Paper d", added_at=now_iso()))
+    storage.save_json("d", BUNDLE_FILENAME, _bundle("Fresh", "RAG"))
+    recent = build_digest(db_path, storage, out_dir, since=days_ago_iso(7), workers=0)
+    assert recent.papers == 1 and "## Paper d" in recent.path.read_text(encoding="utf-8")
+
+    # Edits that leave the bundle and the digest fields alone reuse the rendered entry.
+    with db.get_connection(db_path) as conn:
+        db.update_paper_fields(conn, "d", {"notes": "skimmed", "status": "read"})
+    again = build_digest(db_path, storage, out_dir, since=days_ago_iso(7), workers=0)
+    assert (again.papers, again.rendered, again.reused) == (1, 0, 1)
@@ -0,0 +1,22 @@
+from distiller import db
+
+
+def test_facet_counts_follow_insert_update_and_delete(tmp_path, paper_record):
+    db_path = tmp_path / "library.db"
+    db.init_db(db_path)
+    with db.get_connection(db_path) as conn:
+        db.insert_paper(conn, paper_record("a", year=2021, category="NLP", tags="llm, survey"))
+        db.insert_paper(conn, paper_record("b", year=2021, category="NLP", tags="llm"))
+        db.insert_paper(conn, paper_record("c", year=2023, status="read"))
+        db.update_paper_fields(conn, "b", {"tags": "vision, ", "year": float("nan"), "status": "read"})
+        db.update_paper_fields(conn, "c", {"notes": "unrelated"})
+        db.delete_paper(conn, "a")
+        stats = db.fetch_library_stats(conn)
+
+    assert stats == {
+        "papers": 2,
+        "by_status": {"read": 2},
+        "by_year": {"2023": 1},
+        "by_category": {"NLP": 1},
+        "by_tag": {"vision": 1},
+    }
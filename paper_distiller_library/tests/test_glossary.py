@@ -0,0 +1,55 @@
+from distiller import db
+from distiller.extractors import extract_glossary, learned_abbreviations
+from distiller.glossary import AhoCorasick, GlossaryDictionary, find_definitions, scan_glossary
+
+
+def test_find_definitions_learns_long_form_short_form_pairs():
+    text = "We apply natural language processing (NLP) with large language models (LLMs)."
+    assert [(short, long) for short, long, _, _ in find_definitions(text)] == [
+        ("NLP", "natural language processing"),
+        ("LLM", "large language models"),
+    ]
+
+
+def test_aho_corasick_reports_overlapping_matches():
+    matches = list(AhoCorasick(["he", "she", "hers"]).finditer("ushers"))
+    assert sorted(term for _, _, term in matches) == ["he", "hers", "she"]
+
+
+def test_scan_glossary_dedupes_and_uses_library_dictionary():
+    dictionary = GlossaryDictionary({"RNN": "recurrent neural network", "NN": "neural network"})
+    pages = [(1, "An RNN and another RNN."), (2, "Convolutional neural networks (CNN) beat the RNN. CNN again. XYZ.")]
+    hits = {hit.term: hit for hit in scan_glossary(pages, dictionary)}
+    assert set(hits) == {"RNN", "CNN", "XYZ"}
+    assert hits["RNN"].page == 1 and not hits["RNN"].defined_here
+    assert hits["CNN"].defined_here and hits["CNN"].expansion == "Convolutional neural networks"
+
+    dictionary.matchers
+    dictionary.update([("XYZ", "x y z")])
+    assert len(dictionary.matchers) == 2
+    assert {hit.term: hit.expansion for hit in scan_glossary(pages, dictionary)}["XYZ"] == "x y z"
+
+
+def test_abbreviation_dictionary_roundtrip(tmp_path):
+    db_path = tmp_path / "library.db"
+    db.init_db(db_path)
+    terms = extract_glossary([(1, "Graph neural networks (GNN) are used.")])
+    with db.get_connection(db_path) as conn:
+        db.replace_abbreviations(conn, "p1", learned_abbreviations(terms))
+        db.replace_abbreviations(conn, "p2", [("GNN", "graph neural nets"), ("GNN", "Graph neural networks")])
+        assert db.fetch_abbreviations(conn) == {"GNN": "Graph neural networks"}
+
+        db.replace_abbreviations(conn, "p2", [("GNN", "graph neural nets")])
+        db.replace_abbreviations(conn, "p3", [("GNN", "graph neural nets")])
+        assert db.fetch_abbreviations(conn) == {"GNN": "graph neural nets"}
+        db.delete_paper(conn, "p3")
+        assert db.fetch_abbreviations(conn) == {"GNN": "Graph neural networks"}
+
+
+def test_learned_abbreviations_use_source_not_note_text():
+    terms = extract_glossary([(1, "Graph neural networks (GNN) beat the RNN.")], GlossaryDictionary({"RNN": "recurrent network"}))
+    for term in terms:
+        term.notes = "edited by a reader"
+    assert learned_abbreviations(terms) == [("GNN", "Graph neural networks")]
+    llm_term = terms[0].model_copy(update={"term": "LLM", "expansion": "large language model", "source": "llm"})
+    assert ("LLM", "large language model") in learned_abbreviations(terms + [llm_term])
@@ -0,0 +1,85 @@
+import csv
+import json
+
+from distiller import db
+from distiller.library_export import export_library
+from distiller.storage import StorageManager
+
+
+def _add_paper(conn, storage, record, terms):
+    db.insert_paper(conn, record)
+    storage.save_json(record.id, "outputs.json", {"glossary_terms": [{"term": term, "page": 1} for term in terms]})
+
+
+def test_incremental_csv_export_appends_only_changed_papers(tmp_path, paper_record):
+    db_path = tmp_path / "library.db"
+    db.init_db(db_path)
+    storage = StorageManager(tmp_path / "papers")
+    out_dir = tmp_path / "exports"
+    with db.get_connection(db_path) as conn:
+        _add_paper(conn, storage, paper_record("a", added_at="2024-01-01T00:00:00"), ["NLP", "LLM"])
+        _add_paper(conn, storage, paper_record("b", added_at="2024-01-02T00:00:00"), ["CNN"])
+
+    first = export_library(db_path, storage, out_dir, tables=["glossary_terms"], incremental=True, chunk_size=1)
+    assert first.papers == 2 and first.rows["glossary_terms"] == 3
+
+    with db.get_connection(db_path) as conn:
+        _add_paper(conn, storage, paper_record("c", added_at="2024-01-03T00:00:00"), ["RNN"])
+    second = export_library(db_path, storage, out_dir, tables=["glossary_terms"], incremental=True)
+    assert second.papers == 1
+
+    with (out_dir / "glossary_terms.csv").open(encoding="utf-8") as handle:
+        terms = [row["term"] for row in csv.DictReader(handle)]
+    assert terms == ["NLP", "LLM", "CNN", "RNN"]
+
+
+def test_incremental_export_rewrites_when_an_exported_paper_changes_or_is_deleted(tmp_path, paper_record):
+    db_path = tmp_path / "library.db"
+    db.init_db(db_path)
+    storage = StorageManager(tmp_path / "papers")
+    out_dir = tmp_path / "exports"
+    with db.get_connection(db_path) as conn:
+        _add_paper(conn, storage, paper_record("a", added_at="2024-01-01T00:00:00"), ["NLP"])
+        _add_paper(conn, storage, paper_record("b", added_at="2024-01-02T00:00:00"), ["CNN"])
+    export_library(db_path, storage, out_dir, fmt="jsonl", tables=["glossary_terms"], incremental=True)
+
+    storage.save_json("a", "outputs.json", {"glossary_terms": [{"term": "LLM", "page": 2}]})
+    with db.get_connection(db_path) as conn:
+        db.update_paper_fields(conn, "a", {"updated_at": "2024-01-05T00:00:00"})
+    rewritten = export_library(db_path, storage, out_dir, fmt="jsonl", tables=["glossary_terms"], incremental=True)
+    assert rewritten.since is None and rewritten.papers == 2
+
+    with db.get_connection(db_path) as conn:
+        db.delete_paper(conn, "b")
+    export_library(db_path, storage, out_dir, fmt="jsonl", tables=["glossary_terms"], incremental=True)
+    lines = (out_dir / "glossary_terms.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [(json.loads(line)["paper_id"], json.loads(line)["term"]) for line in lines] == [("a", "LLM")]
+
+
+def test_incremental_export_skips_metadata_only_updates_and_aligns_old_csv_headers(tmp_path, paper_record):
+    db_path = tmp_path / "library.db"
+    db.init_db(db_path)
+    storage = StorageManager(tmp_path / "papers")
+    out_dir = tmp_path / "exports"
+    with db.get_connection(db_path) as conn:
+        _add_paper(conn, storage, paper_record("a", added_at="2024-01-01T00:00:00"), ["NLP"])
+    export_library(db_path, storage, out_dir, tables=["glossary_terms"], incremental=True)
+    csv_path = out_dir / "glossary_terms.csv"
+    with csv_path.open(encoding="utf-8", newline="") as handle:
+        rows = list(csv.DictReader(handle))
+    # An export written before GlossaryTerm.source existed.
+    with csv_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=[column for column in rows[0] if column != "source"], extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    with db.get_connection(db_path) as conn:
+        db.update_paper_fields(conn, "a", {"notes": "read twice"})
+        _add_paper(conn, storage, paper_record("b", added_at="2024-01-06T00:00:00"), ["CNN"])
+    appended = export_library(db_path, storage, out_dir, tables=["glossary_terms"], incremental=True)
+    assert appended.since == "2024-01-01T00:00:00" and appended.papers == 1
+
+    with csv_path.open(encoding="utf-8", newline="") as handle:
+        reader = csv.DictReader(handle)
+        assert "source" in reader.fieldnames
+        assert [(row["paper_id"], row["term"]) for row in reader] == [("a", "NLP"), ("b", "CNN")]
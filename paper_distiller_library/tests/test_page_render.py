@@ -0,0 +1,55 @@
+import fitz
+import pytest
+
+from distiller import page_render
+from distiller.page_render import PageRenderer
+
+
+def test_page_renderer_highlights_caches_and_prefetches(tmp_path):
+    document = fitz.open()
+    for number in range(1, 4):
+        document.new_page().insert_text((72, 72), f"Page {number} reports a 12% gain over the baseline.")
+    pdf_path = tmp_path / "paper.pdf"
+    document.save(pdf_path)
+
+    renderer = PageRenderer(tmp_path / "cache", prefetch=1)
+    plain = renderer.render(pdf_path, 2, zoom=1.0)
+    highlighted = renderer.render(pdf_path, 2, zoom=1.0, quote="a 12%  gain\nover the baseline")
+    assert highlighted.startswith(b"\x89PNG") and highlighted != plain
+    assert renderer.render(pdf_path, 2, zoom=1.0, quote="a 12% gain over the baseline") == highlighted
+    assert (renderer.hits, renderer.misses) == (1, 2)
+    renderer.close()
+    assert renderer.cache_path(pdf_path, 1, 1.0).exists() and renderer.cache_path(pdf_path, 3, 1.0).exists()
+
+    rows = PageRenderer(tmp_path / "rows", prefetch=1)
+    rows.render(pdf_path, 2, zoom=1.0, quote="Page 2 reports", neighbours=[(1, "Page 1 reports"), (3, "a 12% gain"), (7, "beyond")])
+    with pytest.raises(ValueError):
+        rows.render(pdf_path, 4, zoom=1.0)
+    rows.close()
+    assert rows.cache_path(pdf_path, 3, 1.0, "a 12% gain").exists() and not rows.cache_path(pdf_path, 3, 1.0).exists()
+    rows = PageRenderer(tmp_path / "rows", prefetch=1)
+    rows.render(pdf_path, 1, zoom=1.0, quote="Page 1 reports")
+    assert (rows.hits, rows.misses) == (1, 0)
+    rows.close()
+
+    small = PageRenderer(tmp_path / "cache", max_bytes=len(plain) + 1, prefetch=0)
+    small.render(pdf_path, 1, zoom=0.5)
+    assert [path.name for path in (tmp_path / "cache").glob("*.png")] == [small.cache_path(pdf_path, 1, 0.5).name]
+    small.close()
+
+
+def test_documents_in_use_are_not_closed_by_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(page_render, "MAX_OPEN_DOCUMENTS", 1)
+    paths = []
+    for name in ("a", "b"):
+        document = fitz.open()
+        document.new_page().insert_text((72, 72), f"Paper {name}")
+        paths.append(tmp_path / f"{name}.pdf")
+        document.save(paths[-1])
+
+    renderer = PageRenderer(tmp_path / "cache", prefetch=0)
+    with renderer._document(paths[0]) as pinned:
+        assert renderer.page_count(paths[1]) == 1
+        assert not pinned.is_closed and len(pinned) == 1
+    assert list(renderer._documents) == [str(paths[0])]
+    renderer.close()
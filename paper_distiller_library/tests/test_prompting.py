@@ -0,0 +1,30 @@
+from distiller.llm_provider import MockProvider
+from distiller.prompting import PromptBudget, PromptBuilder, estimate_tokens, pack_passages, split_to_budget
+from distiller.retrieval import BM25Index, chunk_pages
+
+
+def test_split_to_budget_respects_token_limit():
+    text = "This is a sentence about reading. " * 200
+    pieces = split_to_budget(text, 100)
+    assert len(pieces) > 1
+    assert all(estimate_tokens(piece) <= 100 for piece in pieces)
+
+
+def test_pack_passages_prefers_relevant_passages_within_budget():
+    pages = [(page, f"Filler text about page {page}. " * 20) for page in range(1, 6)]
+    pages.append((6, "The main limitation is the tiny dataset used for evaluation."))
+    index = BM25Index.build(chunk_pages(pages))
+    packed = pack_passages(index, "limitation dataset", budget_tokens=60)
+    assert packed[0].page == 6
+
+
+def test_builder_uses_map_reduce_for_oversized_context():
+    builder = PromptBuilder(MockProvider(), PromptBudget(context_window=400, max_output_tokens=100))
+    builder.run("Summarise the methods.", "We trained a model on data. " * 300)
+    stages = builder.report.as_dict()
+    assert stages["map"]["calls"] > 1
+    assert "reduce" in stages and "direct" not in stages
+
+    builder = PromptBuilder(MockProvider(), PromptBudget(context_window=400, max_output_tokens=100))
+    builder.run("Summarise the methods.", "We trained a model.")
+    assert list(builder.report.as_dict()) == ["direct"]
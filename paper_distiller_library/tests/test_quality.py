@@ -0,0 +1,26 @@
+from distiller.quality import analyze_pages, filter_pages
+
+
+def test_analyze_pages_flags_short_and_garbage_pages():
+    body = "Introduction. We study reading comprehension in long docu-\nments across many fields.\n" * 5
+    texts = [body, "12", "��������" * 10 + " some text here " * 3, ""]
+    quality = analyze_pages(texts)
+    assert quality.low_quality_pages() == {2, 3, 4}
+    assert quality.hyphenation_rate[0] > 0
+    assert quality.char_counts[0] == len(body.strip())
+
+
+def test_filter_pages_keeps_all_when_everything_is_skipped():
+    pages = [(1, "a"), (2, "b")]
+    assert filter_pages(pages, {1}) == [(2, "b")]
+    assert filter_pages(pages, {1, 2}) == pages
+
+
+def test_analyze_pages_vectorised_layout_and_lone_surrogates():
+    two_column = "short line\n" * 12 + "\n\n"
+    one_column = "a much longer line of text that is wide enough to count as a single column layout\n" * 12
+    texts = [two_column, one_column, "\x1c  Results with a lone \ud835 surrogate from PyMuPDF.  " * 3]
+    quality = analyze_pages(texts)
+    assert quality.columns.tolist() == [2, 1, 1]
+    assert quality.char_counts.tolist() == [len(text.strip()) for text in texts]
+    assert quality.garbage_ratio[2] > 0
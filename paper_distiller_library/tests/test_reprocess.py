@@ -0,0 +1,52 @@
+import fitz
+
+from distiller import db, pipeline
+from distiller import storage as storage_module
+from distiller.reprocess import load_checkpoint, reprocess_library
+from distiller.storage import BUNDLE_FILENAME, PIPELINE_VERSION, StorageManager
+
+
+def test_reprocess_library_prioritises_recent_views_and_checkpoints(tmp_path, paper_record):
+    db_path = tmp_path / "library.db"
+    db.init_db(db_path)
+    storage = StorageManager(tmp_path / "papers")
+    document = fitz.open()
+    document.new_page().insert_text((72, 72), "Introduction. We study retrieval augmented generation (RAG) for papers.")
+    with db.get_connection(db_path) as conn:
+        db.insert_paper(conn, paper_record("old", added_at="2024-01-01T00:00:00"))
+        db.insert_paper(conn, paper_record("viewed", added_at="2024-01-01T00:00:00", last_viewed_at="2024-03-01T00:00:00"))
+        db.insert_paper(conn, paper_record("missing", added_at="2024-01-02T00:00:00"))
+        assert db.fetch_stale_paper_ids(conn, PIPELINE_VERSION) == ["viewed", "missing", "old"]
+    for paper_id in ("old", "viewed"):
+        storage.save_pdf(paper_id, "paper.pdf", document.tobytes())
+        assert BUNDLE_FILENAME in storage.stale_artifacts(paper_id)
+
+    checkpoint = tmp_path / "checkpoint.json"
+    result = reprocess_library(db_path, storage, workers=1, max_load=float("inf"), min_available_mb=0, checkpoint_path=checkpoint)
+    assert result.processed == 2 and list(result.failed) == ["missing"] and result.remaining == 1
+    assert storage.stale_artifacts("viewed") == {}
+    assert load_checkpoint(checkpoint, PIPELINE_VERSION)["failed"].keys() == {"missing"}
+    with db.get_connection(db_path) as conn:
+        assert db.fetch_abbreviations(conn) == {"RAG": "retrieval augmented generation"}
+
+    rerun = reprocess_library(db_path, storage, workers=1, max_load=float("inf"), min_available_mb=0, checkpoint_path=checkpoint)
+    assert rerun.processed == 0 and rerun.remaining == 1
+
+
+def test_reprocess_paper_rebuilds_only_stale_artifacts(tmp_path, monkeypatch):
+    storage = StorageManager(tmp_path / "papers")
+    document = fitz.open()
+    document.new_page().insert_text((72, 72), "Introduction. We study retrieval augmented generation (RAG) for papers.")
+    storage.save_pdf("p", "paper.pdf", document.tobytes())
+    assert pipeline.reprocess_paper(storage, "p", "paper.pdf") is not None
+    assert pipeline.reprocess_paper(storage, "p", "paper.pdf") is None
+    before = storage.artifact_versions("p")
+
+    monkeypatch.setitem(storage_module.ARTIFACT_VERSIONS, pipeline.SECTIONS, 99)
+    storage.pdf_path("p", "paper.pdf").unlink()
+    assert pipeline.reprocess_paper(storage, "p", "paper.pdf") is None
+    after = storage.artifact_versions("p")
+    assert after[pipeline.SECTIONS]["version"] == 99
+    assert {name: after[name] for name in after if name != pipeline.SECTIONS} == {
+        name: before[name] for name in before if name != pipeline.SECTIONS
+    }
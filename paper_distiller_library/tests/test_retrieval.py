@@ -0,0 +1,25 @@
+from distiller.retrieval import BM25Index, chunk_pages
+
+
+def test_chunk_pages_overlaps_and_keeps_offsets():
+    text = " ".join(f"word{i}" for i in range(400))
+    passages = chunk_pages([(3, text)], size=200, overlap=50)
+    assert len(passages) > 1
+    assert all(passage.page == 3 for passage in passages)
+    assert passages[1].start < passages[0].end
+    assert all(text[p.start:p.end] == p.text for p in passages)
+
+
+def test_bm25_ranks_matching_passage_first(tmp_path):
+    pages = [
+        (1, "We introduce the background of reading research."),
+        (2, "Our method trains a transformer model on annotated corpora."),
+        (3, "A key limitation is the small dataset size."),
+    ]
+    index = BM25Index.build(chunk_pages(pages))
+    assert index.search("limitation dataset", k=1)[0][0].page == 3
+
+    path = tmp_path / "index.npz"
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("transformer method", k=1)[0][0].page == 2
@@ -1,3 +1,7 @@
+from pathlib import Path
+
+import pytest
+
 from distiller.schemas import OutputBundle
 
 
@@ -47,3 +51,42 @@ def test_output_bundle_schema_roundtrip():
     }
     bundle = OutputBundle.model_validate(payload)
     assert bundle.metadata["generated_by"] == "test"
+
+
+def test_storage_stamps_bundles_and_skips_validation_on_trusted_load(tmp_path, monkeypatch):
+    from distiller.schemas import SCHEMA_VERSION
+    from distiller.storage import StorageManager
+
+    storage = StorageManager(tmp_path)
+    payload = {
+        "story_line": {"one_paragraph_summary": {"text": "s", "type": "inference", "evidence": {"quote": "", "page": None, "citation_key": None, "evidence_level": "low"}}, "bullets": []},
+        "intro_evidence_table": [],
+        "contributions_and_implications": {"innovations": [], "key_findings": [], "implications": []},
+        "method_process_limits": {"method_summary": [], "process_steps": [], "assumptions": [], "limitations": []},
+        "glossary_terms": [],
+        "advanced_vocabulary": [],
+    }
+    storage.save_json("p1", "outputs.json", payload)
+    migrated = storage.load_bundle("p1")
+    assert migrated.get("metadata")["schema_version"] == SCHEMA_VERSION
+    assert migrated.story_line.one_paragraph_summary.text == "s"
+
+    # A stamped bundle that would fail validation is served as-is: the trusted path never validates.
+    stamped_invalid = dict(payload, glossary_terms=[{"term": "unvalidated"}], metadata={"schema_version": SCHEMA_VERSION})
+    storage.save_json("p2", "outputs.json", stamped_invalid)
+    before = (tmp_path / "p2" / "outputs.json").read_bytes()
+    trusted = storage.load_bundle("p2")
+    assert trusted.get("glossary_terms") == [{"term": "unvalidated"}]
+    assert (tmp_path / "p2" / "outputs.json").read_bytes() == before
+
+    # A bundle write that fails midway leaves the previous bundle and no temp file behind.
+    def torn_write(path, data):
+        with path.open("wb") as handle:
+            handle.write(data[:10])
+        raise OSError("disk full")
+
+    monkeypatch.setattr(Path, "write_bytes", torn_write)
+    with pytest.raises(OSError):
+        storage.save_bundle("p2", OutputBundle.model_validate(payload))
+    assert (tmp_path / "p2" / "outputs.json").read_bytes() == before
+    assert not list((tmp_path / "p2").glob("*.tmp"))
@@ -0,0 +1,56 @@
+from distiller import pipeline
+from distiller.similarity import SimilarityIndex, fingerprint
+from distiller.storage import StorageManager
+
+
+def test_similarity_index_upsert_remove_and_reopen(tmp_path):
+    index = SimilarityIndex(tmp_path / "similarity")
+    index.upsert("a", fingerprint(["graph neural networks for molecule property prediction"]))
+    index.upsert("b", fingerprint(["neural networks predict molecule properties from graphs"]))
+    index.upsert("c", fingerprint(["medieval poetry and the history of rhyme"]))
+    assert index.related("a", k=1)[0][0] == "b"
+
+    index.remove("b")
+    reopened = SimilarityIndex(tmp_path / "similarity")
+    assert "b" not in reopened
+    assert [paper_id for paper_id, _ in reopened.related("a", k=5)] == ["c"]
+    reopened.upsert("d", fingerprint(["molecule graphs"]))
+    assert reopened.rows["d"] == 1
+
+
+def test_similarity_index_appends_ids_and_weights_both_sides(tmp_path, monkeypatch):
+    monkeypatch.setattr("distiller.similarity.INITIAL_CAPACITY", 4)
+    index = SimilarityIndex(tmp_path / "similarity")
+    for text, paper_id in [("graph neural molecules", "a"), ("graph neural proteins", "b"), ("graph poetry", "c")]:
+        index.upsert(paper_id, fingerprint([text]))
+    for _ in range(20):
+        index.upsert("a", fingerprint(["graph neural molecules"]))
+    assert index.log_entries < 20 and not (tmp_path / "similarity" / "ids.json").exists()
+
+    scores = dict(index.related("a", k=2))
+    assert abs(scores["b"] - dict(index.related("b", k=2))["a"]) < 1e-5
+
+    index.remove("c")
+    reopened = SimilarityIndex(tmp_path / "similarity")
+    assert reopened.ids == ["a", "b", None] and reopened.doc_freq.tolist() == index.doc_freq.tolist()
+
+
+def test_similarity_index_instances_see_each_others_writes_and_sync(tmp_path, monkeypatch):
+    monkeypatch.setattr("distiller.similarity.INITIAL_CAPACITY", 2)
+    storage = StorageManager(tmp_path / "papers")
+    app_index, worker_index = pipeline.open_similarity_index(storage), pipeline.open_similarity_index(storage)
+    app_index.upsert("a", fingerprint(["graph neural molecules"]))
+    for paper_id in ("b", "c", "d"):
+        worker_index.upsert(paper_id, fingerprint([f"graph neural {paper_id}"]))
+    assert app_index.paper_ids() == ["a", "b", "c", "d"] and app_index.matrix.shape[0] >= 4
+    assert [paper_id for paper_id, _ in app_index.related("a", k=5)] == ["b", "c", "d"]
+
+    app_index.remove("b")
+    assert "b" not in worker_index and worker_index.rows["c"] == 2
+
+    for paper_id in ("a", "e"):
+        storage.save_json(paper_id, pipeline.PARSED_TEXT, {"pages": [{"page": 1, "text": "graph neural molecules"}]})
+    storage.library_path(pipeline.PASSAGE_INDEX).write_bytes(b"stale")
+    pipeline.sync_library_indexes(storage, ["a", "e"], index=worker_index)
+    assert sorted(app_index.paper_ids()) == ["a", "e"]
+    assert not storage.library_path(pipeline.PASSAGE_INDEX).exists()
@@ -0,0 +1,76 @@
+import pytest
+
+from distiller import db
+from distiller.blobstore import BlobStore, LocalBlobBackend
+from distiller.snapshot import SnapshotStore, create_snapshot, restore_paper, restore_snapshot, verify_snapshot
+from distiller.pipeline import PASSAGE_INDEX, open_similarity_index
+from distiller.storage import StorageManager
+
+
+def test_snapshots_copy_only_changed_files_and_restore_a_paper(tmp_path, paper_record):
+    data_dir, backup_dir = tmp_path / "data", tmp_path / "backups"
+    db_path = data_dir / db.DB_FILENAME
+    data_dir.mkdir()
+    db.init_db(db_path)
+    storage = StorageManager(data_dir / "papers", blobs=BlobStore(LocalBlobBackend(data_dir / "blobs"), db_path))
+    for paper_id in ("a", "b"):
+        storage.save_pdf(paper_id, "paper.pdf", f"%PDF-1.4 {paper_id}".encode())
+        storage.save_json(paper_id, "sections.json", {"sections": [paper_id]})
+        storage.save_json(paper_id, "parsed_text.json", {"pages": [{"page": 1, "text": f"{paper_id} text"}]})
+        with db.get_connection(db_path) as conn:
+            db.insert_paper(conn, paper_record(paper_id, year=2024, tags="llm", pdf_digest=storage.pdf_digest(paper_id)))
+            db.replace_abbreviations(conn, paper_id, [("RAG", "retrieval augmented generation")])
+
+    first = create_snapshot(data_dir, backup_dir)
+    assert first.files == first.copied == 10 and not first.problems
+    storage.save_json("b", "sections.json", {"sections": ["changed"]})
+    second = create_snapshot(data_dir, backup_dir)
+    assert second.files == 10 and second.copied == 2 and second.reused == 8
+
+    storage.delete_paper("a")
+    with db.get_connection(db_path) as conn:
+        db.delete_paper(conn, "a")
+    storage.library_path(PASSAGE_INDEX).write_bytes(b"merged index that still holds a")
+    assert restore_paper(data_dir, backup_dir, second.snapshot_id, "a") == 4
+    assert not storage.library_path(PASSAGE_INDEX).exists()
+    assert "a" in open_similarity_index(storage)
+    assert storage.pdf_path("a", "paper.pdf", storage.pdf_digest("a")).read_bytes() == b"%PDF-1.4 a"
+    with db.get_connection(db_path) as conn:
+        assert db.fetch_paper(conn, "a").pdf_digest == storage.pdf_digest("a")
+        assert db.fetch_facet_counts(conn)["tag"] == {"llm": 2}
+        assert db.blob_refcount(conn, storage.pdf_digest("a")) == 1
+
+    assert restore_snapshot(data_dir, backup_dir, first.snapshot_id) == 2
+    assert storage.load_json("b", "sections.json") == {"sections": ["b"]}
+    assert sorted(open_similarity_index(storage).paper_ids()) == ["a", "b"]
+
+    store = SnapshotStore(backup_dir)
+    digest = store.load_manifest(second.snapshot_id)["files"]["papers/b/sections.json"]["sha256"]
+    store.objects.path(digest).write_bytes(b"bit rot")
+    assert verify_snapshot(backup_dir, first.snapshot_id) == []
+    assert len(verify_snapshot(backup_dir, second.snapshot_id)) == 1
+
+
+def test_snapshot_verifies_only_new_objects_and_cleans_up_on_failure(tmp_path, monkeypatch):
+    data_dir, backup_dir = tmp_path / "data", tmp_path / "backups"
+    data_dir.mkdir()
+    db.init_db(data_dir / db.DB_FILENAME)
+    storage = StorageManager(data_dir / "papers")
+    storage.save_json("a", "sections.json", {"sections": ["a"]})
+    first = create_snapshot(data_dir, backup_dir)
+    store = SnapshotStore(backup_dir)
+    known = {entry["sha256"] for entry in store.load_manifest(first.snapshot_id)["files"].values()}
+
+    checked = []
+
+    def _failing_check(self, digest):
+        checked.append(digest)
+        raise ValueError("corrupt")
+
+    monkeypatch.setattr(SnapshotStore, "check", _failing_check)
+    storage.save_json("a", "sections.json", {"sections": ["changed"]})
+    with pytest.raises(RuntimeError):
+        create_snapshot(data_dir, backup_dir)
+    assert checked and not set(checked) & known
+    assert store.list_snapshots() == [first.snapshot_id]
+    assert not list(store.snapshots_dir.rglob("*.tmp"))
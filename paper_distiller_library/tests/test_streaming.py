@@ -0,0 +1,107 @@
+import json
+
+from distiller import extractors
+from distiller.llm_provider import BaseProvider, LLMResponse, iter_sse_data
+from distiller.stream_parser import BundleStreamParser
+
+GLOSSARY = [
+    {
+        "term": "NLP",
+        "term_type": "abbreviation",
+        "expansion": 'natural language processing, {with} "braces" ]',
+        "zh": "",
+        "definition": "d",
+        "paper_usage_quote": "q",
+        "page": 1,
+        "citation_key": None,
+        "evidence_level": "medium",
+        "notes": None,
+    }
+]
+
+
+def test_parser_emits_sections_as_soon_as_they_close():
+    payload = "```json\n" + json.dumps({"glossary_terms": GLOSSARY, "advanced_vocabulary": [{"bad": 1}]}) + "\n```"
+    parser = BundleStreamParser()
+    emitted = []
+    for start in range(0, len(payload), 7):
+        emitted.extend(name for name, _ in parser.feed(payload[start:start + 7]))
+        if "advanced_vocabulary" not in payload[: start + 7]:
+            assert emitted in ([], ["glossary_terms"])
+    assert emitted == ["glossary_terms"]
+    assert parser.errors
+
+
+def test_iter_sse_data_stops_at_done():
+    lines = [b": keep-alive\n", b'data: {"a": 1}\n', b"\n", b"data: [DONE]\n", b"\n", b'data: {"b": 2}\n', b"\n"]
+    assert list(iter_sse_data(lines)) == ['{"a": 1}']
+
+
+class _StreamingProvider(BaseProvider):
+    def stream(self, prompt, temperature=0.2):
+        text = json.dumps({"glossary_terms": GLOSSARY})
+        for start in range(0, len(text), 5):
+            yield text[start:start + 5]
+
+
+def test_iter_output_sections_streams_llm_sections_then_fills_gaps():
+    metadata = {}
+    pages = [(1, "Natural language processing (NLP) helps reading research.")]
+    names = [name for name, _ in extractors.iter_output_sections(pages, provider=_StreamingProvider(), metadata=metadata)]
+    assert names[0] == "glossary_terms"
+    assert sorted(names) == sorted(extractors.BUNDLE_SECTIONS)
+    assert "glossary_terms" not in metadata["heuristic_sections"]
+
+
+class _DroppingProvider(BaseProvider):
+    def stream(self, prompt, temperature=0.2):
+        text = json.dumps({"glossary_terms": GLOSSARY, "advanced_vocabulary": []})
+        yield text[: text.index("advanced_vocabulary")]
+        raise ConnectionResetError("connection reset by peer")
+
+    def generate(self, prompt, temperature=0.2):
+        if "single key advanced_vocabulary" not in prompt:
+            raise OSError("unavailable")
+        return LLMResponse(content=json.dumps({"advanced_vocabulary": []}))
+
+
+def test_stream_error_keeps_parsed_sections_and_falls_through():
+    metadata = {}
+    pages = [(1, "Natural language processing (NLP) helps reading research.")]
+    sections = dict(extractors.iter_output_sections(pages, provider=_DroppingProvider(), metadata=metadata))
+    assert sections["glossary_terms"][0].source == "llm" and sections["advanced_vocabulary"] == []
+    assert metadata["stream_errors"] == ["stream: ConnectionResetError: connection reset by peer"]
+    assert sorted(metadata["heuristic_sections"]) == sorted(set(extractors.BUNDLE_SECTIONS) - {"glossary_terms", "advanced_vocabulary"})
+
+
+class _RecordingProvider(BaseProvider):
+    context_window = 6000
+
+    def __init__(self):
+        self.prompts = []
+
+    def stream(self, prompt, temperature=0.2):
+        self.prompts.append(prompt)
+        yield json.dumps({"metadata": {"model": "m-1", "generated_by": "model"}, "glossary_terms": GLOSSARY})
+
+    def generate(self, prompt, temperature=0.2):
+        self.prompts.append(prompt)
+        if "single key advanced_vocabulary" not in prompt:
+            raise RuntimeError("unavailable")
+        return LLMResponse(content=json.dumps({"advanced_vocabulary": []}))
+
+
+def test_llm_sections_send_full_packed_passages_and_report_tokens():
+    provider = _RecordingProvider()
+    sentence = "Natural language processing (NLP) helps reading research across many long documents and fields. "
+    pages = [(page, sentence * 6) for page in range(1, 21)]
+    metadata = {}
+    sections = dict(extractors.iter_output_sections(pages, provider=provider, metadata=metadata))
+    assert " ".join((sentence * 6).split()) in provider.prompts[0]
+    assert metadata["model_metadata"] == {"model": "m-1", "generated_by": "model"}
+    assert metadata["generated_by"] == "_RecordingProvider"
+    assert sections["advanced_vocabulary"] == [] and sections["glossary_terms"][0].source == "llm"
+    assert metadata["tokens"]["stream"]["calls"] == 1 and metadata["tokens"]["direct"]["calls"] == 1
+    # Retries are packed per section rather than map/reduced over the whole paper.
+    assert set(metadata["tokens"]) == {"stream", "direct"} and len(provider.prompts) == 6
+    assert len(metadata["section_errors"]) == 4 and set(metadata["section_errors"]) == set(metadata["heuristic_sections"])